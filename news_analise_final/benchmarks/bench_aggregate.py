@@ -0,0 +1,44 @@
+"""Стадии aggregate и join: новостные скоры → фичи по свечам → свечи с фичами"""
+import numpy as np
+import pytest
+
+from src.core.auto_label_tickers import DEFAULT_ALIASES
+from src.core.candle_aggregation import aggregate_news_to_candles
+from src.core.infer_news_to_candles import join_features_to_candles
+from src.core.sentiment_analysis import add_sentiment_to_news
+
+
+@pytest.fixture(scope='module')
+def ticker_to_idx():
+    return {ticker: i for i, ticker in enumerate(sorted(set(DEFAULT_ALIASES.values())))}
+
+
+@pytest.fixture(scope='module')
+def scores(news, ticker_to_idx):
+    """Скоры как у обученной модели: большинство близко к нулю, единицы тикеров на новость выше порога"""
+    rng = np.random.default_rng(0)
+    return rng.beta(0.3, 4.0, size=(len(news), len(ticker_to_idx))).astype(np.float32)
+
+
+@pytest.fixture(scope='module')
+def sentiment(news):
+    return add_sentiment_to_news(news)
+
+
+@pytest.mark.benchmark(group='aggregate')
+@pytest.mark.parametrize('with_sentiment', [False, True], ids=['nn', 'nn+sentiment'])
+def bench_aggregate(run_stage, candles, news, scores, ticker_to_idx, sentiment, with_sentiment):
+    features = run_stage(
+        aggregate_news_to_candles, candles, news, scores, ticker_to_idx,
+        sentiment_features=sentiment if with_sentiment else None,
+        half_life_days=0.5, p_threshold=0.5, max_days=5,
+    )
+    assert len(features) > 0
+
+
+@pytest.mark.benchmark(group='join')
+def bench_join(run_stage, candles, news, scores, ticker_to_idx, sentiment):
+    features = aggregate_news_to_candles(candles, news, scores, ticker_to_idx, sentiment_features=sentiment,
+                                         half_life_days=0.5, p_threshold=0.5, max_days=5)
+    joined = run_stage(join_features_to_candles, candles, features, with_sentiment=True)
+    assert len(joined) == len(candles)
@@ -0,0 +1,15 @@
+"""Стадия parse: CSV-файл /process-news-file → DataFrame новостей"""
+import pytest
+
+from src.api.app import parse_news_file
+
+
+@pytest.fixture(scope='module')
+def news_csv(news) -> bytes:
+    return news.to_csv(index=False).encode('utf-8')
+
+
+@pytest.mark.benchmark(group='parse')
+def bench_parse_news_file(run_stage, news_csv):
+    df = run_stage(parse_news_file, news_csv)
+    assert len(df) > 0
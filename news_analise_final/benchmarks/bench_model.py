@@ -0,0 +1,17 @@
+"""Стадия score: скоринг новостей движком инференса для каждого бэкенда (без кэша скоров)"""
+import pytest
+import torch
+
+from src.core.inference_engine import BACKENDS, NewsInferenceEngine
+
+
+@pytest.fixture(scope='module', params=list(BACKENDS))
+def engine(request, artifacts_dir):
+    return NewsInferenceEngine.from_artifacts(artifacts_dir, device=torch.device('cpu'), backend=request.param)
+
+
+@pytest.mark.benchmark(group='score')
+def bench_score(run_stage, engine, news, benchmark):
+    benchmark.extra_info['backend'] = engine.backend.name
+    scores = run_stage(engine.score, news, use_cache=False)
+    assert scores.shape == (len(news), engine.num_labels)
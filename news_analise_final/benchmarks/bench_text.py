@@ -0,0 +1,64 @@
+"""Текстовые стадии: normalize, label, tokenize, sentiment"""
+import os
+
+import pytest
+
+from src.core import news_nlp
+from src.core.auto_label_tickers import AliasMatcher, build_aliases
+from src.core.news_nlp import normalize_pairs
+from src.core.sentiment_analysis import add_sentiment_to_news
+from src.ml.nn_data import build_vocab, encode_news_batch, load_vocab
+
+
+@pytest.mark.benchmark(group='normalize')
+@pytest.mark.parametrize('cache', ['cold', 'warm'])
+def bench_normalize(run_stage, news, cache):
+    """cold — пустой кэш нормализации перед каждым замером, warm — повторный запрос тех же новостей"""
+    titles = news['title'].tolist()
+    bodies = news['publication'].tolist()
+    if cache == 'cold':
+        run_stage(normalize_pairs, titles, bodies, setup=news_nlp._NORMALIZE_CACHE.clear)
+    else:
+        normalize_pairs(titles, bodies)
+        run_stage(normalize_pairs, titles, bodies)
+
+
+@pytest.mark.benchmark(group='label')
+@pytest.mark.parametrize('cache', ['cold', 'warm'])
+def bench_label(run_stage, news, cache):
+    """cold — новый матчер и пустой кэш нормализации, warm — матчер процесса API после первых запросов"""
+    aliases = build_aliases()
+    matcher = AliasMatcher(aliases)
+    if cache == 'cold':
+        def reset():
+            nonlocal matcher
+            matcher = AliasMatcher(aliases)
+            news_nlp._NORMALIZE_CACHE.clear()
+        run_stage(lambda: matcher.label_frame(news), setup=reset)
+    else:
+        matcher.label_frame(news)
+        run_stage(matcher.label_frame, news)
+
+
+@pytest.fixture(scope='module')
+def vocab(news):
+    """Словарь модели из BENCH_ARTIFACTS, иначе построенный по самим новостям"""
+    path = os.path.join(os.getenv('BENCH_ARTIFACTS', 'artifacts'), 'vocab.json')
+    if os.path.exists(path):
+        return load_vocab(path)
+    return build_vocab(normalize_pairs(news['title'].tolist(), news['publication'].tolist()), min_freq=1)
+
+
+@pytest.mark.benchmark(group='tokenize')
+def bench_tokenize(run_stage, news, vocab):
+    titles = news['title'].tolist()
+    bodies = news['publication'].tolist()
+    normalize_pairs(titles, bodies)
+    ids, lengths = run_stage(encode_news_batch, titles, bodies, vocab, 256)
+    assert ids.shape[0] == len(news)
+
+
+@pytest.mark.benchmark(group='sentiment')
+def bench_sentiment(run_stage, news):
+    result = run_stage(add_sentiment_to_news, news)
+    assert 'sentiment_score' in result.columns
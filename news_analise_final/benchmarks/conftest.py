@@ -0,0 +1,82 @@
+"""
+Общие фикстуры бенчмарков
+
+Настройки окружения:
+    BENCH_SIZES      — размеры выборок новостей через запятую (по умолчанию 1000,10000)
+    BENCH_ROUNDS     — число замеров для стадий с подготовкой перед каждым замером (по умолчанию 5)
+    BENCH_ARTIFACTS  — папка артефактов модели для стадии score (по умолчанию artifacts);
+                       без model.pt бенчмарки скоринга пропускаются
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# app.py при импорте открывает базу задач: в бенчмарках — во временной папке
+os.environ.setdefault('JOBS_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='bench_jobs_'), 'jobs.sqlite'))
+
+from benchmarks.synthetic import make_candles, make_news  # noqa: E402
+
+
+SIZES = [int(size) for size in os.getenv('BENCH_SIZES', '1000,10000').split(',')]
+ROUNDS = int(os.getenv('BENCH_ROUNDS', '5'))
+ARTIFACTS_DIR = os.getenv('BENCH_ARTIFACTS', 'artifacts')
+
+
+@pytest.fixture(scope='session', params=SIZES, ids=lambda size: f'{size}news')
+def size(request) -> int:
+    return request.param
+
+
+@pytest.fixture(scope='session')
+def news(size):
+    return make_news(size)
+
+
+@pytest.fixture(scope='session')
+def candles():
+    return make_candles()
+
+
+@pytest.fixture(scope='session')
+def artifacts_dir() -> str:
+    if not os.path.exists(os.path.join(ARTIFACTS_DIR, 'model.pt')):
+        pytest.skip(f'нет {ARTIFACTS_DIR}/model.pt (BENCH_ARTIFACTS)')
+    return ARTIFACTS_DIR
+
+
+@pytest.fixture
+def run_stage(benchmark, size):
+    """
+    Замер стадии: пик памяти Python-аллокаций (tracemalloc, отдельный прогон)
+    и время через pytest-benchmark
+
+    setup — функция подготовки перед каждым замером (например, сброс кэша);
+    с ней стадия замеряется BENCH_ROUNDS раз по одному вызову. Память тензоров
+    torch tracemalloc не видит, для стадии score пик занижен.
+    """
+    def run(fn, *args, setup=None, **kwargs):
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            fn(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info['rows'] = size
+        benchmark.extra_info['peak_mb'] = round(peak / 2 ** 20, 2)
+
+        if setup is None:
+            return benchmark(fn, *args, **kwargs)
+
+        def prepared():
+            setup()
+            return args, kwargs
+        return benchmark.pedantic(fn, setup=prepared, rounds=ROUNDS, iterations=1)
+    return run
@@ -0,0 +1,85 @@
+"""
+Синтетические новости и свечи для бенчмарков
+
+Тексты собираются из словаря финансовой лексики и алиасов тикеров, длины
+заголовков и текстов — логнормальные с тяжелым хвостом, как в реальной ленте
+(короткие заметки и редкие длинные статьи). Даты новостей распределены по
+торговым часам, часть новостей упоминает 1–3 компании, часть — ни одной.
+"""
+import numpy as np
+import pandas as pd
+
+from src.core.auto_label_tickers import DEFAULT_ALIASES
+
+
+WORDS = (
+    'компания акции рынок биржа индекс инвесторы отчет квартал выручка прибыль убыток '
+    'дивиденды выплата совет директоров рекомендовал снижение рост повышение падение '
+    'санкции ограничения экспорт импорт добыча нефть газ металл сталь никель золото '
+    'цены тариф ставка банк кредит ипотека депозит рубль доллар юань курс инфляция '
+    'прогноз аналитики ожидают планирует сообщила заявил представитель министерство '
+    'правительство регулятор центробанк решение сделка покупка продажа доля актив '
+    'облигации размещение выпуск капитал долг рефинансирование стратегия проект '
+    'строительство завод месторождение поставки контракт партнер рынок спрос '
+    'предложение производство мощность запуск модернизация инвестиции программа '
+    'период год месяц неделя результаты показатели данные млрд млн процентов '
+    'в на по за из от до о с и что это как также при после более менее около'
+).split()
+
+COMPANIES = sorted({alias for alias in DEFAULT_ALIASES if not alias.isascii()})
+
+PUBLICATIONS_SOURCES = ('РБК', 'Интерфакс', 'Коммерсант', 'Ведомости', 'ТАСС', 'Прайм')
+
+
+def _texts(rng: np.random.Generator, lengths: np.ndarray, mention_prob: float) -> list:
+    texts = []
+    for n in lengths:
+        words = list(rng.choice(WORDS, size=int(n)))
+        if rng.random() < mention_prob:
+            for _ in range(int(rng.integers(1, 4))):
+                words.insert(int(rng.integers(0, len(words) + 1)), str(rng.choice(COMPANIES)).title())
+        if rng.random() < 0.3:
+            words.append(f"{rng.uniform(0.1, 40):.1f}%")
+        texts.append(' '.join(words).capitalize() + '.')
+    return texts
+
+
+def make_news(n: int, days: int = 90, seed: int = 42) -> pd.DataFrame:
+    """
+    n новостей за days дней
+
+    Заголовок — в среднем ~9 слов, текст — медиана ~120 слов, 99-й перцентиль ~1000.
+    """
+    rng = np.random.default_rng(seed)
+    title_len = np.clip(rng.lognormal(2.1, 0.35, n), 3, 30).astype(int)
+    body_len = np.clip(rng.lognormal(4.8, 0.9, n), 10, 3000).astype(int)
+    start = pd.Timestamp('2025-01-01 07:00')
+    offsets = pd.to_timedelta(rng.integers(0, days, n), unit='D') + pd.to_timedelta(rng.integers(0, 16 * 3600, n), unit='s')
+    titles = _texts(rng, title_len, mention_prob=0.6)
+    bodies = [f"{rng.choice(PUBLICATIONS_SOURCES)}: {text}" for text in _texts(rng, body_len, mention_prob=0.7)]
+    return pd.DataFrame({
+        'publish_date': (start + offsets).strftime('%Y-%m-%d %H:%M:%S'),
+        'title': titles,
+        'publication': bodies,
+    })
+
+
+def make_candles(days: int = 90, seed: int = 42) -> pd.DataFrame:
+    """Дневные свечи для всех тикеров из DEFAULT_ALIASES за days дней (без выходных)"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2025-01-01', periods=int(days * 5 / 7) + 1)
+    tickers = sorted(set(DEFAULT_ALIASES.values()))
+    rows = []
+    for ticker in tickers:
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+        open_ = close * np.exp(rng.normal(0, 0.005, len(dates)))
+        rows.append(pd.DataFrame({
+            'begin': dates.strftime('%Y-%m-%d'),
+            'ticker': ticker,
+            'open': open_,
+            'high': np.maximum(open_, close) * 1.01,
+            'low': np.minimum(open_, close) * 0.99,
+            'close': close,
+            'volume': rng.integers(10_000, 1_000_000, len(dates)).astype(float),
+        }))
+    return pd.concat(rows, ignore_index=True)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Проверка бэкендов движка инференса на совпадение с reference
+
+Каждый бэкенд (src/core/inference_engine.py) скорит одни и те же новости.
+Его скоры сравниваются с reference-моделью, прогнанной в том же режиме
+батчинга, — так расхождение показывает только сам бэкенд (точность весов,
+компиляция), а не разницу padded/bucketed, которая печатается отдельно.
+Если заданы свечи, сравниваются и агрегированные фичи.
+Возвращает код 1, если какой-либо бэкенд вышел за допуск.
+
+Пример:
+    python scripts/testing/check_backend_parity.py --news datasets/news_labeled.csv --artifacts artifacts
+    python scripts/testing/check_backend_parity.py --news news.csv --candles candles.csv --backends batched,quantized
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.core.candle_aggregation import aggregate_news_to_candles
+from src.core.inference_engine import BACKENDS, NewsInferenceEngine
+
+
+# Допуск на максимальную разность вероятностей по точности весов бэкенда
+DEFAULT_ATOL = {'fp32': 1e-4, 'int8': 0.02}
+
+FEATURE_COLUMNS = ['nn_news_sum', 'nn_news_mean', 'nn_news_max', 'nn_news_count']
+
+
+def timed_scores(engine: NewsInferenceEngine, df: pd.DataFrame, batch_size: int, bucketed: bool) -> tuple:
+    """Скоры без кэша и время прогона (после прогрева на одном батче)"""
+    engine.score(df.head(batch_size), batch_size=batch_size, bucketed=bucketed, use_cache=False)
+    start = time.perf_counter()
+    scores = engine.score(df, batch_size=batch_size, bucketed=bucketed, use_cache=False)
+    return np.asarray(scores, dtype=np.float64), time.perf_counter() - start
+
+
+def features_diff(df_candles: pd.DataFrame, df_news: pd.DataFrame, ticker_to_idx: dict,
+                  expected: np.ndarray, actual: np.ndarray, p_threshold: float) -> float:
+    """Максимальная разность новостных фич по свечам для двух матриц скоров"""
+    left = aggregate_news_to_candles(df_candles, df_news, expected, ticker_to_idx, p_threshold=p_threshold)
+    right = aggregate_news_to_candles(df_candles, df_news, actual, ticker_to_idx, p_threshold=p_threshold)
+    merged = left.merge(right, on=['ticker', 'date'], how='outer', suffixes=('_ref', '_backend')).fillna(0.0)
+    diffs = [np.abs(merged[f'{col}_ref'] - merged[f'{col}_backend']).max() for col in FEATURE_COLUMNS
+             if f'{col}_ref' in merged.columns]
+    return float(max(diffs, default=0.0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение бэкендов инференса с reference')
+    parser.add_argument('--news', required=True, help='CSV с колонками title, publication (и publish_date для фич)')
+    parser.add_argument('--candles', default=None, help='CSV свечей: сравнить также агрегированные фичи')
+    parser.add_argument('--artifacts', default='artifacts')
+    parser.add_argument('--backends', default=None, help='через запятую; по умолчанию все, кроме reference')
+    parser.add_argument('--batch_size', type=int, default=256)
+    parser.add_argument('--limit', type=int, default=None, help='взять первые N новостей')
+    parser.add_argument('--p_threshold', type=float, default=0.5)
+    parser.add_argument('--atol', type=float, default=None, help='общий допуск вместо DEFAULT_ATOL')
+    args = parser.parse_args()
+
+    names = args.backends.split(',') if args.backends else [name for name in BACKENDS if name != 'reference']
+    unknown = [name for name in names if name not in BACKENDS]
+    if unknown:
+        print(f"❌ Неизвестные бэкенды: {unknown}, доступны: {list(BACKENDS)}")
+        return 1
+
+    df_news = pd.read_csv(args.news)
+    if args.limit:
+        df_news = df_news.head(args.limit)
+    df_candles = pd.read_csv(args.candles) if args.candles else None
+    print(f"📊 Новостей: {len(df_news)}, бэкенды: {', '.join(names)}")
+
+    cpu = torch.device('cpu')
+    reference = NewsInferenceEngine.from_artifacts(args.artifacts, device=cpu, backend='reference')
+    ref_scores = {}
+    ref_times = {}
+    for bucketed in (False, True):
+        ref_scores[bucketed], ref_times[bucketed] = timed_scores(reference, df_news, args.batch_size, bucketed)
+    mode_diff = np.abs(ref_scores[False] - ref_scores[True]).max() if len(df_news) else 0.0
+    print(f"reference padded: {ref_times[False]:.2f}с, bucketed: {ref_times[True]:.2f}с, "
+          f"разность padded/bucketed: {mode_diff:.6f}")
+
+    failed = []
+    for name in names:
+        engine = NewsInferenceEngine.from_artifacts(args.artifacts, device=cpu, backend=name)
+        bucketed = engine.backend.bucketed
+        scores, elapsed = timed_scores(engine, df_news, args.batch_size, bucketed)
+        expected = ref_scores[bucketed]
+        diff = np.abs(expected - scores)
+        max_diff = float(diff.max()) if diff.size else 0.0
+        flipped = int(np.count_nonzero((expected >= args.p_threshold) != (scores >= args.p_threshold)))
+        atol = args.atol if args.atol is not None else DEFAULT_ATOL[engine.backend.precision]
+
+        print(f"\n🔧 {name} ({engine.backend.precision}, {'bucketed' if bucketed else 'padded'})")
+        print(f"Время: {elapsed:.2f}с (reference в том же режиме: {ref_times[bucketed]:.2f}с)")
+        print(f"Максимальная разность вероятностей: {max_diff:.6f} (допуск {atol})")
+        print(f"Изменившихся решений при p>={args.p_threshold}: {flipped} из {expected.size}")
+        if df_candles is not None:
+            feat_diff = features_diff(df_candles, df_news, reference.ticker_to_idx, expected, scores, args.p_threshold)
+            print(f"Максимальная разность фич: {feat_diff:.6f}")
+        if max_diff > atol:
+            failed.append(name)
+
+    if failed:
+        print(f"\n❌ Вне допуска: {', '.join(failed)}")
+        return 1
+    print("\n✅ Все бэкенды в пределах допуска")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
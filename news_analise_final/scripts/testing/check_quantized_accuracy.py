@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Проверка int8-режима NewsTickerModel: точность относительно float-модели и пропускная способность
+
+Берет отложенную выборку так же, как train_news_ticker.py (перемешивание с
+random_state=42, первые 10% — валидация), скорит ее float- и int8-движком и
+сравнивает вероятности тикеров. Возвращает код 1, если расхождение больше допуска.
+
+Пример:
+    python scripts/testing/check_quantized_accuracy.py --news datasets/news_labeled.csv --artifacts artifacts
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.core.inference_engine import NewsInferenceEngine
+
+
+def held_out_split(df: pd.DataFrame, val_frac: float = 0.1) -> pd.DataFrame:
+    """Валидационная часть в точности как в train_news_ticker.py"""
+    df = df.sample(frac=1.0, random_state=42).reset_index(drop=True)
+    return df.iloc[:int(val_frac * len(df))].reset_index(drop=True)
+
+
+def timed_scores(engine: NewsInferenceEngine, df: pd.DataFrame, batch_size: int, repeats: int) -> tuple:
+    """Скоры и лучшее время из repeats прогонов (после прогрева)"""
+    engine.score(df.head(batch_size), batch_size=batch_size)
+    best = float('inf')
+    scores = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        scores = engine.score(df, batch_size=batch_size)
+        best = min(best, time.perf_counter() - start)
+    return scores, best
+
+
+def labels_to_matrix(df: pd.DataFrame, ticker_to_idx: dict) -> np.ndarray:
+    y = np.zeros((len(df), len(ticker_to_idx)), dtype=bool)
+    for i, row in enumerate(df['tickers'].fillna('')):
+        for t in str(row).replace(';', ',').split(','):
+            t = t.strip()
+            if t in ticker_to_idx:
+                y[i, ticker_to_idx[t]] = True
+    return y
+
+
+def micro_f1(y_true: np.ndarray, y_pred: np.ndarray) -> float:
+    tp = np.logical_and(y_true, y_pred).sum()
+    denom = y_true.sum() + y_pred.sum()
+    return float(2 * tp / denom) if denom else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнение int8 и float инференса на отложенной выборке')
+    parser.add_argument('--news', required=True, help='CSV с колонками title, publication (и tickers для F1)')
+    parser.add_argument('--artifacts', default='artifacts')
+    parser.add_argument('--batch_size', type=int, default=256)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--p_threshold', type=float, default=0.5)
+    parser.add_argument('--atol', type=float, default=0.02, help='допуск на максимальную разность вероятностей')
+    parser.add_argument('--threads', type=int, default=None, help='torch.set_num_threads')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    df = held_out_split(pd.read_csv(args.news))
+    if df.empty:
+        print("❌ Отложенная выборка пуста")
+        return 1
+    print(f"📊 Отложенная выборка: {len(df)} новостей")
+
+    # Оба движка с батчами по длине: сравнивается только точность весов
+    float_engine = NewsInferenceEngine.from_artifacts(args.artifacts, device=torch.device('cpu'), backend='batched')
+    int8_engine = NewsInferenceEngine.from_artifacts(args.artifacts, backend='quantized')
+
+    float_scores, float_time = timed_scores(float_engine, df, args.batch_size, args.repeats)
+    int8_scores, int8_time = timed_scores(int8_engine, df, args.batch_size, args.repeats)
+
+    diff = np.abs(float_scores - int8_scores)
+    float_pred = float_scores >= args.p_threshold
+    int8_pred = int8_scores >= args.p_threshold
+    flipped = int(np.count_nonzero(float_pred != int8_pred))
+
+    print("\n📐 Точность int8 относительно float:")
+    print(f"Максимальная разность вероятностей: {diff.max():.6f}")
+    print(f"Средняя разность вероятностей: {diff.mean():.6f}")
+    print(f"99.9-й перцентиль разности: {np.quantile(diff, 0.999):.6f}")
+    print(f"Изменившихся решений при p>={args.p_threshold}: {flipped} из {float_pred.size}")
+
+    if 'tickers' in df.columns:
+        y_true = labels_to_matrix(df, float_engine.ticker_to_idx)
+        print(f"Micro-F1 float: {micro_f1(y_true, float_pred):.4f}, int8: {micro_f1(y_true, int8_pred):.4f}")
+
+    print("\n⚡ Пропускная способность (CPU):")
+    print(f"float: {len(df) / float_time:.1f} новостей/с ({float_time:.2f}с)")
+    print(f"int8:  {len(df) / int8_time:.1f} новостей/с ({int8_time:.2f}с)")
+    print(f"Ускорение: x{float_time / max(int8_time, 1e-9):.2f}")
+
+    if diff.max() > args.atol:
+        print(f"\n❌ Разность превышает допуск {args.atol}")
+        return 1
+    print(f"\n✅ Вероятности в пределах допуска {args.atol}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,6 @@
-from fastapi import FastAPI, Body, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, Body, UploadFile, File, Form, Header, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, Literal, List, Dict, Any
 import pandas as pd
@@ -11,42 +13,161 @@ import aiohttp
 import json
 import logging
 import io
+import codecs
+import shutil
+import time
+import uuid
 from datetime import datetime
 
-from src.core.auto_label_tickers import build_aliases, assign_tickers_row
+from src.core.news_nlp import normalize_cache_info
 from src.core.infer_news_to_candles import infer_news_to_candles_df
-from src.ml.nn_model import NewsTickerModel
-from src.ml.nn_data import load_vocab
+from src.core.inference_engine import NewsInferenceEngine, get_inference_engine
+from src.core.score_cache import score_cache_stats
+from src.core.tracing import span, start_trace
+from src.api.pipeline import alias_registry, auto_label_news, run_inference, run_inference_to_files, run_inference_columnar
+from src.api.columnar import ColumnarValidationError, MEDIA_TYPES
+from src.api.results import RESULT_TABLES, get_result_store, iter_csv_chunks
+from src.api.workers import WorkerPoolBusy, get_worker_pool, shutdown_worker_pool
+from src.api.jobs import JobStore, JobDispatcher
+from src.api.callbacks import get_callback_dispatcher, close_callback_dispatcher
+from src.api.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, get_metrics
 
 app = FastAPI(title="FORECAST API: JSON news + candles → features + join")
 
-# Глобальные переменные для кэширования модели
-_model_cache = {}
-_device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+# Очередь задач /process-news-file: переживает перезапуск, выполняется не более JOB_MAX_CONCURRENCY задач сразу
+_job_store = JobStore(os.getenv('JOBS_DB_PATH', os.path.join('jobs', 'jobs.sqlite')))
+_job_dispatcher: Optional[JobDispatcher] = None
+JOB_QUEUE_LIMIT = int(os.getenv('JOB_QUEUE_LIMIT', '100'))
+
+# Входные новости задач хранятся Parquet-файлами рядом с базой задач (datetime64 сохраняется)
+JOB_INPUTS_DIR = os.getenv('JOB_INPUTS_DIR', os.path.join(os.path.dirname(_job_store.path) or '.', 'inputs'))
+
+# Результаты в режиме delivery_mode=file: RESULTS_DIR/<jobId>/{features,joined}.parquet.
+# Завершенные задачи и их папки результатов удаляются через JOB_TTL_SECONDS (0 — хранить всегда)
+RESULTS_DIR = os.getenv('RESULTS_DIR', 'results')
+RESULT_FILES = ('features', 'joined')
+JOB_TTL_SECONDS = float(os.getenv('JOB_TTL_SECONDS', '604800'))
+
+# Профили cProfile запросов с заголовком X-Profile: PROFILE_DIR/<profileId>.prof.
+# Выключено по умолчанию: заголовок может прислать любой клиент. Хранятся не более
+# PROFILE_MAX_FILES последних профилей и не дольше PROFILE_MAX_AGE_SECONDS.
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '0') == '1'
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '50'))
+PROFILE_MAX_AGE_SECONDS = float(os.getenv('PROFILE_MAX_AGE_SECONDS', '86400'))
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Число и длительность запросов по шаблону маршрута для /metrics"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get('route')
+        get_metrics().observe_request(request.method, getattr(route, 'path', 'unmatched'), status,
+                                      time.perf_counter() - start)
+
+
+@app.on_event("startup")
+async def start_job_dispatcher():
+    global _job_dispatcher
+    _job_dispatcher = JobDispatcher(
+        _job_store, process_news_job, on_success=job_succeeded, on_failure=notify_job_failed,
+        max_concurrency=int(os.getenv('JOB_MAX_CONCURRENCY', str(max(get_worker_pool().workers, 1)))),
+        retry_base_delay=float(os.getenv('JOB_RETRY_DELAY', '5')),
+        job_ttl=JOB_TTL_SECONDS if JOB_TTL_SECONDS > 0 else None, on_purge=remove_job_results,
+    )
+    recovered = _job_dispatcher.start()
+    if recovered:
+        logging.info(f"Recovered {recovered} interrupted jobs")
+
+
+@app.on_event("shutdown")
+async def stop_worker_pool():
+    if _job_dispatcher is not None:
+        await _job_dispatcher.stop()
+    await close_callback_dispatcher()
+    shutdown_worker_pool()
+
+
+def profile_requested(x_profile: Optional[str]) -> bool:
+    """Запрос включил профилирование заголовком X-Profile: 1 (и оно разрешено PROFILING_ENABLED)"""
+    return PROFILING_ENABLED and bool(x_profile) and x_profile.strip().lower() not in ('0', 'false', 'no')
+
+
+def profile_id_for(x_profile: Optional[str]) -> Optional[str]:
+    """Идентификатор профиля, если запрос включил профилирование заголовком X-Profile: 1"""
+    if not profile_requested(x_profile):
+        return None
+    prune_profiles(keep=PROFILE_MAX_FILES - 1)
+    return uuid.uuid4().hex
+
+
+def prune_profiles(keep: int = PROFILE_MAX_FILES, max_age: float = PROFILE_MAX_AGE_SECONDS) -> int:
+    """Удаляет профили старше max_age и самые старые сверх keep; возвращает число удаленных"""
+    try:
+        entries = [entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith('.prof')]
+    except OSError:
+        return 0
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    now = time.time()
+    removed = 0
+    for i, entry in enumerate(entries):
+        if i >= max(keep, 0) or now - entry.stat().st_mtime > max_age:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+def remove_job_results(job_ids: List[str]) -> int:
+    """
+    Удаляет папки результатов удаленных задач, а также папки в RESULTS_DIR
+    старше JOB_TTL_SECONDS, оставшиеся без задачи; возвращает число удаленных
+    """
+    targets = {os.path.join(RESULTS_DIR, job_id) for job_id in job_ids}
+    try:
+        now = time.time()
+        targets.update(entry.path for entry in os.scandir(RESULTS_DIR)
+                       if entry.is_dir() and now - entry.stat().st_mtime > JOB_TTL_SECONDS)
+    except OSError:
+        pass
+    removed = 0
+    for path in targets:
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
+
+
+def profile_path(profile_id: Optional[str]) -> Optional[str]:
+    if profile_id is None:
+        return None
+    return os.path.abspath(os.path.join(PROFILE_DIR, f'{profile_id}.prof'))
+
+
+def record_stages(endpoint: str, pool_timings: dict, extra_spans: List[dict] = ()) -> None:
+    """Спаны воркера и процесса API в метрики /metrics"""
+    get_metrics().observe_spans(endpoint, [*pool_timings.get('spans', []), *extra_spans], pool_timings.get('queue_wait'))
+
+
+def overloaded(e: WorkerPoolBusy) -> HTTPException:
+    """Ответ 503 при переполненной очереди воркеров"""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
-@lru_cache(maxsize=1)
-def load_cached_artifacts(artifacts_dir: str):
-    """Кэшированная загрузка артефактов модели"""
-    import json
-    
-    with open(os.path.join(artifacts_dir, 'tickers.json'), 'r', encoding='utf-8') as f:
-        ticker_to_idx = json.load(f)['ticker_to_idx']
-    
-    vocab = load_vocab(os.path.join(artifacts_dir, 'vocab.json'))
-    ckpt = torch.load(os.path.join(artifacts_dir, 'model.pt'), map_location='cpu')
-    
-    # Создаем и загружаем модель один раз
-    model = NewsTickerModel(vocab_size=len(vocab), num_labels=len(ticker_to_idx))
-    model.load_state_dict(ckpt['state_dict'])
-    model.to(_device)
-    model.eval()
-    
-    return {
-        'ticker_to_idx': ticker_to_idx,
-        'vocab': vocab,
-        'model': model,
-        'config': ckpt.get('config', {})
-    }
+
+InferBackend = Literal['reference', 'batched', 'quantized', 'compiled']
+
+
+def load_cached_artifacts(artifacts_dir: str, quantized: bool = False, backend: Optional[str] = None) -> NewsInferenceEngine:
+    """Кэшированная загрузка артефактов модели: один движок инференса на процесс и бэкенд"""
+    return get_inference_engine(artifacts_dir, quantized, backend)
 
 
 class NewsItem(BaseModel):
@@ -73,6 +194,8 @@ class InferRequest(BaseModel):
     half_life_days: float = Field(0.5, description='Период полураспада влияния новостей')
     max_days: float = Field(5.0, description='Максимальный возраст учитываемых новостей')
     add_sentiment: bool = Field(True, description='Добавлять ли сентимент-анализ в результат')
+    quantized: bool = Field(False, description='Int8-модель на CPU с батчами по длине (быстрее, скоры в пределах допуска от float)')
+    backend: Optional[InferBackend] = Field(None, description='Бэкенд инференса; по умолчанию INFER_BACKEND (quantized=true — int8)')
 
 
 class InferResponse(BaseModel):
@@ -82,6 +205,17 @@ class InferResponse(BaseModel):
     features_preview: Optional[List[Dict[str, Any]]] = None
     joined_preview: Optional[List[Dict[str, Any]]] = None
     message: Optional[str] = None
+    timings: Optional[Dict[str, Any]] = Field(None, description='Ожидание в очереди и время стадий, секунды')
+    result_id: Optional[str] = Field(None, description='Идентификатор полного результата для /infer/results/{result_id}/...')
+    result_expires_at: Optional[float] = Field(None, description='Время (unix), до которого результат доступен')
+
+
+class ResultPage(BaseModel):
+    result_id: str
+    table: str
+    total_rows: int
+    rows: List[Dict[str, Any]]
+    next_cursor: Optional[str] = None
 
 
 class CallbackPayload(BaseModel):
@@ -95,211 +229,93 @@ class FileProcessResponse(BaseModel):
     message: str
     sessionId: str
     status: str
+    jobId: Optional[str] = None
+
+
+class JobStatusResponse(BaseModel):
+    jobId: str
+    sessionId: str
+    status: str
+    attempts: int
+    maxAttempts: int
+    error: Optional[str] = None
+    createdAt: float
+    startedAt: Optional[float] = None
+    finishedAt: Optional[float] = None
 
 
 async def send_callback(callback_url: str, payload: CallbackPayload):
-    """Отправка результата обработки на callback URL"""
+    """Отправка результата обработки на callback URL (общая сессия, повторы, dead-letter)"""
+    return await get_callback_dispatcher().send(callback_url, payload.dict())
+
+
+NEWS_FILE_COLUMNS = ['publish_date', 'title', 'publication']
+ENCODING_CHUNK_BYTES = 1 << 20
+
+
+def decodes_as(content: bytes, encoding: str) -> bool:
+    """Декодируется ли все содержимое без ошибок (по частям, без копии файла в str)"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    view = memoryview(content)
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                callback_url,
-                json=payload.dict(),
-                headers={'Content-Type': 'application/json'},
-                timeout=aiohttp.ClientTimeout(total=30)
-            ) as response:
-                if response.status == 200:
-                    logging.info(f"Callback sent successfully to {callback_url} for session {payload.sessionId}")
-                    return True
-                else:
-                    logging.error(f"Callback failed with status {response.status} for session {payload.sessionId}")
-                    return False
-    except Exception as e:
-        logging.error(f"Error sending callback to {callback_url} for session {payload.sessionId}: {str(e)}")
+        for start in range(0, len(view), ENCODING_CHUNK_BYTES):
+            decoder.decode(view[start:start + ENCODING_CHUNK_BYTES], final=False)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
         return False
+    return True
+
+
+def detect_encoding(content: bytes) -> str:
+    """
+    Кодировка файла: utf-8 (с BOM или без), иначе cp1251, иначе latin-1
+
+    Проверяется весь файл, а не первые килобайты: файл, который начинается
+    с ASCII и только дальше содержит cp1251, иначе прочитался бы как utf-8,
+    и pyarrow вернул бы title/publication байтами без ошибки.
+    """
+    if content.isascii():
+        return 'utf-8'
+    candidates = ('utf-8-sig' if content.startswith(codecs.BOM_UTF8) else 'utf-8', 'cp1251')
+    for encoding in candidates:
+        if decodes_as(content, encoding):
+            return encoding
+    return 'latin-1'
 
 
-def parse_news_file(file_content: bytes) -> List[Dict]:
-    """Парсинг файла с новостями (CSV формат)"""
+def parse_news_file(file_content: bytes) -> pd.DataFrame:
+    """
+    Парсинг файла с новостями (CSV формат) за один проход
+
+    Кодировка определяется проверкой декодирования всего файла, файл читается
+    движком pyarrow (при ошибке — движком C), publish_date остается datetime64.
+    """
     try:
-        # Пробуем разные кодировки
-        encodings = ['utf-8', 'cp1251', 'latin-1']
-        df = None
-        
-        for encoding in encodings:
-            try:
-                df = pd.read_csv(
-                    io.BytesIO(file_content),
-                    encoding=encoding,
-                    parse_dates=['publish_date'],
-                    date_parser=pd.to_datetime
-                )
-                break
-            except (UnicodeDecodeError, pd.errors.ParserError):
-                continue
-        
-        if df is None:
-            raise ValueError("Не удалось прочитать файл с новостями")
+        encoding = detect_encoding(file_content)
+        try:
+            df = pd.read_csv(io.BytesIO(file_content), encoding=encoding, engine='pyarrow')
+        except Exception:
+            df = pd.read_csv(io.BytesIO(file_content), encoding=encoding)
         
         # Проверяем наличие необходимых колонок
-        required_columns = ['publish_date', 'title', 'publication']
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = [col for col in NEWS_FILE_COLUMNS if col not in df.columns]
         
         if missing_columns:
             raise ValueError(f"Отсутствуют необходимые колонки: {missing_columns}")
         
-        # Конвертируем в список словарей
-        news_data = df[required_columns].to_dict(orient='records')
-        
-        # Преобразуем даты в строки
-        for item in news_data:
-            if pd.notna(item['publish_date']):
-                item['publish_date'] = item['publish_date'].strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                item['publish_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        df = df[NEWS_FILE_COLUMNS].copy()
+        publish_date = pd.to_datetime(df['publish_date'], errors='coerce')
+        if getattr(publish_date.dt, 'tz', None) is not None:
+            publish_date = publish_date.dt.tz_localize(None)
+        # Новости без даты считаются опубликованными сейчас
+        df['publish_date'] = publish_date.fillna(pd.Timestamp.now().floor('s'))
         
-        return news_data
+        return df.reset_index(drop=True)
         
     except Exception as e:
         raise ValueError(f"Ошибка при парсинге файла: {str(e)}")
 
 
-def auto_label_news(news_dicts: List[Dict]) -> List[Dict]:
-    """Автоматическая разметка тикеров для новостей"""
-    # Конвертируем в DataFrame для обработки
-    df_news = pd.DataFrame(news_dicts)
-    
-    # Строим словарь алиасов
-    aliases = build_aliases(None)
-    
-    tickers = []
-    for _, row in df_news.iterrows():
-        tks = assign_tickers_row(row.get('title'), row.get('publication'), aliases)
-        tickers.append(';'.join(tks))
-    
-    df_news['tickers'] = tickers
-    
-    return df_news.to_dict(orient='records')
-
-
-def optimized_score_news(df_news: pd.DataFrame, artifacts_data: dict, batch_size: int = 512) -> np.ndarray:
-    """Оптимизированная функция скоринга новостей с кэшированной моделью"""
-    from src.ml.nn_data import encode_text
-    
-    model = artifacts_data['model']
-    vocab = artifacts_data['vocab']
-    max_len = artifacts_data['config'].get('max_len', 256)
-    
-    scores = []
-    with torch.no_grad():
-        for i in range(0, len(df_news), batch_size):
-            batch = df_news.iloc[i:i+batch_size]
-            texts = (batch['title'].fillna('') + ' [SEP] ' + batch['publication'].fillna('')).tolist()
-            
-            # Векторизованная токенизация
-            ids = [encode_text(t, vocab, max_len) for t in texts]
-            maxL = max(len(x) for x in ids) if ids else 1
-            
-            # Создаем тензоры более эффективно
-            batch_size_actual = len(ids)
-            input_ids = torch.zeros((batch_size_actual, maxL), dtype=torch.long, device=_device)
-            attention_mask = torch.zeros((batch_size_actual, maxL), dtype=torch.long, device=_device)
-            
-            for j, seq in enumerate(ids):
-                L = len(seq)
-                input_ids[j, :L] = torch.tensor(seq, dtype=torch.long)
-                attention_mask[j, :L] = 1
-            
-            logits = model(input_ids, attention_mask)
-            scores.append(torch.sigmoid(logits).cpu().numpy())
-    
-    return np.vstack(scores) if scores else np.zeros((0, len(artifacts_data['ticker_to_idx'])))
-
-
-def optimized_aggregate_to_candles(
-    df_candles: pd.DataFrame,
-    df_news: pd.DataFrame,
-    scores: np.ndarray,
-    ticker_to_idx: dict,
-    half_life_days: float = 2.0,
-    p_threshold: float = 0.5,
-    max_days: float = 20.0,
-) -> pd.DataFrame:
-    """Оптимизированная агрегация новостей к свечам"""
-    import math
-    
-    scores = np.asarray(scores)
-    df_news = df_news.copy()
-    df_news['publish_date'] = pd.to_datetime(df_news['publish_date'], errors='coerce')
-    df_news['date'] = df_news['publish_date'].dt.date
-
-    df_candles = df_candles.copy()
-    df_candles['begin'] = pd.to_datetime(df_candles['begin'], errors='coerce')
-    df_candles['date'] = df_candles['begin'].dt.date
-
-    news_dates = pd.to_datetime(df_news['date']).values.astype('datetime64[D]')
-    decay_lambda = math.log(2) / max(half_life_days, 1e-6)
-    max_days = float(max_days) if max_days is not None else np.inf
-
-    features = []
-    
-    # Предварительно фильтруем тикеры
-    valid_tickers = set(ticker_to_idx.keys())
-    
-    for ticker, g in df_candles.groupby('ticker'):
-        if ticker not in valid_tickers:
-            continue
-            
-        label_idx = ticker_to_idx[ticker]
-        probs = np.asarray(scores[:, label_idx], dtype=np.float64)
-        
-        for dt, sub in g.groupby('date'):
-            dt64 = np.datetime64(dt)
-            
-            # Оптимизированное окно времени
-            if np.isfinite(max_days):
-                min_dt64 = dt64 - np.timedelta64(int(max_days), 'D')
-                base_mask = (news_dates <= dt64) & (news_dates >= min_dt64)
-            else:
-                base_mask = (news_dates <= dt64)
-                
-            if not base_mask.any():
-                features.append({
-                    'ticker': ticker, 'date': dt, 
-                    'nn_news_sum': 0.0, 'nn_news_mean': 0.0, 
-                    'nn_news_max': 0.0, 'nn_news_count': 0
-                })
-                continue
-                
-            # Релевантность по порогу
-            mask_thr = base_mask & (probs >= p_threshold)
-            if not mask_thr.any():
-                features.append({
-                    'ticker': ticker, 'date': dt, 
-                    'nn_news_sum': 0.0, 'nn_news_mean': 0.0, 
-                    'nn_news_max': 0.0, 'nn_news_count': 0
-                })
-                continue
-                
-            # Векторизованное вычисление затухания
-            deltas = (dt64 - news_dates[mask_thr]).astype('timedelta64[D]').astype(int)
-            weights = np.exp(-decay_lambda * deltas.astype(np.float64))
-            vals = probs[mask_thr]
-            wvals = vals * weights
-            
-            cnt = int(mask_thr.sum())
-            ssum = float(np.sum(wvals))
-            smean = float(np.mean(wvals)) if cnt > 0 else 0.0
-            smax = float(np.max(wvals)) if cnt > 0 else 0.0
-            
-            features.append({
-                'ticker': ticker, 'date': dt, 
-                'nn_news_sum': ssum, 'nn_news_mean': smean, 
-                'nn_news_max': smax, 'nn_news_count': cnt
-            })
-    
-    return pd.DataFrame(features)
-
-
 @app.post('/process-news-file', response_model=FileProcessResponse)
 async def process_news_file(
     file: UploadFile = File(..., description="CSV файл с новостями"),
@@ -309,7 +325,13 @@ async def process_news_file(
     p_threshold: float = Form(0.5, description="Порог релевантности новостей"),
     half_life_days: float = Form(0.5, description="Период полураспада влияния новостей"),
     max_days: float = Form(5.0, description="Максимальный возраст учитываемых новостей"),
-    add_sentiment: bool = Form(True, description="Добавлять ли сентимент-анализ в результат")
+    add_sentiment: bool = Form(True, description="Добавлять ли сентимент-анализ в результат"),
+    quantized: bool = Form(False, description="Int8-модель на CPU"),
+    backend: Optional[InferBackend] = Form(None, description="Бэкенд инференса: reference, batched, quantized, compiled"),
+    delivery_mode: Literal['inline', 'file'] = Form(
+        "inline", description="inline — результат JSON-строкой в callback; file — Parquet-файлы, в callback только ссылка"
+    ),
+    x_profile: Optional[str] = Header(None, description="1 — профилировать задачу cProfile (профиль: /profiles/{jobId})")
 ):
     """
     Эндпоинт для обработки файла с новостями и отправки результата на callback URL
@@ -331,24 +353,41 @@ async def process_news_file(
         if not file_content:
             raise HTTPException(status_code=400, detail="Файл пустой")
         
-        # Парсим файл с новостями
-        news_data = parse_news_file(file_content)
+        # Разбор CSV и запись Parquet — в потоке, чтобы большой файл не останавливал цикл событий
+        df_news = await asyncio.to_thread(parse_news_file, file_content)
         
-        if not news_data:
+        if df_news.empty:
             raise HTTPException(status_code=400, detail="Не удалось извлечь данные из файла")
         
-        # Запускаем обработку в фоновом режиме
-        asyncio.create_task(
-            process_news_background(
-                news_data, callbackUrl, sessionId, artifacts_dir,
-                p_threshold, half_life_days, max_days, add_sentiment
-            )
-        )
+        # Задача сохраняется в очередь и выполняется диспетчером в пуле воркеров
+        queued = (await asyncio.to_thread(_job_store.counts))['queued']
+        if queued >= JOB_QUEUE_LIMIT:
+            raise HTTPException(status_code=429, detail=f"Очередь задач заполнена: {queued}",
+                                headers={"Retry-After": "30"})
+        
+        news_path = await asyncio.to_thread(save_job_input, df_news)
+        job_id = await asyncio.to_thread(_job_store.enqueue, sessionId, {
+            "news_path": news_path,
+            "news_count": len(df_news),
+            "callback_url": callbackUrl,
+            "artifacts_dir": artifacts_dir,
+            "p_threshold": p_threshold,
+            "half_life_days": half_life_days,
+            "max_days": max_days,
+            "add_sentiment": add_sentiment,
+            "quantized": quantized,
+            "backend": backend,
+            "delivery_mode": delivery_mode,
+            "profile": profile_requested(x_profile),
+        }, max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', '3')))
+        if _job_dispatcher is not None:
+            _job_dispatcher.notify()
         
         return FileProcessResponse(
             message="Файл принят к обработке",
             sessionId=sessionId,
-            status="accepted"
+            status="accepted",
+            jobId=job_id
         )
         
     except HTTPException:
@@ -365,82 +404,223 @@ async def process_news_file(
         raise HTTPException(status_code=500, detail=f"Ошибка при обработке файла: {str(e)}")
 
 
-async def process_news_background(
-    news_data: List[Dict],
-    callback_url: str,
-    session_id: str,
-    artifacts_dir: str,
-    p_threshold: float,
-    half_life_days: float,
-    max_days: float,
-    add_sentiment: bool
-):
-    """Фоновая обработка новостей и отправка результата на callback"""
-    try:
-        # Загружаем кэшированные артефакты
-        artifacts_data = load_cached_artifacts(artifacts_dir)
-        
-        # Автоматическая разметка тикеров для новостей
-        labeled_news = auto_label_news(news_data)
-        
-        # Конвертируем в DataFrame
-        df_news = pd.DataFrame(labeled_news)
-        
-        # Создаем пустой DataFrame свечей для демонстрации
-        # В реальном сценарии свечи должны быть предоставлены отдельно
-        df_candles = pd.DataFrame({
-            'begin': pd.date_range(start='2025-01-01', periods=1, freq='D'),
-            'ticker': ['SBER'],
-            'open': [100.0],
-            'high': [105.0],
-            'low': [95.0],
-            'close': [102.0],
-            'volume': [1000000]
-        })
-        
-        # Используем функцию с сентимент-анализом
-        features_df, joined_df = infer_news_to_candles_df(
-            df_news, df_candles, artifacts_dir,
-            p_threshold=p_threshold,
-            half_life_days=half_life_days,
-            max_days=max_days,
-            add_sentiment=add_sentiment
-        )
-        
-        # Подготавливаем результат
-        result_data = {
-            "features": features_df.to_dict(orient='records'),
-            "joined": joined_df.to_dict(orient='records'),
-            "summary": {
-                "rows_features": len(features_df),
-                "rows_joined": len(joined_df),
-                "news_count": len(df_news),
-                "candles_count": len(df_candles)
+def save_job_input(df_news: pd.DataFrame) -> str:
+    """Сохраняет разобранные новости задачи в Parquet и возвращает путь"""
+    os.makedirs(JOB_INPUTS_DIR, exist_ok=True)
+    path = os.path.abspath(os.path.join(JOB_INPUTS_DIR, f'{uuid.uuid4().hex}.parquet'))
+    df_news.to_parquet(path, index=False)
+    return path
+
+
+def job_news(payload: dict):
+    """Новости задачи: путь к Parquet (воркер читает его сам) или список словарей старого формата"""
+    return payload.get('news_path') or payload['news_data']
+
+
+def discard_job_input(payload: dict) -> None:
+    path = payload.get('news_path')
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+async def process_news_job(job: dict) -> str:
+    """
+    Выполнение задачи из очереди: обработка новостей в пуле воркеров и отправка
+    результата на callback. Возвращает JSON, который сохраняется в задаче: в
+    режиме callback — только сводку (строки, тайминги), сами таблицы уходят в
+    callback и в базе задач не дублируются.
+    """
+    payload = job['payload']
+    news = job_news(payload)
+    
+    # Создаем пустой DataFrame свечей для демонстрации
+    # В реальном сценарии свечи должны быть предоставлены отдельно
+    df_candles = pd.DataFrame({
+        'begin': pd.date_range(start='2025-01-01', periods=1, freq='D'),
+        'ticker': ['SBER'],
+        'open': [100.0],
+        'high': [105.0],
+        'low': [95.0],
+        'close': [102.0],
+        'volume': [1000000]
+    })
+    
+    if payload.get('delivery_mode') == 'file':
+        return await process_news_job_to_files(job, df_candles)
+    
+    # Разметка, скоринг и агрегация с сентимент-анализом в воркере
+    (features_df, joined_df, stages), pool_timings = await get_worker_pool().run_call(
+        run_inference,
+        (news, df_candles.to_dict(orient='records'), payload['artifacts_dir'],
+         payload['p_threshold'], payload['half_life_days'], payload['max_days'],
+         payload['add_sentiment'], payload.get('quantized', False), payload.get('backend')),
+        profile_path=job_profile_path(job),
+    )
+    
+    # Подготавливаем результат
+    with start_trace() as trace:
+        with span('serialization', rows=len(features_df) + len(joined_df)) as serialization:
+            result_data = {
+                "features": features_df.to_dict(orient='records'),
+                "joined": joined_df.to_dict(orient='records'),
+                "summary": {
+                    "rows_features": len(features_df),
+                    "rows_joined": len(joined_df),
+                    "news_count": payload.get('news_count', len(news)),
+                    "candles_count": len(df_candles)
+                },
+                "timings": {**pool_timings, "stages": stages}
             }
-        }
-        
-        # Отправляем успешный результат
-        success_payload = CallbackPayload(
-            sessionId=session_id,
-            status="success",
-            data=json.dumps(result_data, ensure_ascii=False, default=str)
-        )
-        
-        await send_callback(callback_url, success_payload)
-        
-    except Exception as e:
-        # Отправляем ошибку
-        error_payload = CallbackPayload(
-            sessionId=session_id,
-            status="error",
-            errorMessage=f"Ошибка при обработке новостей: {str(e)}"
-        )
-        
-        await send_callback(callback_url, error_payload)
+            if payload.get('profile'):
+                result_data["profile"] = f"/profiles/{job['job_id']}"
+            data = json.dumps(result_data, ensure_ascii=False, default=str)
+            serialization['bytes'] = len(data)
+    record_stages('/process-news-file', pool_timings, trace.spans)
+    
+    # Отправляем успешный результат; входной файл удаляется после сохранения задачи (job_succeeded)
+    success_payload = CallbackPayload(
+        sessionId=job['session_id'],
+        status="success",
+        data=data
+    )
+    await send_callback(payload['callback_url'], success_payload)
+    
+    stored = {key: value for key, value in result_data.items() if key not in ('features', 'joined')}
+    return json.dumps({"delivery": "callback", "jobId": job['job_id'], **stored}, ensure_ascii=False, default=str)
+
+
+def job_profile_path(job: dict) -> Optional[str]:
+    """Профиль задачи пишется под ее jobId"""
+    if not job['payload'].get('profile'):
+        return None
+    prune_profiles(keep=PROFILE_MAX_FILES - 1)
+    return profile_path(job['job_id'])
+
+
+async def process_news_job_to_files(job: dict, df_candles: pd.DataFrame) -> str:
+    """
+    Режим delivery_mode=file: воркер пишет Parquet в RESULTS_DIR/<jobId>,
+    callback и сохраненный результат задачи содержат только ссылки на файлы
+    """
+    payload = job['payload']
+    out_dir = os.path.join(RESULTS_DIR, job['job_id'])
+    
+    (files, stages), pool_timings = await get_worker_pool().run_call(
+        run_inference_to_files,
+        (job_news(payload), df_candles.to_dict(orient='records'), payload['artifacts_dir'],
+         payload['p_threshold'], payload['half_life_days'], payload['max_days'],
+         payload['add_sentiment'], payload.get('quantized', False), out_dir, payload.get('backend')),
+        profile_path=job_profile_path(job),
+    )
+    record_stages('/process-news-file', pool_timings)
+    for name, info in files.items():
+        info['url'] = f"/results/{job['job_id']}/{name}"
+    
+    result_data = {
+        "delivery": "file",
+        "format": "parquet",
+        "jobId": job['job_id'],
+        "files": files,
+        "summary": {
+            "rows_features": files['features']['rows'],
+            "rows_joined": files['joined']['rows'],
+            "news_count": payload.get('news_count', 0),
+            "candles_count": len(df_candles)
+        },
+        "timings": {**pool_timings, "stages": stages}
+    }
+    if payload.get('profile'):
+        result_data["profile"] = f"/profiles/{job['job_id']}"
+    data = json.dumps(result_data, ensure_ascii=False)
+    
+    success_payload = CallbackPayload(
+        sessionId=job['session_id'],
+        status="success",
+        data=data
+    )
+    await send_callback(payload['callback_url'], success_payload)
+    
+    return data
+
+
+async def job_succeeded(job: dict):
+    """Входные новости удаляются только после сохранения результата: при сбое повтор их перечитает"""
+    await asyncio.to_thread(discard_job_input, job['payload'])
+
+
+@app.get('/results/{job_id}/{name}')
+async def download_result(job_id: str, name: str):
+    """Parquet-файл результата задачи, обработанной в режиме delivery_mode=file"""
+    if name not in RESULT_FILES or not job_id.isalnum():
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    path = os.path.join(RESULTS_DIR, job_id, f'{name}.parquet')
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Файл не найден")
+    return FileResponse(path, media_type='application/vnd.apache.parquet', filename=f'{job_id}_{name}.parquet')
+
+
+async def notify_job_failed(job: dict, error: str):
+    """Callback с ошибкой после исчерпания попыток"""
+    discard_job_input(job['payload'])
+    error_payload = CallbackPayload(
+        sessionId=job['session_id'],
+        status="error",
+        errorMessage=f"Ошибка при обработке новостей: {error}"
+    )
+    await send_callback(job['payload']['callback_url'], error_payload)
+
+
+def job_status(job: dict) -> JobStatusResponse:
+    return JobStatusResponse(
+        jobId=job['job_id'],
+        sessionId=job['session_id'],
+        status=job['status'],
+        attempts=job['attempts'],
+        maxAttempts=job['max_attempts'],
+        error=job['error'],
+        createdAt=job['created_at'],
+        startedAt=job['started_at'],
+        finishedAt=job['finished_at'],
+    )
+
+
+@app.get('/jobs/stats')
+async def jobs_stats():
+    """Глубина очереди и число задач по статусам"""
+    return {
+        "counts": await asyncio.to_thread(_job_store.counts),
+        "active": _job_dispatcher.active if _job_dispatcher is not None else 0,
+        "max_concurrency": _job_dispatcher.max_concurrency if _job_dispatcher is not None else 0,
+        "queue_limit": JOB_QUEUE_LIMIT,
+    }
+
+
+@app.get('/jobs/{session_id}', response_model=JobStatusResponse)
+async def get_job_status(session_id: str):
+    """Статус последней задачи сессии"""
+    job = await asyncio.to_thread(_job_store.latest_for_session, session_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job_status(job)
+
+
+@app.get('/jobs/{session_id}/result')
+async def get_job_result(session_id: str):
+    """
+    Результат последней задачи сессии: ссылки на файлы (delivery_mode=file)
+    или сводка без таблиц (таблицы доставлены в callback)
+    """
+    job = await asyncio.to_thread(_job_store.latest_for_session, session_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    if job['status'] != 'succeeded':
+        raise HTTPException(status_code=409, detail=f"Задача в статусе {job['status']}")
+    return json.loads(await asyncio.to_thread(_job_store.result, job['job_id']))
 
 
 @app.post('/infer', response_model=InferResponse)
-async def infer(request: InferRequest):
+async def infer(request: InferRequest,
+                x_profile: Optional[str] = Header(None, description="1 — профилировать запрос cProfile")):
     """
     Основной эндпоинт для инференса новостей с сентимент-анализом
     
@@ -457,37 +637,46 @@ async def infer(request: InferRequest):
       sentiment_positive_count, sentiment_negative_count, sentiment_neutral_count
     """
     try:
-        # Загружаем кэшированные артефакты
-        artifacts_data = load_cached_artifacts(request.artifacts_dir)
-        
         # Конвертируем Pydantic модели в словари
         news_dicts = [item.dict() for item in request.news]
         candles_dicts = [item.dict() for item in request.candles]
         
-        # Автоматическая разметка тикеров для новостей
-        labeled_news = auto_label_news(news_dicts)
-        
-        # Конвертируем в DataFrame
-        df_news = pd.DataFrame(labeled_news)
-        df_candles = pd.DataFrame(candles_dicts)
-        
-        # Используем функцию с сентимент-анализом
-        features_df, joined_df = infer_news_to_candles_df(
-            df_news, df_candles, request.artifacts_dir,
-            p_threshold=request.p_threshold,
-            half_life_days=request.half_life_days,
-            max_days=request.max_days,
-            add_sentiment=request.add_sentiment
+        # Разметка, скоринг и агрегация с сентимент-анализом в пуле воркеров
+        profile_id = profile_id_for(x_profile)
+        (features_df, joined_df, stages), pool_timings = await get_worker_pool().run_call(
+            run_inference,
+            (news_dicts, candles_dicts, request.artifacts_dir,
+             request.p_threshold, request.half_life_days, request.max_days,
+             request.add_sentiment, request.quantized, request.backend),
+            profile_path=profile_path(profile_id),
         )
+        headers = {"X-Profile-Id": profile_id} if profile_id is not None else None
         
-        return InferResponse(
-            status="success",
-            rows_features=len(features_df),
-            rows_joined=len(joined_df),
-            features_preview=features_df.head(50).to_dict(orient='records'),
-            joined_preview=joined_df.head(50).to_dict(orient='records')
-        )
+        with start_trace() as trace:
+            with span('result_store', rows=len(features_df) + len(joined_df)):
+                # Полный результат сохраняется для постраничной выдачи и экспорта
+                stored = get_result_store().put(features_df, joined_df)
+            
+            # Ответ кодируется здесь, а не FastAPI после return, чтобы спан
+            # serialization замерял само кодирование JSON
+            with span('serialization', rows=len(features_df) + len(joined_df)) as serialization:
+                result = InferResponse(
+                    status="success",
+                    rows_features=len(features_df),
+                    rows_joined=len(joined_df),
+                    features_preview=features_df.head(50).to_dict(orient='records'),
+                    joined_preview=joined_df.head(50).to_dict(orient='records'),
+                    timings={**pool_timings, "stages": stages},
+                    result_id=stored.result_id if stored is not None else None,
+                    result_expires_at=stored.expires_at if stored is not None else None
+                )
+                encoded = JSONResponse(content=jsonable_encoder(result), headers=headers)
+                serialization['bytes'] = len(encoded.body)
+        record_stages('/infer', pool_timings, trace.spans)
+        return encoded
         
+    except WorkerPoolBusy as e:
+        raise overloaded(e)
     except Exception as e:
         return InferResponse(
             status="error",
@@ -497,6 +686,143 @@ async def infer(request: InferRequest):
         )
 
 
+def stored_table(result_id: str, table: str) -> pd.DataFrame:
+    if table not in RESULT_TABLES:
+        raise HTTPException(status_code=404, detail="Таблица не найдена")
+    stored = get_result_store().get(result_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Результат не найден или истек")
+    return stored.tables[table]
+
+
+@app.get('/infer/results/{result_id}/{table}', response_model=ResultPage)
+async def get_result_page(result_id: str, table: str, cursor: Optional[str] = None, limit: int = 1000):
+    """Страница сохраненного результата /infer; next_cursor передается в следующий запрос"""
+    df = stored_table(result_id, table)
+    try:
+        start = int(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
+    if start < 0:
+        raise HTTPException(status_code=400, detail="cursor не может быть отрицательным")
+    if limit <= 0:
+        raise HTTPException(status_code=400, detail="limit должен быть положительным")
+    limit = min(limit, 10000)
+    end = min(start + limit, len(df))
+    page = df.iloc[start:end]
+    return ResultPage(
+        result_id=result_id,
+        table=table,
+        total_rows=len(df),
+        rows=json.loads(page.to_json(orient='records', date_format='iso', force_ascii=False)),
+        next_cursor=str(end) if end < len(df) else None,
+    )
+
+
+@app.get('/infer/results/{result_id}/{table}/export')
+async def export_result(result_id: str, table: str, format: Literal['csv', 'parquet'] = 'csv'):
+    """Выгрузка сохраненной таблицы целиком: CSV потоком по частям или Parquet-файлом"""
+    df = stored_table(result_id, table)
+    filename = f"{result_id}_{table}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if format == 'csv':
+        return StreamingResponse(iter_csv_chunks(df), media_type='text/csv', headers=headers)
+    body = await asyncio.to_thread(lambda: df.to_parquet(index=False))
+    return Response(content=body, media_type=MEDIA_TYPES['parquet'], headers=headers)
+
+
+@app.delete('/infer/results/{result_id}')
+async def delete_result(result_id: str):
+    """Освобождает сохраненный результат до истечения TTL"""
+    if not get_result_store().delete(result_id):
+        raise HTTPException(status_code=404, detail="Результат не найден или истек")
+    return {"status": "deleted", "result_id": result_id}
+
+
+@app.get('/infer/results')
+async def result_store_stats():
+    """Заполненность хранилища результатов"""
+    return get_result_store().stats()
+
+
+@app.post('/infer/columnar')
+async def infer_columnar(
+    news: UploadFile = File(..., description="Новости: Arrow IPC, Parquet или NDJSON (можно gzip)"),
+    candles: UploadFile = File(..., description="Свечи: Arrow IPC, Parquet или NDJSON (можно gzip)"),
+    artifacts_dir: str = Form("artifacts", description="Путь к артефактам модели"),
+    p_threshold: float = Form(0.5, description="Порог релевантности новостей"),
+    half_life_days: float = Form(0.5, description="Период полураспада влияния новостей"),
+    max_days: float = Form(5.0, description="Максимальный возраст учитываемых новостей"),
+    add_sentiment: bool = Form(True, description="Добавлять ли сентимент-анализ в результат"),
+    quantized: bool = Form(False, description="Int8-модель на CPU"),
+    backend: Optional[InferBackend] = Form(None, description="Бэкенд инференса: reference, batched, quantized, compiled"),
+    table: Literal['joined', 'features'] = Form("joined", description="Какую таблицу вернуть целиком"),
+    response_format: Optional[Literal['arrow', 'parquet', 'ndjson', 'ndjson.gz']] = Form(
+        None, description="Формат ответа; по умолчанию — формат файла новостей"
+    ),
+    x_profile: Optional[str] = Header(None, description="1 — профилировать запрос cProfile")
+):
+    """
+    Колоночный вариант /infer: таблицы загружаются целиком без построчной
+    pydantic-валидации, в ответе — полная таблица (не превью) в колоночном формате.
+    Число строк и время стадий передаются в заголовках X-Rows и X-Timings.
+    """
+    news_data = await news.read()
+    candles_data = await candles.read()
+    profile_id = profile_id_for(x_profile)
+    try:
+        (body, fmt, rows, stages), pool_timings = await get_worker_pool().run_call(
+            run_inference_columnar,
+            (news_data, candles_data, artifacts_dir,
+             p_threshold, half_life_days, max_days, add_sentiment, quantized,
+             table, response_format, backend),
+            profile_path=profile_path(profile_id),
+        )
+    except WorkerPoolBusy as e:
+        raise overloaded(e)
+    except ColumnarValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка при обработке: {str(e)}")
+    
+    record_stages('/infer/columnar', pool_timings)
+    
+    # Спаны в заголовке не передаются: они есть в /metrics
+    timings = {"queue_wait": pool_timings['queue_wait'], "exec": pool_timings['exec'], "stages": stages}
+    headers = {
+        "X-Result-Table": table,
+        "X-Rows": json.dumps(rows),
+        "X-Timings": json.dumps(timings),
+    }
+    if profile_id is not None:
+        headers["X-Profile-Id"] = profile_id
+    return Response(content=body, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+@app.get('/profiles/{profile_id}')
+async def download_profile(profile_id: str):
+    """Профиль cProfile запроса с заголовком X-Profile (открывается pstats или snakeviz)"""
+    path = profile_path(profile_id) if profile_id.isalnum() else None
+    if path is None or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return FileResponse(path, media_type='application/octet-stream', filename=f'{profile_id}.prof')
+
+
+@app.get('/metrics')
+async def metrics():
+    """Метрики Prometheus: HTTP-запросы, стадии конвейера, воркеры и очередь задач"""
+    pool = get_worker_pool().stats()
+    store = get_result_store().stats()
+    job_counts = await asyncio.to_thread(_job_store.counts)
+    gauges = [
+        ('news_worker_inflight', 'Задач в работе и в очереди пула воркеров', {(): pool['inflight']}, ()),
+        ('news_jobs', 'Задачи /process-news-file по статусам',
+         {(status,): count for status, count in job_counts.items()}, ('status',)),
+        ('news_result_store_bytes', 'Память хранилища результатов /infer', {(): store['bytes']}, ()),
+    ]
+    return Response(content=get_metrics().render(gauges), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get('/')
 async def root():
     return {
@@ -511,12 +837,34 @@ async def root():
         ],
         "endpoints": [
             "/infer - основной эндпоинт для анализа",
+            "/infer/columnar - анализ с загрузкой таблиц в Arrow/Parquet/NDJSON",
+            "/infer/results/{result_id}/{table} - постраничная выдача полного результата /infer",
+            "/infer/results/{result_id}/{table}/export - выгрузка результата в CSV/Parquet",
             "/process-news-file - обработка файлов с новостями и callback",
+            "/jobs/{sessionId} - статус задачи обработки файла",
+            "/jobs/{sessionId}/result - результат задачи обработки файла",
+            "/jobs/stats - очередь задач",
+            "/callbacks/stats - статистика доставки callback-ов",
+            "/score-cache/stats - статистика кэша скоров новостей",
+            "/metrics - метрики Prometheus по стадиям обработки",
+            "/profiles/{profileId} - профиль запроса с заголовком X-Profile: 1",
             "/health - проверка состояния API"
         ]
     }
 
 
+@app.get('/callbacks/stats')
+async def callbacks_statistics():
+    """Доставленные и недоставленные callback-и, повторы, задержка доставки"""
+    return get_callback_dispatcher().stats()
+
+
+@app.get('/score-cache/stats')
+async def score_cache_statistics():
+    """Статистика кэша скоров новостей: попадания, промахи, размер, вытеснения"""
+    return {"caches": score_cache_stats([os.getenv('ARTIFACTS_DIR', 'artifacts')])}
+
+
 @app.post('/health')
 async def health_check():
     """Проверка доступности артефактов модели"""
@@ -533,7 +881,8 @@ async def health_check():
         if missing_files:
             return {"status": "unhealthy", "missing_files": missing_files}
         else:
-            return {"status": "healthy", "message": "Все артефакты найдены"}
+            return {"status": "healthy", "message": "Все артефакты найдены", "aliases_version": alias_registry.version,
+                    "normalize_cache": normalize_cache_info(), "workers": get_worker_pool().stats()}
             
     except Exception as e:
         return {"status": "error", "message": str(e)}
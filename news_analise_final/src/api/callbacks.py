@@ -0,0 +1,152 @@
+"""
+Доставка callback-ов с результатами обработки
+
+Одна общая aiohttp.ClientSession с пулом keep-alive соединений вместо новой
+сессии (и TCP/TLS-рукопожатия) на каждый callback. Число одновременных
+отправок ограничено, неуспешные отправки повторяются с экспоненциальной
+задержкой, а недоставленные payload-ы пишутся в dead-letter файл (JSONL).
+
+Настройки окружения:
+    CALLBACK_CONCURRENCY        — одновременных отправок (по умолчанию 16)
+    CALLBACK_MAX_ATTEMPTS       — попыток на один callback (по умолчанию 5)
+    CALLBACK_BACKOFF            — первая задержка между попытками, с (по умолчанию 1)
+    CALLBACK_TIMEOUT            — таймаут одной попытки, с (по умолчанию 30)
+    CALLBACK_DEAD_LETTER_PATH   — файл недоставленных callback-ов
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Optional
+
+import aiohttp
+import numpy as np
+
+
+# Ответы, после которых имеет смысл повторить отправку
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class CallbackDispatcher:
+    """Отправка callback-ов через общую сессию с повторами и dead-letter"""
+
+    def __init__(self, concurrency: int = 16, max_attempts: int = 5, backoff: float = 1.0,
+                 timeout: float = 30.0, dead_letter_path: Optional[str] = None):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.timeout = timeout
+        self.dead_letter_path = dead_letter_path
+        self.delivered = 0
+        self.dead_lettered = 0
+        self.retries = 0
+        self.errors = 0
+        self._latencies = deque(maxlen=1000)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Сессия и семафор создаются внутри работающего event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'Content-Type': 'application/json'},
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def send(self, url: str, payload: dict) -> bool:
+        """Доставляет payload на url; False — все попытки исчерпаны, payload записан в dead-letter"""
+        session = self._get_session()
+        session_id = payload.get('sessionId')
+        body = json.dumps(payload, ensure_ascii=False, default=str)
+        error = None
+
+        for attempt in range(1, self.max_attempts + 1):
+            start = time.perf_counter()
+            retryable = True
+            try:
+                async with self._semaphore:
+                    async with session.post(url, data=body) as response:
+                        await response.read()
+                        if 200 <= response.status < 300:
+                            self._latencies.append(time.perf_counter() - start)
+                            self.delivered += 1
+                            logging.info(f"Callback sent successfully to {url} for session {session_id}")
+                            return True
+                        error = f"HTTP {response.status}"
+                        retryable = response.status in RETRYABLE_STATUSES
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {e}"
+
+            self.errors += 1
+            if not retryable or attempt == self.max_attempts:
+                break
+            delay = self.backoff * 2 ** (attempt - 1) * (0.5 + random.random())
+            self.retries += 1
+            logging.warning(f"Callback to {url} for session {session_id} failed ({error}), retry in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+        logging.error(f"Callback to {url} for session {session_id} not delivered: {error}")
+        self._dead_letter(url, payload, error, attempt)
+        return False
+
+    def _dead_letter(self, url: str, payload: dict, error: Optional[str], attempts: int) -> None:
+        self.dead_lettered += 1
+        if not self.dead_letter_path:
+            return
+        record = {'ts': time.time(), 'url': url, 'error': error, 'attempts': attempts, 'payload': payload}
+        try:
+            if os.path.dirname(self.dead_letter_path):
+                os.makedirs(os.path.dirname(self.dead_letter_path), exist_ok=True)
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        except OSError as e:
+            logging.error(f"Не удалось записать dead-letter {self.dead_letter_path}: {e}")
+
+    def stats(self) -> dict:
+        latencies = np.fromiter(self._latencies, dtype=np.float64)
+        return {
+            'delivered': self.delivered,
+            'dead_lettered': self.dead_lettered,
+            'retries': self.retries,
+            'errors': self.errors,
+            'latency_p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'latency_p95': float(np.percentile(latencies, 95)) if len(latencies) else None,
+            'latency_max': float(latencies.max()) if len(latencies) else None,
+            'dead_letter_path': self.dead_letter_path,
+        }
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+_dispatcher: Optional[CallbackDispatcher] = None
+
+
+def get_callback_dispatcher() -> CallbackDispatcher:
+    """Общий на процесс диспетчер callback-ов с настройками из окружения"""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = CallbackDispatcher(
+            concurrency=int(os.getenv('CALLBACK_CONCURRENCY', '16')),
+            max_attempts=int(os.getenv('CALLBACK_MAX_ATTEMPTS', '5')),
+            backoff=float(os.getenv('CALLBACK_BACKOFF', '1')),
+            timeout=float(os.getenv('CALLBACK_TIMEOUT', '30')),
+            dead_letter_path=os.getenv('CALLBACK_DEAD_LETTER_PATH', os.path.join('jobs', 'callbacks_dead_letter.jsonl')),
+        )
+    return _dispatcher
+
+
+async def close_callback_dispatcher() -> None:
+    global _dispatcher
+    if _dispatcher is not None:
+        await _dispatcher.close()
+        _dispatcher = None
@@ -0,0 +1,113 @@
+"""
+Колоночные форматы запросов и ответов /infer/columnar
+
+Таблицы новостей и свечей приходят целиком в Arrow IPC, Parquet или NDJSON
+(в т.ч. gzip), читаются сразу в DataFrame и проверяются по схеме одним
+проходом по колонкам вместо pydantic-валидации каждой строки.
+"""
+import gzip
+import io
+from typing import Dict, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+
+
+FORMATS = ('arrow', 'parquet', 'ndjson', 'ndjson.gz')
+
+MEDIA_TYPES = {
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+    'ndjson': 'application/x-ndjson',
+    'ndjson.gz': 'application/gzip',
+}
+
+# Схемы входных таблиц: колонка -> вид значения
+NEWS_SCHEMA = {'publish_date': 'datetime', 'title': 'string', 'publication': 'string'}
+CANDLES_SCHEMA = {
+    'begin': 'datetime', 'ticker': 'string',
+    'open': 'float', 'high': 'float', 'low': 'float', 'close': 'float', 'volume': 'float',
+}
+
+
+class ColumnarValidationError(ValueError):
+    """Входная таблица не соответствует схеме"""
+
+
+def detect_format(data: bytes) -> str:
+    """Формат по сигнатуре: Parquet (PAR1), Arrow IPC (поток или файл), gzip, иначе NDJSON"""
+    if data[:4] == b'PAR1':
+        return 'parquet'
+    if data[:6] == b'ARROW1' or data[:4] == b'\xff\xff\xff\xff':
+        return 'arrow'
+    if data[:2] == b'\x1f\x8b':
+        return 'ndjson.gz'
+    return 'ndjson'
+
+
+def read_table(data: bytes, fmt: Optional[str] = None) -> pd.DataFrame:
+    fmt = fmt or detect_format(data)
+    try:
+        if fmt == 'parquet':
+            return pd.read_parquet(io.BytesIO(data))
+        if fmt == 'arrow':
+            if data[:6] == b'ARROW1':
+                return pa.ipc.open_file(pa.BufferReader(data)).read_pandas()
+            return pa.ipc.open_stream(pa.BufferReader(data)).read_pandas()
+        if fmt == 'ndjson.gz':
+            data = gzip.decompress(data)
+        if not data.strip():
+            return pd.DataFrame()
+        return pd.read_json(io.BytesIO(data), lines=True, dtype=False, convert_dates=False)
+    except ColumnarValidationError:
+        raise
+    except Exception as e:
+        raise ColumnarValidationError(f"Не удалось прочитать таблицу в формате {fmt}: {e}")
+
+
+def write_table(df: pd.DataFrame, fmt: str) -> bytes:
+    if fmt == 'parquet':
+        buf = io.BytesIO()
+        df.to_parquet(buf, index=False)
+        return buf.getvalue()
+    if fmt == 'arrow':
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    body = df.to_json(orient='records', lines=True, date_format='iso', force_ascii=False).encode('utf-8')
+    return gzip.compress(body, compresslevel=5) if fmt == 'ndjson.gz' else body
+
+
+def validate_frame(df: pd.DataFrame, schema: Dict[str, str], name: str) -> pd.DataFrame:
+    """
+    Приводит колонки к типам схемы; все нарушения собираются в одно
+    ColumnarValidationError (отсутствующие колонки, пустые и непарсящиеся значения)
+    """
+    missing = [col for col in schema if col not in df.columns]
+    if missing:
+        raise ColumnarValidationError(f"{name}: отсутствуют колонки {missing}")
+
+    out = df[list(schema)].copy()
+    problems = []
+    for col, kind in schema.items():
+        values = out[col]
+        if kind == 'datetime':
+            converted = pd.to_datetime(values, errors='coerce')
+            if getattr(converted.dt, 'tz', None) is not None:
+                converted = converted.dt.tz_localize(None)
+        elif kind == 'float':
+            converted = pd.to_numeric(values, errors='coerce').astype('float64')
+        else:
+            converted = values.astype(object).where(values.notna(), None)
+            converted = converted.map(lambda v: v if v is None or isinstance(v, str) else str(v))
+        bad = int(converted.isna().sum())
+        if bad:
+            first = int(converted.isna().to_numpy().argmax())
+            problems.append(f"{col}: {bad} пустых или некорректных значений (первая строка {first})")
+        out[col] = converted
+    if problems:
+        raise ColumnarValidationError(f"{name}: " + '; '.join(problems))
+    return out
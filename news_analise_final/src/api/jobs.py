@@ -0,0 +1,278 @@
+"""
+Персистентная очередь задач /process-news-file
+
+Задачи хранятся в SQLite (JOBS_DB_PATH, по умолчанию jobs/jobs.sqlite) и
+переживают перезапуск сервиса: при старте задачи в статусе running
+возвращаются в очередь. JobDispatcher забирает задачи из базы не больше
+max_concurrency одновременно, выполняет их обработчиком и повторяет упавшие
+с экспоненциальной задержкой до max_attempts попыток. on_success вызывается
+только после того, как результат сохранен в базе. Если задан job_ttl,
+тот же цикл раз в purge_interval удаляет завершенные задачи старше job_ttl
+и передает их jobId в on_purge (удаление файлов результатов). Обращения к
+SQLite и on_purge диспетчер выполняет в потоке (asyncio.to_thread), чтобы
+запись в базу не останавливала цикл событий API.
+
+Статусы: queued → running → succeeded | failed (между попытками снова queued).
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from src.api.workers import WorkerPoolBusy
+
+
+JOB_COLUMNS = (
+    'job_id', 'session_id', 'status', 'attempts', 'max_attempts', 'error',
+    'created_at', 'started_at', 'finished_at', 'next_run_at',
+)
+
+
+class JobStore:
+    """Таблица задач в SQLite"""
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'job_id TEXT PRIMARY KEY, session_id TEXT NOT NULL, status TEXT NOT NULL, '
+            'payload TEXT NOT NULL, result TEXT, error TEXT, '
+            'attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, '
+            'created_at REAL NOT NULL, started_at REAL, finished_at REAL, next_run_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_session ON jobs(session_id, created_at)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_queue ON jobs(status, next_run_at)')
+
+    def enqueue(self, session_id: str, payload: dict, max_attempts: int = 3) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO jobs (job_id, session_id, status, payload, max_attempts, created_at, next_run_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, session_id, 'queued', json.dumps(payload, ensure_ascii=False, default=str), max_attempts, now, now),
+            )
+        return job_id
+
+    def claim(self, limit: int) -> List[dict]:
+        """Переводит до limit готовых к запуску задач в running и возвращает их вместе с payload"""
+        if limit <= 0:
+            return []
+        now = time.time()
+        claimed = []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id FROM jobs WHERE status = 'queued' AND next_run_at <= ? ORDER BY created_at LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            for (job_id,) in rows:
+                cur = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = ? "
+                    "WHERE job_id = ? AND status = 'queued'",
+                    (now, job_id),
+                )
+                if cur.rowcount:
+                    claimed.append(self._get(job_id, with_payload=True))
+        return claimed
+
+    def complete(self, job_id: str, result: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, finished_at = ? WHERE job_id = ?",
+                (result, time.time(), job_id),
+            )
+
+    def retry(self, job_id: str, error: str, delay: float, count_attempt: bool = True) -> None:
+        """Возвращает задачу в очередь через delay секунд"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', error = ?, next_run_at = ?, "
+                "attempts = attempts - ? WHERE job_id = ?",
+                (error, time.time() + delay, 0 if count_attempt else 1, job_id),
+            )
+
+    def fail(self, job_id: str, error: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE job_id = ?",
+                (error, time.time(), job_id),
+            )
+
+    def purge(self, max_age: float) -> List[str]:
+        """Удаляет задачи, завершенные раньше max_age секунд назад; возвращает их jobId"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+                (time.time() - max_age,),
+            ).fetchall()
+            job_ids = [job_id for (job_id,) in rows]
+            for i in range(0, len(job_ids), 500):
+                chunk = job_ids[i:i + 500]
+                self._conn.execute(f'DELETE FROM jobs WHERE job_id IN ({",".join("?" * len(chunk))})', chunk)
+        return job_ids
+
+    def recover(self) -> int:
+        """Задачи, прерванные остановкой сервиса, снова ставятся в очередь"""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', next_run_at = ? WHERE status = 'running'", (time.time(),)
+            )
+            return cur.rowcount
+
+    def _get(self, job_id: str, with_payload: bool = False) -> Optional[dict]:
+        columns = JOB_COLUMNS + (('payload',) if with_payload else ())
+        row = self._conn.execute(f'SELECT {", ".join(columns)} FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(columns, row))
+        if with_payload:
+            job['payload'] = json.loads(job['payload'])
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            return self._get(job_id)
+
+    def latest_for_session(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT job_id FROM jobs WHERE session_id = ? ORDER BY created_at DESC LIMIT 1', (session_id,)
+            ).fetchone()
+            return self._get(row[0]) if row else None
+
+    def result(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute('SELECT result FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        counts = {status: 0 for status in ('queued', 'running', 'succeeded', 'failed')}
+        counts.update(dict(rows))
+        return counts
+
+
+JobHandler = Callable[[dict], Awaitable[Optional[str]]]
+SuccessHandler = Callable[[dict], Awaitable[Any]]
+FailureHandler = Callable[[dict, str], Awaitable[Any]]
+PurgeHandler = Callable[[List[str]], Any]
+
+
+class JobDispatcher:
+    """Фоновый цикл, выполняющий задачи из JobStore с ограничением параллелизма"""
+
+    def __init__(self, store: JobStore, handler: JobHandler, on_failure: Optional[FailureHandler] = None,
+                 on_success: Optional[SuccessHandler] = None,
+                 max_concurrency: int = 2, poll_interval: float = 1.0, retry_base_delay: float = 5.0,
+                 job_ttl: Optional[float] = None, on_purge: Optional[PurgeHandler] = None,
+                 purge_interval: float = 60.0):
+        self.store = store
+        self.handler = handler
+        self.on_failure = on_failure
+        self.on_success = on_success
+        self.max_concurrency = max_concurrency
+        self.poll_interval = poll_interval
+        self.retry_base_delay = retry_base_delay
+        self.job_ttl = job_ttl
+        self.on_purge = on_purge
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._active: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> int:
+        """Возвращает в очередь прерванные задачи и запускает цикл; возвращает число восстановленных"""
+        recovered = self.store.recover()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._loop())
+        return recovered
+
+    def notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self) -> None:
+        """Останавливает цикл; незавершенные задачи останутся running и будут восстановлены при старте"""
+        tasks = [t for t in [self._task, *self._active.values()] if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._active.clear()
+
+    @property
+    def active(self) -> int:
+        return len(self._active)
+
+    def _purge_sync(self) -> List[str]:
+        job_ids = self.store.purge(self.job_ttl)
+        if self.on_purge is not None:
+            self.on_purge(job_ids)
+        return job_ids
+
+    async def _purge(self) -> None:
+        if self.job_ttl is None or time.monotonic() < self._next_purge:
+            return
+        self._next_purge = time.monotonic() + self.purge_interval
+        try:
+            job_ids = await asyncio.to_thread(self._purge_sync)
+        except Exception as e:
+            logging.warning(f"Job purge failed: {type(e).__name__}: {e}")
+            return
+        if job_ids:
+            logging.info(f"Purged {len(job_ids)} finished jobs older than {self.job_ttl:.0f}s")
+
+    async def _loop(self) -> None:
+        while True:
+            await self._purge()
+            for job in await asyncio.to_thread(self.store.claim, self.max_concurrency - len(self._active)):
+                task = asyncio.create_task(self._run(job))
+                self._active[job['job_id']] = task
+                task.add_done_callback(lambda _t, job_id=job['job_id']: self._active.pop(job_id, None))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, job: dict) -> None:
+        try:
+            result = await self.handler(job)
+            await asyncio.to_thread(self.store.complete, job['job_id'], result)
+        except asyncio.CancelledError:
+            raise
+        except WorkerPoolBusy as e:
+            # Пул занят запросами /infer: попытка не засчитывается
+            await asyncio.to_thread(self.store.retry, job['job_id'], str(e), e.retry_after, count_attempt=False)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if job['attempts'] < job['max_attempts']:
+                delay = self.retry_base_delay * 2 ** (job['attempts'] - 1)
+                logging.warning(f"Job {job['job_id']} failed (attempt {job['attempts']}), retry in {delay:.0f}s: {error}")
+                await asyncio.to_thread(self.store.retry, job['job_id'], error, delay)
+            else:
+                logging.error(f"Job {job['job_id']} failed permanently: {error}")
+                await asyncio.to_thread(self.store.fail, job['job_id'], error)
+                if self.on_failure is not None:
+                    await self.on_failure(job, error)
+        else:
+            # Задача уже сохранена как succeeded: ошибка on_success ее не перезапускает
+            if self.on_success is not None:
+                try:
+                    await self.on_success(job)
+                except Exception as e:
+                    logging.warning(f"Job {job['job_id']} on_success failed: {type(e).__name__}: {e}")
+        finally:
+            self.notify()
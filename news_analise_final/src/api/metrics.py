@@ -0,0 +1,188 @@
+"""
+Метрики Prometheus для /metrics
+
+Спаны стадий (src/core/tracing.py), собранные в воркерах и в процессе API,
+агрегируются здесь в гистограммы длительности с метками endpoint, stage и
+размерными корзинами rows/bytes. Корзины вместо точных чисел держат число
+временных рядов ограниченным. Формат вывода — текстовый формат Prometheus
+0.0.4, без зависимости от prometheus_client.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Верхние границы корзин меток rows и bytes
+ROW_BOUNDS = (100, 1_000, 10_000, 100_000, 1_000_000)
+BYTE_BOUNDS = (64 << 10, 1 << 20, 16 << 20, 256 << 20)
+
+
+def _human(value: int, units: Sequence[Tuple[int, str]]) -> str:
+    for size, suffix in units:
+        if value >= size and value % size == 0:
+            return f'{value // size}{suffix}'
+    return str(value)
+
+
+_ROW_UNITS = ((1_000_000, 'M'), (1_000, 'k'))
+_BYTE_UNITS = ((1 << 30, 'GiB'), (1 << 20, 'MiB'), (1 << 10, 'KiB'))
+
+
+def size_bucket(value: Optional[int], bounds: Sequence[int], units: Sequence[Tuple[int, str]]) -> str:
+    """Метка корзины: '1k-10k', '256MiB+', 'none' для неизвестного размера"""
+    if value is None:
+        return 'none'
+    lower = 0
+    for upper in bounds:
+        if value <= upper:
+            return f'{_human(lower, units)}-{_human(upper, units)}'
+        lower = upper
+    return f'{_human(lower, units)}+'
+
+
+def rows_bucket(rows: Optional[int]) -> str:
+    return size_bucket(rows, ROW_BOUNDS, _ROW_UNITS)
+
+
+def bytes_bucket(nbytes: Optional[int]) -> str:
+    return size_bucket(nbytes, BYTE_BOUNDS, _BYTE_UNITS)
+
+
+def _format_value(value: float) -> str:
+    """Значение без потери точности (как floatToGoString в prometheus_client), а не :g с 6 знаками"""
+    value = float(value)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    if value.is_integer() and abs(value) < 2 ** 53:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str]):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, labels: Sequence[str], amount: float = 1.0) -> None:
+        key = tuple(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for key, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str], buckets: Sequence[float] = DURATION_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [счетчики по корзинам, сумма, количество]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, labels: Sequence[str], value: float) -> None:
+        key = tuple(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for key, (counts, total, count) in sorted(self._series.items()):
+            for upper, bucket_count in zip(self.buckets, counts):
+                le = 'le="%g"' % upper
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, le)} {bucket_count}')
+            le = 'le="+Inf"'
+            lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, le)} {count}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class PipelineMetrics:
+    """Метрики процесса API: HTTP-запросы, ожидание воркера и стадии конвейера"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter('news_http_requests_total', 'HTTP-запросы по маршруту и коду ответа',
+                                ('method', 'route', 'status'))
+        self.request_seconds = Histogram('news_http_request_duration_seconds', 'Длительность HTTP-запросов',
+                                         ('method', 'route'))
+        self.queue_wait = Histogram('news_worker_queue_wait_seconds', 'Ожидание свободного воркера',
+                                    ('endpoint',))
+        self.stage_seconds = Histogram('news_stage_duration_seconds', 'Длительность стадий конвейера',
+                                       ('endpoint', 'stage', 'rows', 'bytes'))
+        self.stage_rows = Counter('news_stage_rows_total', 'Строк обработано стадией', ('endpoint', 'stage'))
+        self.stage_bytes = Counter('news_stage_bytes_total', 'Байт прочитано или записано стадией', ('endpoint', 'stage'))
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        with self._lock:
+            self.requests.inc((method, route, str(status)))
+            self.request_seconds.observe((method, route), seconds)
+
+    def observe_spans(self, endpoint: str, spans: Iterable[dict], queue_wait: Optional[float] = None) -> None:
+        with self._lock:
+            if queue_wait is not None:
+                self.queue_wait.observe((endpoint,), queue_wait)
+            for item in spans:
+                rows, nbytes = item.get('rows'), item.get('bytes')
+                self.stage_seconds.observe(
+                    (endpoint, item['name'], rows_bucket(rows), bytes_bucket(nbytes)), item['seconds']
+                )
+                if rows:
+                    self.stage_rows.inc((endpoint, item['name']), rows)
+                if nbytes:
+                    self.stage_bytes.inc((endpoint, item['name']), nbytes)
+
+    def render(self, gauges: Iterable[Tuple[str, str, Dict[tuple, float], Sequence[str]]] = ()) -> str:
+        """
+        Текст для /metrics; gauges — текущие значения, снимаемые в момент запроса:
+        (имя, описание, {значения меток: значение}, имена меток)
+        """
+        with self._lock:
+            lines = []
+            for metric in (self.requests, self.request_seconds, self.queue_wait,
+                           self.stage_seconds, self.stage_rows, self.stage_bytes):
+                lines.extend(metric.render())
+        for name, help_text, values, labelnames in gauges:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            for key, value in sorted(values.items()):
+                lines.append(f'{name}{_labels(labelnames, key)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+_metrics: Optional[PipelineMetrics] = None
+
+
+def get_metrics() -> PipelineMetrics:
+    global _metrics
+    if _metrics is None:
+        _metrics = PipelineMetrics()
+    return _metrics
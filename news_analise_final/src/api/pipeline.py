@@ -0,0 +1,167 @@
+"""
+CPU-стадии обработки запроса: разметка тикеров, скоринг и агрегация
+
+Функции модуля не зависят от FastAPI и выполняются в процессах пула воркеров
+(src/api/workers.py). Каждый процесс держит свой реестр алиасов и свой
+движок инференса. Стадии пишутся спанами в трассу задачи (src/core/tracing.py).
+"""
+import os
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from src.api.columnar import CANDLES_SCHEMA, NEWS_SCHEMA, detect_format, read_table, validate_frame, write_table
+from src.core.auto_label_tickers import AliasRegistry
+from src.core.infer_news_to_candles import infer_news_to_candles_df
+from src.core.inference_engine import get_inference_engine
+from src.core.tracing import span, start_trace
+
+
+# Реестр алиасов загружается при старте; матчер пересобирается только при изменении файла алиасов
+alias_registry = AliasRegistry(os.getenv('ALIASES_PATH'))
+
+
+def label_news_frame(df_news: pd.DataFrame) -> pd.DataFrame:
+    """Колонка tickers для всей таблицы новостей за один вызов матчера"""
+    df_news['tickers'] = alias_registry.get().label_frame(df_news)
+    return df_news
+
+
+def load_news_frame(news) -> pd.DataFrame:
+    """Таблица новостей из DataFrame, пути к Parquet-файлу или списка словарей"""
+    if isinstance(news, pd.DataFrame):
+        return news.copy()
+    if isinstance(news, str):
+        return pd.read_parquet(news)
+    return pd.DataFrame(news)
+
+
+def auto_label_news(news_dicts: List[Dict]) -> List[Dict]:
+    """Автоматическая разметка тикеров для новостей"""
+    return label_news_frame(pd.DataFrame(news_dicts)).to_dict(orient='records')
+
+
+def run_inference(
+    news,
+    candles_dicts: List[Dict],
+    artifacts_dir: str,
+    p_threshold: float,
+    half_life_days: float,
+    max_days: float,
+    add_sentiment: bool,
+    quantized: bool = False,
+    backend: Optional[str] = None,
+) -> tuple:
+    """
+    Полный конвейер запроса: разметка → скоринг → агрегация
+
+    news — DataFrame, путь к Parquet-файлу или список словарей (см. load_news_frame);
+    backend — бэкенд движка инференса (src/core/inference_engine.py)
+
+    Returns:
+        (features_df, joined_df, stages), где stages — время стадий в секундах
+    """
+    with start_trace() as trace:
+        with span('load'):
+            engine = get_inference_engine(artifacts_dir, quantized, backend)
+
+        with span('labeling') as labeling:
+            df_news = label_news_frame(load_news_frame(news))
+            labeling['rows'] = len(df_news)
+
+        features_df, joined_df = infer_news_to_candles_df(
+            df_news, pd.DataFrame(candles_dicts), artifacts_dir,
+            p_threshold=p_threshold,
+            half_life_days=half_life_days,
+            max_days=max_days,
+            add_sentiment=add_sentiment,
+            engine=engine,
+        )
+    return features_df, joined_df, trace.stages()
+
+
+def write_results(features_df: pd.DataFrame, joined_df: pd.DataFrame, out_dir: str) -> Dict[str, dict]:
+    """Пишет features и joined в Parquet, возвращает путь, число строк и размер каждого файла"""
+    os.makedirs(out_dir, exist_ok=True)
+    files = {}
+    for name, df in (('features', features_df), ('joined', joined_df)):
+        with span('write', rows=len(df)) as write:
+            path = os.path.abspath(os.path.join(out_dir, f'{name}.parquet'))
+            tmp_path = path + '.tmp'
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+            write['bytes'] = os.path.getsize(path)
+        files[name] = {'path': path, 'rows': len(df), 'bytes': write['bytes']}
+    return files
+
+
+def run_inference_to_files(
+    news,
+    candles_dicts: List[Dict],
+    artifacts_dir: str,
+    p_threshold: float,
+    half_life_days: float,
+    max_days: float,
+    add_sentiment: bool,
+    quantized: bool,
+    out_dir: str,
+    backend: Optional[str] = None,
+) -> tuple:
+    """
+    run_inference с записью результата в out_dir прямо в воркере: датафреймы
+    не возвращаются в процесс API и не сериализуются в JSON
+
+    Returns:
+        (files, stages) — описание файлов (write_results) и время стадий
+    """
+    with start_trace() as trace:
+        features_df, joined_df, _ = run_inference(
+            news, candles_dicts, artifacts_dir,
+            p_threshold, half_life_days, max_days, add_sentiment, quantized, backend,
+        )
+        files = write_results(features_df, joined_df, out_dir)
+    return files, trace.stages()
+
+
+def run_inference_columnar(
+    news_data: bytes,
+    candles_data: bytes,
+    artifacts_dir: str,
+    p_threshold: float,
+    half_life_days: float,
+    max_days: float,
+    add_sentiment: bool,
+    quantized: bool = False,
+    table: str = 'joined',
+    response_format: Optional[str] = None,
+    backend: Optional[str] = None,
+) -> tuple:
+    """
+    Конвейер /infer/columnar целиком в воркере: чтение и проверка колоночных
+    таблиц, инференс и сериализация результата в response_format
+    (по умолчанию — формат таблицы новостей)
+
+    Returns:
+        (body, response_format, rows, stages)
+    """
+    with start_trace() as trace:
+        with span('read', nbytes=len(news_data) + len(candles_data)) as read:
+            news_format = detect_format(news_data)
+            df_news = validate_frame(read_table(news_data, news_format), NEWS_SCHEMA, 'news')
+            df_candles = validate_frame(read_table(candles_data), CANDLES_SCHEMA, 'candles')
+            read['rows'] = len(df_news) + len(df_candles)
+
+        features_df, joined_df, _ = run_inference(
+            df_news, df_candles, artifacts_dir,
+            p_threshold, half_life_days, max_days, add_sentiment, quantized, backend,
+        )
+
+        result = joined_df if table == 'joined' else features_df
+        with span('write', rows=len(result)) as write:
+            response_format = response_format or news_format
+            body = write_table(result, response_format)
+            write['bytes'] = len(body)
+    stages = trace.stages()
+
+    rows = {'news': len(df_news), 'candles': len(df_candles), 'features': len(features_df), 'joined': len(joined_df)}
+    return body, response_format, rows, stages
@@ -0,0 +1,113 @@
+"""
+Хранилище результатов /infer для постраничной выдачи и экспорта
+
+Посчитанные features_df и joined_df держатся в памяти процесса API под
+result_id, чтобы клиент мог забрать их целиком без повторного расчета.
+Записи живут RESULT_TTL_SECONDS, общее число записей и занимаемая память
+ограничены; при переполнении вытесняются самые старые.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import pandas as pd
+
+
+RESULT_TABLES = ('features', 'joined')
+
+
+class StoredResult:
+    def __init__(self, result_id: str, tables: Dict[str, pd.DataFrame], ttl: float):
+        self.result_id = result_id
+        self.tables = tables
+        self.created_at = time.time()
+        self.expires_at = self.created_at + ttl
+        self.nbytes = int(sum(df.memory_usage(deep=True).sum() for df in tables.values()))
+
+
+class ResultStore:
+    """Ограниченное по числу записей, памяти и времени жизни хранилище таблиц"""
+
+    def __init__(self, ttl: float = 900.0, max_items: int = 32, max_bytes: int = 1 << 30):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._items: "OrderedDict[str, StoredResult]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _drop(self, result_id: str) -> None:
+        item = self._items.pop(result_id)
+        self._bytes -= item.nbytes
+
+    def _expire(self) -> None:
+        now = time.time()
+        for result_id in [rid for rid, item in self._items.items() if item.expires_at <= now]:
+            self._drop(result_id)
+            self.evictions += 1
+
+    def put(self, features_df: pd.DataFrame, joined_df: pd.DataFrame) -> Optional[StoredResult]:
+        """Сохраняет результат; возвращает None, если он один больше max_bytes"""
+        item = StoredResult(uuid.uuid4().hex, {'features': features_df, 'joined': joined_df}, self.ttl)
+        if item.nbytes > self.max_bytes:
+            return None
+        with self._lock:
+            self._expire()
+            while self._items and (len(self._items) >= self.max_items or self._bytes + item.nbytes > self.max_bytes):
+                self._drop(next(iter(self._items)))
+                self.evictions += 1
+            self._items[item.result_id] = item
+            self._bytes += item.nbytes
+        return item
+
+    def get(self, result_id: str) -> Optional[StoredResult]:
+        with self._lock:
+            self._expire()
+            return self._items.get(result_id)
+
+    def delete(self, result_id: str) -> bool:
+        with self._lock:
+            if result_id not in self._items:
+                return False
+            self._drop(result_id)
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._expire()
+            return {
+                'items': len(self._items),
+                'bytes': self._bytes,
+                'max_items': self.max_items,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'evictions': self.evictions,
+            }
+
+
+_store: Optional[ResultStore] = None
+
+
+def get_result_store() -> ResultStore:
+    """Хранилище процесса API с настройками из окружения"""
+    global _store
+    if _store is None:
+        _store = ResultStore(
+            ttl=float(os.getenv('RESULT_TTL_SECONDS', '900')),
+            max_items=int(os.getenv('RESULT_STORE_MAX_ITEMS', '32')),
+            max_bytes=int(os.getenv('RESULT_STORE_MAX_BYTES', str(1 << 30))),
+        )
+    return _store
+
+
+def iter_csv_chunks(df: pd.DataFrame, chunk_rows: int = 50000):
+    """CSV по частям: заголовок с первой частью, без построения всей строки в памяти"""
+    if df.empty:
+        yield df.to_csv(index=False).encode('utf-8')
+        return
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=start == 0).encode('utf-8')
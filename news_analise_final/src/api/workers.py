@@ -0,0 +1,157 @@
+"""
+Ограниченный пул воркеров для CPU-стадий
+
+Разметка, GRU-скоринг и агрегация pandas выполняются в отдельных процессах,
+чтобы тяжелый запрос не блокировал event loop (и вместе с ним /health).
+Число процессов и глубина очереди задаются переменными окружения:
+
+    INFER_WORKERS        — число процессов (0 — один поток в процессе API)
+    INFER_QUEUE_DEPTH    — сколько задач может ждать свободного воркера
+    INFER_TORCH_THREADS  — torch.set_num_threads в каждом воркере
+
+Если все воркеры заняты и очередь заполнена, run() сразу бросает WorkerPoolBusy,
+а API отвечает 503 с Retry-After.
+
+Задача выполняется внутри трассы (src/core/tracing.py): ее спаны возвращаются
+в процесс API вместе с результатом. По запросу задача профилируется cProfile,
+профиль пишется в файл прямо в воркере.
+"""
+import asyncio
+import cProfile
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.core.tracing import start_trace
+
+
+class WorkerPoolBusy(Exception):
+    """Все воркеры заняты и очередь заполнена"""
+
+    def __init__(self, inflight: int, capacity: int, retry_after: int = 5):
+        super().__init__(f"Сервис перегружен: {inflight} задач при емкости {capacity}")
+        self.retry_after = retry_after
+
+
+def _init_worker(torch_threads: int) -> None:
+    import torch
+    torch.set_num_threads(torch_threads)
+
+
+def _timed_call(fn: Callable, args: tuple, kwargs: dict,
+                profile_path: Optional[str] = None) -> Tuple[Any, float, float, List[dict]]:
+    """Выполняется в воркере: результат, момент старта, время выполнения и спаны трассы"""
+    started = time.time()
+    exec_start = time.perf_counter()
+    profiler = cProfile.Profile() if profile_path else None
+    with start_trace() as trace:
+        if profiler is None:
+            result = fn(*args, **kwargs)
+        else:
+            try:
+                result = profiler.runcall(fn, *args, **kwargs)
+            finally:
+                if os.path.dirname(profile_path):
+                    os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+                profiler.dump_stats(profile_path)
+    return result, started, time.perf_counter() - exec_start, trace.spans
+
+
+class WorkerPool:
+    """Пул процессов с ограничением числа задач в работе и в очереди"""
+
+    def __init__(self, workers: int, queue_depth: int, torch_threads: int = 1):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.capacity = max(workers, 1) + queue_depth
+        self.torch_threads = torch_threads
+        self.inflight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.workers > 0:
+                # spawn: форк процесса с уже инициализированным torch может зависнуть
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.torch_threads,),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+        return self._executor
+
+    def has_capacity(self) -> bool:
+        return self.inflight < self.capacity
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Выполняет fn(*args, **kwargs) в пуле
+
+        Returns:
+            (результат, {'queue_wait': ..., 'exec': ..., 'spans': [...]}) — время в секундах
+        """
+        return await self.run_call(fn, args, kwargs)
+
+    async def run_call(self, fn: Callable, args: tuple = (), kwargs: Optional[dict] = None,
+                       profile_path: Optional[str] = None) -> Tuple[Any, Dict[str, Any]]:
+        """run с явными args/kwargs; profile_path — записать cProfile задачи в этот файл"""
+        if not self.has_capacity():
+            self.rejected += 1
+            raise WorkerPoolBusy(self.inflight, self.capacity)
+
+        self.inflight += 1
+        submitted = time.time()
+        try:
+            future = self._get_executor().submit(_timed_call, fn, args, kwargs or {}, profile_path)
+            result, started, exec_time, spans = await asyncio.wrap_future(future)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.inflight -= 1
+        self.completed += 1
+        return result, {'queue_wait': max(started - submitted, 0.0), 'exec': exec_time, 'spans': spans}
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'queue_depth': self.queue_depth,
+            'inflight': self.inflight,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_pool: Optional[WorkerPool] = None
+
+
+def get_worker_pool() -> WorkerPool:
+    """Пул процесса API, создается при первом обращении по настройкам из окружения"""
+    global _pool
+    if _pool is None:
+        cpu = os.cpu_count() or 1
+        workers = int(os.getenv('INFER_WORKERS', str(min(2, cpu))))
+        queue_depth = int(os.getenv('INFER_QUEUE_DEPTH', '8'))
+        torch_threads = int(os.getenv('INFER_TORCH_THREADS', str(max(1, cpu // max(workers, 1)))))
+        _pool = WorkerPool(workers, queue_depth, torch_threads)
+    return _pool
+
+
+def shutdown_worker_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
@@ -1,12 +1,20 @@
 import argparse
+import hashlib
 import json
 import os
 import re
-from typing import Dict, List, Tuple
+import threading
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
-from rapidfuzz import fuzz
-from src.core.news_nlp import normalize_text
+from rapidfuzz import fuzz, process
+from src.core.news_nlp import normalize_text, normalize_texts, normalize_pairs
+
+try:
+    import ahocorasick
+except Exception:
+    ahocorasick = None
 
 
 DEFAULT_ALIASES = {
@@ -72,6 +80,135 @@ def assign_tickers_row(title: str, body: str, aliases: Dict[str, str], thresh: i
     return sorted(found)
 
 
+class AliasMatcher:
+    """
+    Скомпилированный матчер алиасов для пакетной разметки новостей
+
+    Точные (подстрочные) совпадения ищутся автоматом Ахо–Корасик за один проход
+    по тексту (если установлен pyahocorasick, иначе — проверкой подстрок).
+    Фуззи-совпадения считаются пакетно: rapidfuzz.process.cdist по уникальным
+    словам батча, а результат для каждого слова кэшируется между вызовами.
+    Разметка совпадает с assign_tickers_row.
+    """
+
+    def __init__(self, aliases: Dict[str, str], thresh: int = 80, max_cached_words: int = 200000):
+        self.aliases = dict(aliases)
+        self.thresh = thresh
+        self.max_cached_words = max_cached_words
+        self._keys = list(self.aliases.keys())
+        self._key_tickers = np.array([self.aliases[k] for k in self._keys], dtype=object)
+        self._word_tickers: Dict[str, frozenset] = {}
+        self._automaton = None
+        if ahocorasick is not None and self._keys:
+            automaton = ahocorasick.Automaton()
+            for key, tkr in self.aliases.items():
+                automaton.add_word(key, tkr)
+            automaton.make_automaton()
+            self._automaton = automaton
+
+    def exact_tickers(self, norm: str) -> set:
+        """Тикеры алиасов, входящих в нормализованный текст как подстрока"""
+        if self._automaton is not None:
+            return {tkr for _, tkr in self._automaton.iter(norm)}
+        return {tkr for key, tkr in self.aliases.items() if key in norm}
+
+    def _fuzzy_tickers_for_words(self, words: set) -> Dict[str, frozenset]:
+        """Тикеры фуззи-совпадений для каждого слова; новые слова считаются одним вызовом cdist"""
+        new_words = [w for w in words if w not in self._word_tickers]
+        if new_words:
+            if self._keys:
+                scores = process.cdist(
+                    self._keys, new_words,
+                    scorer=fuzz.partial_ratio,
+                    score_cutoff=self.thresh,
+                    dtype=np.float64,
+                    workers=-1,
+                )
+                hits = scores >= self.thresh
+            else:
+                hits = np.zeros((0, len(new_words)), dtype=bool)
+            if len(self._word_tickers) + len(new_words) > self.max_cached_words:
+                self._word_tickers.clear()
+            for j, w in enumerate(new_words):
+                self._word_tickers[w] = frozenset(self._key_tickers[hits[:, j]])
+        return {w: self._word_tickers[w] for w in words}
+
+    def match_texts(self, texts: List[str], norms: List[str] = None) -> List[List[str]]:
+        """Отсортированные списки тикеров для каждого текста (norms — уже нормализованные тексты)"""
+        if norms is None:
+            norms = normalize_texts(texts)
+        words_per_text = [set(n.split()) for n in norms]
+        word_tickers = self._fuzzy_tickers_for_words(set().union(*words_per_text)) if texts else {}
+
+        result = []
+        for text, norm, words in zip(texts, norms, words_per_text):
+            found = self.exact_tickers(norm)
+            for w in words:
+                found |= word_tickers[w]
+            found.update(extract_upper_tickers(text))
+            result.append(sorted(found))
+        return result
+
+    def label_frame(self, df: pd.DataFrame, title_col: str = 'title', body_col: str = 'publication') -> List[str]:
+        """Колонка tickers ("T1;T2") для всего датафрейма новостей за один вызов"""
+        titles = df[title_col].tolist() if title_col in df.columns else [None] * len(df)
+        bodies = df[body_col].tolist() if body_col in df.columns else [None] * len(df)
+        titles = [f"{title or ''}" for title in titles]
+        bodies = [f"{body or ''}" for body in bodies]
+        texts = [f"{title} {body}" for title, body in zip(titles, bodies)]
+        # Поля нормализуются по отдельности — эти же записи кэша использует скоринг
+        norms = normalize_pairs(titles, bodies)
+        return [';'.join(tks) for tks in self.match_texts(texts, norms)]
+
+
+class AliasRegistry:
+    """
+    Реестр алиасов, загружаемый один раз на процесс
+
+    Держит скомпилированный AliasMatcher и перечитывает пользовательский файл
+    алиасов только при изменении его mtime. version — короткий хэш содержимого
+    словаря, на который могут опираться кэши, зависящие от разметки.
+    """
+
+    def __init__(self, user_aliases_path: Optional[str] = None, thresh: int = 80):
+        self.user_aliases_path = user_aliases_path
+        self.thresh = thresh
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._matcher = None
+        self._version = None
+        self.reload()
+
+    def _file_mtime(self) -> Optional[int]:
+        if not self.user_aliases_path:
+            return None
+        try:
+            return os.stat(self.user_aliases_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self) -> None:
+        """Перечитывает алиасы и пересобирает матчер"""
+        with self._lock:
+            mtime = self._file_mtime()
+            aliases = build_aliases(self.user_aliases_path)
+            payload = json.dumps(sorted(aliases.items()), ensure_ascii=False).encode('utf-8')
+            self._matcher = AliasMatcher(aliases, thresh=self.thresh)
+            self._version = hashlib.sha1(payload).hexdigest()[:12]
+            self._mtime = mtime
+
+    def get(self) -> AliasMatcher:
+        """Актуальный матчер; при изменении файла алиасов он пересобирается"""
+        if self._file_mtime() != self._mtime:
+            self.reload()
+        return self._matcher
+
+    @property
+    def version(self) -> str:
+        self.get()
+        return self._version
+
+
 def main():
     p = argparse.ArgumentParser(description='Авторазметка tickers для новостей')
     p.add_argument('--news', required=True, help='CSV с publish_date,title,publication')
@@ -79,15 +216,11 @@ def main():
     p.add_argument('--aliases', default=None, help='JSON алиасов {"alias": "TICKER"}')
     args = p.parse_args()
 
-    aliases = build_aliases(args.aliases)
+    matcher = AliasMatcher(build_aliases(args.aliases))
     df = pd.read_csv(args.news)
     if 'tickers' in df.columns:
         print('tickers уже есть — перезапишем по авторазметке')
-    tickers_col = []
-    for _, row in df.iterrows():
-        tks = assign_tickers_row(row.get('title'), row.get('publication'), aliases)
-        tickers_col.append(';'.join(tks))
-    df['tickers'] = tickers_col
+    df['tickers'] = matcher.label_frame(df)
     df.to_csv(args.out, index=False)
     print(f'Сохранено: {args.out}')
 
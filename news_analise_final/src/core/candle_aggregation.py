@@ -0,0 +1,192 @@
+"""
+Векторизованная агрегация новостных скоров к свечам (interval join)
+
+Вместо перебора всех пар (тикер, дата) с маской по всем новостям новости
+один раз сортируются по дате и сворачиваются в дневную сетку. Окно
+[дата свечи - max_days, дата свечи] считается через searchsorted-границы и
+кумулятивные суммы (счетчики) и через свертку дневной сетки с весами
+затухания exp(-lambda * дни) (взвешенные суммы и максимумы). Результат
+совпадает с построчной реализацией aggregate_to_candles.
+"""
+import math
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+NN_FEATURE_COLUMNS = ['nn_news_sum', 'nn_news_mean', 'nn_news_max', 'nn_news_count']
+SENTIMENT_FEATURE_COLUMNS = [
+    'sentiment_mean', 'sentiment_sum', 'sentiment_count',
+    'sentiment_positive_count', 'sentiment_negative_count', 'sentiment_neutral_count',
+]
+
+
+def to_day_numbers(values: pd.Series) -> tuple:
+    """Номера дней (int64, дни от эпохи) и маска валидных дат"""
+    ts = pd.to_datetime(values, errors='coerce')
+    if getattr(ts.dt, 'tz', None) is not None:
+        ts = ts.dt.tz_localize(None)
+    valid = ts.notna().to_numpy()
+    days = ts.dt.floor('D').to_numpy().astype('datetime64[D]').astype(np.int64)
+    return days, valid
+
+
+def _daily_reduce(day_idx: np.ndarray, values: np.ndarray, n_days: int, how: str) -> np.ndarray:
+    """Сворачивает строки values [n, K], отсортированные по day_idx, в дневную сетку [n_days, K]"""
+    out = np.zeros((n_days, values.shape[1]), dtype=values.dtype)
+    if len(day_idx) == 0:
+        return out
+    starts = np.flatnonzero(np.r_[True, day_idx[1:] != day_idx[:-1]])
+    ufunc = np.maximum if how == 'max' else np.add
+    out[day_idx[starts]] = ufunc.reduceat(values, starts, axis=0)
+    return out
+
+
+def _decayed_window(daily: np.ndarray, decay: float, window: Optional[int], how: str) -> np.ndarray:
+    """
+    Затухающая оконная сумма/максимум по дневной сетке:
+    out[d] = sum_j / max_j daily[d - j] * exp(-decay * j), j = 0..window
+    """
+    if window is None:
+        # Бесконечное окно — рекуррентно: out[d] = out[d-1] * a (+ | max) daily[d]
+        a = math.exp(-decay)
+        out = np.empty_like(daily)
+        acc = np.zeros(daily.shape[1], dtype=daily.dtype)
+        for d in range(daily.shape[0]):
+            acc = acc * a
+            acc = np.maximum(acc, daily[d]) if how == 'max' else acc + daily[d]
+            out[d] = acc
+        return out
+
+    out = daily.copy()
+    for j in range(1, min(window, daily.shape[0] - 1) + 1):
+        shifted = daily[:-j] * math.exp(-decay * j)
+        if how == 'max':
+            np.maximum(out[j:], shifted, out=out[j:])
+        else:
+            out[j:] += shifted
+    return out
+
+
+def _window_counts(sorted_days: np.ndarray, flags: np.ndarray, lo_days: np.ndarray, hi_days: np.ndarray) -> np.ndarray:
+    """Число отмеченных новостей в окне [lo, hi] для каждой свечи: searchsorted + cumsum"""
+    cum = np.vstack([np.zeros((1, flags.shape[1]), dtype=np.int64), np.cumsum(flags, axis=0, dtype=np.int64)])
+    lo = np.searchsorted(sorted_days, lo_days, side='left')
+    hi = np.searchsorted(sorted_days, hi_days, side='right')
+    return cum[hi] - cum[lo]
+
+
+def aggregate_news_to_candles(
+    df_candles: pd.DataFrame,
+    df_news: pd.DataFrame,
+    scores: np.ndarray,
+    ticker_to_idx: Dict[str, int],
+    sentiment_features: pd.DataFrame = None,
+    half_life_days: float = 2.0,
+    p_threshold: float = 0.5,
+    max_days: float = 20.0,
+) -> pd.DataFrame:
+    """
+    Новостные фичи nn_news_* (и sentiment_*, если переданы sentiment_features)
+    для каждой пары (тикер, дата свечи)
+
+    Args:
+        df_candles: Свечи (колонки begin, ticker)
+        df_news: Новости (колонка publish_date), порядок строк совпадает со scores
+        scores: Вероятности релевантности новостей тикерам [N, num_labels]
+        ticker_to_idx: Отображение тикер -> колонка scores
+        sentiment_features: Результат add_sentiment_to_news (sentiment_score, sentiment_label)
+        half_life_days: Период полураспада влияния новостей
+        p_threshold: Порог релевантности
+        max_days: Максимальный возраст учитываемых новостей (None — без ограничения)
+
+    Returns:
+        Датафрейм с колонками ticker, date и фичами, отсортированный по (ticker, date)
+    """
+    columns = ['ticker', 'date'] + NN_FEATURE_COLUMNS
+    if sentiment_features is not None:
+        columns += SENTIMENT_FEATURE_COLUMNS
+
+    decay = math.log(2) / max(half_life_days, 1e-6)
+    max_days = float(max_days) if max_days is not None else np.inf
+    window = int(max_days) if np.isfinite(max_days) else None
+
+    # Уникальные пары (тикер, день) по известным модели тикерам
+    candles = pd.DataFrame({
+        'ticker': df_candles['ticker'].to_numpy(),
+        'date': pd.to_datetime(df_candles['begin'], errors='coerce').dt.date.to_numpy(),
+    })
+    candle_days, candle_valid = to_day_numbers(df_candles['begin'])
+    candles['day'] = candle_days
+    candles = candles[candle_valid & candles['ticker'].isin(list(ticker_to_idx)).to_numpy()]
+    candles = candles.drop_duplicates(['ticker', 'day']).sort_values(['ticker', 'day'], kind='stable')
+    if candles.empty:
+        return pd.DataFrame(columns=columns)
+
+    labels = np.array(sorted({ticker_to_idx[t] for t in candles['ticker'].unique()}), dtype=np.int64)
+    label_pos = {lbl: i for i, lbl in enumerate(labels)}
+    cand_col = np.array([label_pos[ticker_to_idx[t]] for t in candles['ticker']], dtype=np.int64)
+    cand_day = candles['day'].to_numpy()
+
+    # Дневная сетка от первой новости (или свечи) до последней свечи. Окно не
+    # короче этого отрезка ничего не отсекает и считается как бесконечное:
+    # иначе сетка и свертка росли бы с max_days, а не с данными
+    last_day = int(cand_day.max())
+    news_days, news_valid = to_day_numbers(df_news['publish_date'])
+    data_first_day = int(min(cand_day.min(), news_days[news_valid].min() if news_valid.any() else cand_day.min()))
+    if window is not None and window >= last_day - data_first_day:
+        window = None
+    first_day = data_first_day if window is None else max(int(cand_day.min()) - window, data_first_day)
+    n_days = last_day - first_day + 1
+
+    # Новости внутри сетки, один раз отсортированные по дню
+    keep = news_valid & (news_days >= first_day) & (news_days <= last_day)
+    rows = np.flatnonzero(keep)
+    rows = rows[np.argsort(news_days[rows], kind='stable')]
+    sorted_days = news_days[rows]
+    day_idx = sorted_days - first_day
+
+    probs = np.asarray(scores, dtype=np.float64)[rows][:, labels] if len(rows) else np.zeros((0, len(labels)))
+    relevant = probs >= p_threshold
+    rel_probs = np.where(relevant, probs, 0.0)
+
+    lo_days = cand_day - window if window is not None else np.full_like(cand_day, np.iinfo(np.int64).min)
+    counts = _window_counts(sorted_days, relevant, lo_days, cand_day)
+    cnt = counts[np.arange(len(cand_col)), cand_col]
+
+    grid_row = cand_day - first_day
+    nn_sum = _decayed_window(_daily_reduce(day_idx, rel_probs, n_days, 'sum'), decay, window, 'sum')[grid_row, cand_col]
+    nn_max = _decayed_window(_daily_reduce(day_idx, rel_probs, n_days, 'max'), decay, window, 'max')[grid_row, cand_col]
+    has_news = cnt > 0
+
+    result = {
+        'ticker': candles['ticker'].to_numpy(),
+        'date': candles['date'].to_numpy(),
+        'nn_news_sum': np.where(has_news, nn_sum, 0.0),
+        'nn_news_mean': np.where(has_news, nn_sum / np.maximum(cnt, 1), 0.0),
+        'nn_news_max': np.where(has_news, nn_max, 0.0),
+        'nn_news_count': cnt.astype(np.int64),
+    }
+
+    if sentiment_features is not None:
+        sent_score = sentiment_features['sentiment_score'].to_numpy(dtype=np.float64)[rows]
+        sent_label = sentiment_features['sentiment_label'].to_numpy()[rows]
+        weighted = np.where(relevant, sent_score[:, None], 0.0)
+        sent_sum = _decayed_window(_daily_reduce(day_idx, weighted, n_days, 'sum'), decay, window, 'sum')[grid_row, cand_col]
+
+        label_counts = {}
+        for name, value in (('positive', 2), ('negative', 0), ('neutral', 1)):
+            flags = relevant & (sent_label == value)[:, None]
+            label_counts[name] = _window_counts(sorted_days, flags, lo_days, cand_day)[np.arange(len(cand_col)), cand_col]
+
+        result.update({
+            'sentiment_mean': np.where(has_news, sent_sum / np.maximum(cnt, 1), 1.0),
+            'sentiment_sum': np.where(has_news, sent_sum, 0.0),
+            'sentiment_count': cnt.astype(np.int64),
+            'sentiment_positive_count': label_counts['positive'].astype(np.int64),
+            'sentiment_negative_count': label_counts['negative'].astype(np.int64),
+            'sentiment_neutral_count': label_counts['neutral'].astype(np.int64),
+        })
+
+    return pd.DataFrame(result, columns=columns).reset_index(drop=True)
@@ -1,6 +1,5 @@
 import argparse
 import json
-import math
 import os
 
 import numpy as np
@@ -8,8 +7,10 @@ import pandas as pd
 import torch
 
 from src.ml.nn_model import NewsTickerModel
-from src.ml.nn_data import load_vocab, encode_text
+from src.ml.nn_data import load_vocab, encode_news_batch, to_model_inputs
 from src.core.sentiment_analysis import add_sentiment_to_news
+from src.core.candle_aggregation import aggregate_news_to_candles
+from src.core.tracing import span
 
 
 def load_artifacts(artifacts: str):
@@ -24,7 +25,80 @@ def sigmoid(x):
     return 1 / (1 + np.exp(-x))
 
 
-def score_news(df_news: pd.DataFrame, vocab, model_state, num_labels: int, max_len: int = 256, batch_size: int = 256, add_sentiment: bool = True) -> tuple:
+def build_model(vocab, model_state, num_labels: int, device: torch.device) -> NewsTickerModel:
+    """Создает NewsTickerModel, загружает веса и переводит в eval-режим"""
+    model = NewsTickerModel(vocab_size=len(vocab), num_labels=num_labels)
+    model.load_state_dict(model_state)
+    model.to(device)
+    model.eval()
+    return model
+
+
+def quantize_model(model: torch.nn.Module) -> torch.nn.Module:
+    """Динамическая int8-квантизация GRU и Linear слоев (только CPU); эмбеддинги остаются float"""
+    model = model.to('cpu').eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.GRU, torch.nn.Linear}, dtype=torch.qint8)
+
+
+def predict_scores_bucketed(model: torch.nn.Module, df_news: pd.DataFrame, vocab, num_labels: int, device: torch.device,
+                            max_len: int = 256, batch_size: int = 256) -> np.ndarray:
+    """
+    Скоринг с батчами по длине: новости сортируются по числу токенов, каждый батч
+    обрезается до своей максимальной длины и прогоняется упакованным (lengths),
+    результаты раскладываются обратно в исходном порядке
+    """
+    scores = np.zeros((len(df_news), num_labels), dtype=np.float32)
+    if len(df_news) == 0:
+        return scores
+    ids, lengths = encode_news_batch(df_news['title'].fillna('').tolist(), df_news['publication'].fillna('').tolist(), vocab, max_len)
+    order = np.argsort(-lengths, kind='stable')
+    with torch.no_grad():
+        for i in range(0, len(order), batch_size):
+            rows = order[i:i+batch_size]
+            batch_lengths = lengths[rows]
+            maxL = max(int(batch_lengths[0]), 1)
+            input_ids, attention_mask = to_model_inputs(ids[rows, :maxL], batch_lengths, device)
+            logits = model(input_ids, attention_mask, torch.from_numpy(np.maximum(batch_lengths, 1))).cpu().numpy()
+            scores[rows] = sigmoid(logits)
+    return scores
+
+
+def predict_scores(model: torch.nn.Module, df_news: pd.DataFrame, vocab, num_labels: int, device: torch.device,
+                   max_len: int = 256, batch_size: int = 256, bucketed: bool = False) -> np.ndarray:
+    """
+    Прогон новостей через уже загруженную модель, возвращает матрицу вероятностей [N, num_labels]
+
+    bucketed=True включает батчинг по длине (predict_scores_bucketed); в этом режиме
+    скоры не зависят от состава батча, а от padded-режима отличаются в пределах
+    влияния паддинга на обратный проход bigru.
+    """
+    if bucketed:
+        return predict_scores_bucketed(model, df_news, vocab, num_labels, device, max_len=max_len, batch_size=batch_size)
+    scores = []
+    with torch.no_grad():
+        for i in range(0, len(df_news), batch_size):
+            batch = df_news.iloc[i:i+batch_size]
+            ids, lengths = encode_news_batch(batch['title'].fillna('').tolist(), batch['publication'].fillna('').tolist(), vocab, max_len)
+            input_ids, attention_mask = to_model_inputs(ids, lengths, device)
+            logits = model(input_ids, attention_mask).cpu().numpy()
+            scores.append(sigmoid(logits))
+
+    return np.vstack(scores) if scores else np.zeros((0, num_labels))
+
+
+def news_sentiment(df_news: pd.DataFrame, add_sentiment: bool = True):
+    """Сентимент-фичи по новостям или None, если анализ отключен или завершился ошибкой"""
+    if not add_sentiment:
+        return None
+    try:
+        return add_sentiment_to_news(df_news)
+    except Exception as e:
+        print(f"Предупреждение: не удалось выполнить сентимент-анализ: {e}")
+        return None
+
+
+def score_news(df_news: pd.DataFrame, vocab, model_state, num_labels: int, max_len: int = 256, batch_size: int = 256, add_sentiment: bool = True,
+               bucketed: bool = False) -> tuple:
     """
     Оценка новостей с помощью нейронной сети и сентимент-анализа
     
@@ -36,6 +110,7 @@ def score_news(df_news: pd.DataFrame, vocab, model_state, num_labels: int, max_l
         max_len: Максимальная длина последовательности
         batch_size: Размер батча
         add_sentiment: Добавлять ли сентимент-анализ
+        bucketed: Батчинг по длине с упакованными последовательностями
         
     Returns:
         Кортеж (scores, sentiment_features) где:
@@ -43,39 +118,11 @@ def score_news(df_news: pd.DataFrame, vocab, model_state, num_labels: int, max_l
         - sentiment_features: датафрейм с сентимент-фичами (если add_sentiment=True)
     """
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    model = NewsTickerModel(vocab_size=len(vocab), num_labels=num_labels)
-    model.load_state_dict(model_state)
-    model.to(device)
-    model.eval()
+    model = build_model(vocab, model_state, num_labels, device)
 
-    scores = []
-    with torch.no_grad():
-        for i in range(0, len(df_news), batch_size):
-            batch = df_news.iloc[i:i+batch_size]
-            texts = (batch['title'].fillna('') + ' [SEP] ' + batch['publication'].fillna('')).tolist()
-            ids = [encode_text(t, vocab, max_len) for t in texts]
-            maxL = max(len(x) for x in ids) if ids else 1
-            input_ids = torch.zeros((len(ids), maxL), dtype=torch.long)
-            attention_mask = torch.zeros((len(ids), maxL), dtype=torch.long)
-            for j, seq in enumerate(ids):
-                L = len(seq)
-                input_ids[j, :L] = torch.tensor(seq, dtype=torch.long)
-                attention_mask[j, :L] = 1
-            input_ids = input_ids.to(device)
-            attention_mask = attention_mask.to(device)
-            logits = model(input_ids, attention_mask).cpu().numpy()
-            scores.append(sigmoid(logits))
-    
-    scores_array = np.vstack(scores) if scores else np.zeros((0, num_labels))
-    
-    # Добавляем сентимент-анализ если требуется
-    sentiment_features = None
-    if add_sentiment:
-        try:
-            sentiment_features = add_sentiment_to_news(df_news)
-        except Exception as e:
-            print(f"Предупреждение: не удалось выполнить сентимент-анализ: {e}")
-            sentiment_features = None
+    scores_array = predict_scores(model, df_news, vocab, num_labels, device, max_len=max_len, batch_size=batch_size,
+                                  bucketed=bucketed)
+    sentiment_features = news_sentiment(df_news, add_sentiment)
     
     return scores_array, sentiment_features
 
@@ -90,125 +137,18 @@ def aggregate_to_candles(
     p_threshold: float = 0.5,
     max_days: float = 20.0,
 ) -> pd.DataFrame:
-    scores = np.asarray(scores)
-    df_news = df_news.copy()
-    df_news['publish_date'] = pd.to_datetime(df_news['publish_date'], errors='coerce')
-    df_news['date'] = df_news['publish_date'].dt.date
-
-    df_candles = df_candles.copy()
-    df_candles['begin'] = pd.to_datetime(df_candles['begin'], errors='coerce')
-    df_candles['date'] = df_candles['begin'].dt.date
-
-    news_dates = pd.to_datetime(df_news['date']).values.astype('datetime64[D]')
-
-    decay_lambda = math.log(2) / max(half_life_days, 1e-6)
-    max_days = float(max_days) if max_days is not None else np.inf
-
-    features = []
-    for ticker, g in df_candles.groupby('ticker'):
-        if ticker not in ticker_to_idx:
-            continue
-        label_idx = ticker_to_idx[ticker]
-        probs = np.asarray(scores[:, label_idx], dtype=np.float64)
-        for dt, sub in g.groupby('date'):
-            dt64 = np.datetime64(dt)
-            # окно: новости за последние max_days и не позже даты свечи
-            if np.isfinite(max_days):
-                min_dt64 = dt64 - np.timedelta64(int(max_days), 'D')
-                base_mask = (news_dates <= dt64) & (news_dates >= min_dt64)
-            else:
-                base_mask = (news_dates <= dt64)
-            if not base_mask.any():
-                feature_row = {'ticker': ticker, 'date': dt, 'nn_news_sum': 0.0, 'nn_news_mean': 0.0, 'nn_news_max': 0.0, 'nn_news_count': 0}
-                if sentiment_features is not None:
-                    feature_row.update({
-                        'sentiment_mean': 1.0,
-                        'sentiment_sum': 0.0,
-                        'sentiment_count': 0,
-                        'sentiment_positive_count': 0,
-                        'sentiment_negative_count': 0,
-                        'sentiment_neutral_count': 0
-                    })
-                features.append(feature_row)
-                continue
-            # релевантность по порогу
-            mask_thr = base_mask & (probs >= p_threshold)
-            if not mask_thr.any():
-                feature_row = {'ticker': ticker, 'date': dt, 'nn_news_sum': 0.0, 'nn_news_mean': 0.0, 'nn_news_max': 0.0, 'nn_news_count': 0}
-                if sentiment_features is not None:
-                    feature_row.update({
-                        'sentiment_mean': 1.0,
-                        'sentiment_sum': 0.0,
-                        'sentiment_count': 0,
-                        'sentiment_positive_count': 0,
-                        'sentiment_negative_count': 0,
-                        'sentiment_neutral_count': 0
-                    })
-                features.append(feature_row)
-                continue
-            # затухание
-            deltas = (dt64 - news_dates[mask_thr]).astype('timedelta64[D]').astype(int)
-            weights = np.exp(-decay_lambda * deltas.astype(np.float64))
-            vals = probs[mask_thr]
-            wvals = vals * weights
-            cnt = int(mask_thr.sum())
-            ssum = float(np.sum(wvals))
-            smean = float(np.mean(wvals)) if cnt > 0 else 0.0
-            smax = float(np.max(wvals)) if cnt > 0 else 0.0
-            
-            feature_row = {'ticker': ticker, 'date': dt, 'nn_news_sum': ssum, 'nn_news_mean': smean, 'nn_news_max': smax, 'nn_news_count': cnt}
-            
-            # Добавляем сентимент-фичи если доступны
-            if sentiment_features is not None:
-                # Получаем сентимент для релевантных новостей
-                relevant_news_indices = np.where(mask_thr)[0]
-                if len(relevant_news_indices) > 0:
-                    sentiment_subset = sentiment_features.iloc[relevant_news_indices]
-                    weighted_sentiment = sentiment_subset['sentiment_score'] * weights
-                    
-                    positive_count = (sentiment_subset['sentiment_label'] == 2).sum()
-                    negative_count = (sentiment_subset['sentiment_label'] == 0).sum()
-                    neutral_count = (sentiment_subset['sentiment_label'] == 1).sum()
-                    
-                    feature_row.update({
-                        'sentiment_mean': float(np.mean(weighted_sentiment)),
-                        'sentiment_sum': float(np.sum(weighted_sentiment)),
-                        'sentiment_count': len(sentiment_subset),
-                        'sentiment_positive_count': positive_count,
-                        'sentiment_negative_count': negative_count,
-                        'sentiment_neutral_count': neutral_count
-                    })
-                else:
-                    feature_row.update({
-                        'sentiment_mean': 1.0,
-                        'sentiment_sum': 0.0,
-                        'sentiment_count': 0,
-                        'sentiment_positive_count': 0,
-                        'sentiment_negative_count': 0,
-                        'sentiment_neutral_count': 0
-                    })
-            
-            features.append(feature_row)
-    return pd.DataFrame(features)
-
-
-def infer_news_to_candles_df(news_df: pd.DataFrame, candles_df: pd.DataFrame, artifacts_dir: str, 
-                            p_threshold: float = 0.5, half_life_days: float = 0.5, max_days: int = 5, add_sentiment: bool = True) -> tuple:
-    """Основная функция для инференса новостей с DataFrame входом"""
-    ticker_to_idx, vocab, ckpt = load_artifacts(artifacts_dir)
-    
-    scores, sentiment_features = score_news(news_df, vocab, ckpt['state_dict'], num_labels=len(ticker_to_idx), 
-                       max_len=ckpt['config'].get('max_len', 256), add_sentiment=add_sentiment)
-    
-    features_df = aggregate_to_candles(
-        candles_df, news_df, scores, ticker_to_idx,
+    """Агрегация новостных скоров (и сентимента) к свечам: окно max_days, затухание, порог релевантности"""
+    return aggregate_news_to_candles(
+        df_candles, df_news, scores, ticker_to_idx,
         sentiment_features=sentiment_features,
         half_life_days=half_life_days,
         p_threshold=p_threshold,
         max_days=max_days,
     )
-    
-    # Объединяем свечи с фичами
+
+
+def join_features_to_candles(candles_df: pd.DataFrame, features_df: pd.DataFrame, with_sentiment: bool = False) -> pd.DataFrame:
+    """Свечи с новостными фичами по (ticker, date); у свечей без новостей фичи равны нулю"""
     candles_df_copy = candles_df.copy()
     candles_df_copy['date'] = pd.to_datetime(candles_df_copy['begin'], errors='coerce').dt.date
     features_df_copy = features_df.copy()
@@ -217,13 +157,51 @@ def infer_news_to_candles_df(news_df: pd.DataFrame, candles_df: pd.DataFrame, ar
     
     # Заполняем пропуски нулями
     feature_cols = ['nn_news_sum', 'nn_news_mean', 'nn_news_max', 'nn_news_count']
-    if add_sentiment and sentiment_features is not None:
+    if with_sentiment:
         feature_cols.extend(['sentiment_mean', 'sentiment_sum', 'sentiment_count', 
                             'sentiment_positive_count', 'sentiment_negative_count', 'sentiment_neutral_count'])
     
     for col in feature_cols:
         if col in joined_df.columns:
             joined_df[col] = joined_df[col].fillna(0.0)
+    return joined_df
+
+
+def infer_news_to_candles_df(news_df: pd.DataFrame, candles_df: pd.DataFrame, artifacts_dir: str, 
+                            p_threshold: float = 0.5, half_life_days: float = 0.5, max_days: int = 5, add_sentiment: bool = True,
+                            engine=None, bucketed: bool = None) -> tuple:
+    """
+    Основная функция для инференса новостей с DataFrame входом
+
+    Если передан engine (NewsInferenceEngine), используются уже загруженные в память
+    словарь, тикеры и модель, а bucketed=None означает режим батчинга его бэкенда;
+    иначе артефакты читаются из artifacts_dir.
+    Стадии scoring, sentiment, aggregation и join пишутся спанами в текущую трассу (src/core/tracing.py).
+    """
+    with span('scoring', rows=len(news_df)):
+        if engine is not None:
+            ticker_to_idx = engine.ticker_to_idx
+            scores = engine.score(news_df, bucketed=bucketed)
+        else:
+            ticker_to_idx, vocab, ckpt = load_artifacts(artifacts_dir)
+            scores, _ = score_news(news_df, vocab, ckpt['state_dict'], num_labels=len(ticker_to_idx), 
+                                   max_len=ckpt['config'].get('max_len', 256), add_sentiment=False,
+                                   bucketed=bool(bucketed))
+    
+    with span('sentiment', rows=len(news_df) if add_sentiment else 0):
+        sentiment_features = news_sentiment(news_df, add_sentiment)
+    
+    with span('aggregation', rows=len(candles_df)):
+        features_df = aggregate_to_candles(
+            candles_df, news_df, scores, ticker_to_idx,
+            sentiment_features=sentiment_features,
+            half_life_days=half_life_days,
+            p_threshold=p_threshold,
+            max_days=max_days,
+        )
+    
+    with span('join', rows=len(candles_df)):
+        joined_df = join_features_to_candles(candles_df, features_df, with_sentiment=add_sentiment and sentiment_features is not None)
     
     return features_df, joined_df
 
@@ -237,16 +215,21 @@ def main():
     parser.add_argument('--half_life_days', type=float, default=2.0)
     parser.add_argument('--p_threshold', type=float, default=0.5)
     parser.add_argument('--max_days', type=float, default=20.0)
+    parser.add_argument('--backend', default=None, help='бэкенд инференса: reference, batched, quantized, compiled')
+    parser.add_argument('--bucketed', action='store_true', help='батчинг по длине последовательностей')
     args = parser.parse_args()
 
-    ticker_to_idx, vocab, ckpt = load_artifacts(args.artifacts)
+    # Импорт здесь: inference_engine сам импортирует этот модуль
+    from src.core.inference_engine import NewsInferenceEngine
+    engine = NewsInferenceEngine.from_artifacts(args.artifacts, backend=args.backend)
 
     df_news = pd.read_csv(args.news)
     df_candles = pd.read_csv(args.candles)
 
-    scores = score_news(df_news, vocab, ckpt['state_dict'], num_labels=len(ticker_to_idx), max_len=ckpt['config'].get('max_len', 256))
+    scores, sentiment_features = engine.score_news(df_news, bucketed=True if args.bucketed else None)
     feats = aggregate_to_candles(
-        df_candles, df_news, scores, ticker_to_idx,
+        df_candles, df_news, scores, engine.ticker_to_idx,
+        sentiment_features=sentiment_features,
         half_life_days=args.half_life_days,
         p_threshold=args.p_threshold,
         max_days=args.max_days,
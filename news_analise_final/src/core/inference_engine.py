@@ -0,0 +1,320 @@
+"""
+Резидентный движок инференса новостей
+
+Держит в памяти процесса словарь, карту тикеров и модель в eval-режиме,
+чтобы запросы к API не перечитывали vocab.json / model.pt и не пересоздавали
+NewsTickerModel на каждый вызов.
+
+Способ прогона модели задается бэкендом (BACKENDS, см. get_backend):
+    reference — float-модель, батчи по порядку входа с паддингом до самой длинной
+                новости батча; паддинг попадает в обратный проход GRU, поэтому
+                скор новости зависит от соседей по батчу
+    batched   — float-модель, батчи по длине с упакованными последовательностями
+    quantized — int8-модель (динамическая квантизация GRU и Linear), батчи по длине;
+                квантизованная модель один раз сохраняется целиком в model_int8.pt
+                (рядом с model.pt или в QUANTIZED_MODEL_DIR) и пересобирается,
+                если model.pt изменился
+    compiled  — float-модель через torch.compile, батчи по длине; если компиляция
+                недоступна, бэкенд работает как batched
+Бэкенд по умолчанию берется из переменной окружения INFER_BACKEND (batched):
+его скоры не зависят от состава батча и кэшируются. reference остается для
+сверки с исходным способом прогона.
+
+quantized=True (в API и get_backend) выбирает бэкенд quantized, то есть int8
+с батчами по длине. До появления бэкендов int8-модель считалась батчами с
+паддингом, как reference, поэтому ее скоры сдвинулись в пределах влияния
+паддинга; прежний режим — engine.score(..., bucketed=False).
+Новый вариант инференса подключается через register_backend, его расхождение с
+reference проверяет scripts/testing/check_backend_parity.py.
+
+Скоры новостей кэшируются между запросами в score_cache.sqlite (src/core/score_cache.py):
+через модель проходят только новости, которых нет в кэше. Кэшируются только
+скоры батчей по длине: в батчах с паддингом (reference) скор
+новости зависит от соседей по батчу, и прогон одних промахов давал бы другие
+числа, чем прогон всего запроса, — ответ зависел бы от истории кэша.
+"""
+import hashlib
+import json
+import os
+import weakref
+from functools import lru_cache
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import torch
+
+from src.ml.nn_data import load_vocab
+from src.core.infer_news_to_candles import build_model, quantize_model, predict_scores, news_sentiment
+from src.core.score_cache import ScoreCache, file_sha1, news_key, open_score_cache
+
+
+QUANTIZED_MODEL_FILE = 'model_int8.pt'
+
+
+def _file_fingerprint(path: str) -> dict:
+    st = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def quantized_cache_path(artifacts_dir: str) -> str:
+    """
+    Файл int8-модели: QUANTIZED_MODEL_DIR, если задан (папка артефактов в
+    docker-compose только для чтения), иначе рядом с model.pt. В общей папке
+    имя файла включает хэш пути артефактов.
+    """
+    cache_dir = os.getenv('QUANTIZED_MODEL_DIR')
+    if not cache_dir:
+        return os.path.join(artifacts_dir, QUANTIZED_MODEL_FILE)
+    suffix = hashlib.sha1(os.path.abspath(artifacts_dir).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir, f'model_int8_{suffix}.pt')
+
+
+def load_quantized_model(artifacts_dir: str, vocab: Dict[str, int], ckpt: dict, num_labels: int) -> torch.nn.Module:
+    """
+    Int8-модель из кэша; при отсутствии или устаревании кэша квантизует
+    float-модель и сохраняет результат
+
+    Кэш хранит модуль целиком, поэтому загрузка из кэша не строит float-модель
+    и не квантизует веса заново.
+    """
+    source = os.path.join(artifacts_dir, 'model.pt')
+    cached = quantized_cache_path(artifacts_dir)
+    fingerprint = _file_fingerprint(source)
+
+    if os.path.exists(cached):
+        try:
+            qckpt = torch.load(cached, map_location='cpu', weights_only=False)
+            if qckpt.get('source') == fingerprint and isinstance(qckpt.get('model'), torch.nn.Module):
+                return qckpt['model'].eval()
+        except Exception as e:
+            print(f"Предупреждение: не удалось прочитать {cached}: {e}")
+
+    model = quantize_model(build_model(vocab, ckpt['state_dict'], num_labels, torch.device('cpu')))
+    try:
+        os.makedirs(os.path.dirname(cached) or '.', exist_ok=True)
+        tmp_path = f'{cached}.{os.getpid()}.tmp'
+        torch.save({'model': model, 'source': fingerprint, 'config': ckpt.get('config', {})}, tmp_path)
+        os.replace(tmp_path, cached)
+    except OSError as e:
+        print(f"Предупреждение: не удалось сохранить {cached}: {e}")
+    return model.eval()
+
+
+class ScoringBackend:
+    """
+    Способ построения модели и прогона батчей
+
+    bucketed — режим батчинга по умолчанию (predict_scores), precision — точность
+    весов; бэкенды bucketed с одинаковой точностью делят кэш скоров, скоры
+    padded не кэшируются (зависят от состава батча).
+    """
+    name = 'reference'
+    bucketed = False
+    precision = 'fp32'
+    cpu_only = False
+
+    def build(self, artifacts_dir: str, vocab: Dict[str, int], ckpt: dict, num_labels: int,
+              device: torch.device) -> torch.nn.Module:
+        return build_model(vocab, ckpt['state_dict'], num_labels, device)
+
+    def predict(self, model: torch.nn.Module, df_news: pd.DataFrame, vocab: Dict[str, int], num_labels: int,
+                device: torch.device, max_len: int, batch_size: int, bucketed: bool) -> np.ndarray:
+        return predict_scores(model, df_news, vocab, num_labels, device,
+                              max_len=max_len, batch_size=batch_size, bucketed=bucketed)
+
+
+class BatchedBackend(ScoringBackend):
+    name = 'batched'
+    bucketed = True
+
+
+class QuantizedBackend(ScoringBackend):
+    name = 'quantized'
+    bucketed = True
+    precision = 'int8'
+    cpu_only = True
+
+    def build(self, artifacts_dir, vocab, ckpt, num_labels, device):
+        return load_quantized_model(artifacts_dir, vocab, ckpt, num_labels)
+
+
+class CompiledBackend(ScoringBackend):
+    """
+    torch.compile с динамическими формами; при ошибке компиляции — откат на eager-модель
+
+    Компиляция происходит на первом вызове. Если он упал, модель навсегда
+    переходит на eager: повторные попытки компиляции на каждом запросе только
+    тратили бы время и засоряли лог.
+    """
+    name = 'compiled'
+    bucketed = True
+
+    def __init__(self):
+        # Скомпилированные модели, для которых компиляция уже не удалась
+        self._eager_only = weakref.WeakSet()
+
+    def build(self, artifacts_dir, vocab, ckpt, num_labels, device):
+        model = super().build(artifacts_dir, vocab, ckpt, num_labels, device)
+        try:
+            return torch.compile(model, dynamic=True)
+        except Exception as e:
+            print(f"Предупреждение: torch.compile недоступен, используется eager-модель: {e}")
+            return model
+
+    def predict(self, model, df_news, vocab, num_labels, device, max_len, batch_size, bucketed):
+        eager = getattr(model, '_orig_mod', None)
+        if eager is None:
+            return super().predict(model, df_news, vocab, num_labels, device, max_len, batch_size, bucketed)
+        if model in self._eager_only:
+            return super().predict(eager, df_news, vocab, num_labels, device, max_len, batch_size, bucketed)
+        try:
+            return super().predict(model, df_news, vocab, num_labels, device, max_len, batch_size, bucketed)
+        except Exception as e:
+            # Компиляция происходит на первом вызове (нужен компилятор C++ и т.п.)
+            print(f"Предупреждение: скомпилированная модель не запустилась, дальше используется eager-модель: {e}")
+            self._eager_only.add(model)
+            return super().predict(eager, df_news, vocab, num_labels, device, max_len, batch_size, bucketed)
+
+
+BACKENDS: Dict[str, ScoringBackend] = {}
+
+
+def register_backend(backend: ScoringBackend) -> ScoringBackend:
+    """Регистрирует бэкенд под backend.name (заменяет существующий с тем же именем)"""
+    BACKENDS[backend.name] = backend
+    return backend
+
+
+for _backend in (ScoringBackend(), BatchedBackend(), QuantizedBackend(), CompiledBackend()):
+    register_backend(_backend)
+
+
+def get_backend(name: Optional[str] = None, quantized: bool = False) -> ScoringBackend:
+    """
+    Бэкенд по имени; без имени — quantized при quantized=True, иначе INFER_BACKEND
+
+    Raises:
+        ValueError: неизвестное имя бэкенда
+    """
+    name = name or ('quantized' if quantized else os.getenv('INFER_BACKEND', 'batched'))
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд инференса {name!r}, доступны: {', '.join(BACKENDS)}")
+    return BACKENDS[name]
+
+
+class NewsInferenceEngine:
+    """Загруженные артефакты модели и методы скоринга новостей"""
+
+    def __init__(self, ticker_to_idx: Dict[str, int], vocab: Dict[str, int], model: torch.nn.Module,
+                 config: Optional[dict] = None, device: Optional[torch.device] = None,
+                 backend: Optional[ScoringBackend] = None, model_version: str = '',
+                 score_cache: Optional[ScoreCache] = None):
+        self.ticker_to_idx = ticker_to_idx
+        self.vocab = vocab
+        self.model = model
+        self.config = config or {}
+        self.device = device or torch.device('cpu')
+        self.backend = backend or BACKENDS['reference']
+        self.model_version = model_version
+        self.score_cache = score_cache
+
+    @classmethod
+    def from_artifacts(cls, artifacts_dir: str, device: Optional[torch.device] = None,
+                       quantized: bool = False, use_score_cache: bool = False,
+                       backend: Optional[str] = None) -> "NewsInferenceEngine":
+        """
+        Читает tickers.json, vocab.json и model.pt из папки артефактов
+
+        backend — имя бэкенда (get_backend), quantized=True — сокращение для backend='quantized';
+        use_score_cache=True — кэш скоров в папке артефактов
+        """
+        scoring_backend = get_backend(backend, quantized)
+        if scoring_backend.cpu_only:
+            device = torch.device('cpu')
+        device = device or torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+        with open(os.path.join(artifacts_dir, 'tickers.json'), 'r', encoding='utf-8') as f:
+            ticker_to_idx = json.load(f)['ticker_to_idx']
+        vocab = load_vocab(os.path.join(artifacts_dir, 'vocab.json'))
+        ckpt = torch.load(os.path.join(artifacts_dir, 'model.pt'), map_location='cpu')
+
+        model = scoring_backend.build(artifacts_dir, vocab, ckpt, len(ticker_to_idx), device)
+        model_version = file_sha1(os.path.join(artifacts_dir, 'model.pt'))[:16]
+        score_cache = open_score_cache(artifacts_dir) if use_score_cache else None
+        return cls(ticker_to_idx, vocab, model, config=ckpt.get('config', {}), device=device,
+                   backend=scoring_backend, model_version=model_version, score_cache=score_cache)
+
+    @property
+    def num_labels(self) -> int:
+        return len(self.ticker_to_idx)
+
+    @property
+    def max_len(self) -> int:
+        return self.config.get('max_len', 256)
+
+    @property
+    def quantized(self) -> bool:
+        return self.backend.precision == 'int8'
+
+    def cache_version(self, bucketed: Optional[bool] = None) -> str:
+        """Версия скоров для ключа кэша: веса модели и режим инференса"""
+        if bucketed is None:
+            bucketed = self.backend.bucketed
+        return ':'.join([
+            self.model_version,
+            self.backend.precision,
+            'bucketed' if bucketed else 'padded',
+            str(self.max_len),
+        ])
+
+    def _predict(self, df_news: pd.DataFrame, batch_size: int, bucketed: bool) -> np.ndarray:
+        return self.backend.predict(self.model, df_news, self.vocab, self.num_labels, self.device,
+                                    max_len=self.max_len, batch_size=batch_size, bucketed=bucketed)
+
+    def score(self, df_news: pd.DataFrame, batch_size: int = 256, bucketed: Optional[bool] = None,
+              use_cache: bool = True) -> np.ndarray:
+        """
+        Матрица вероятностей принадлежности новостей тикерам [N, num_labels]
+
+        bucketed=None — режим батчинга бэкенда. Кэш используется только в режиме
+        bucketed, где скор новости не зависит от состава батча.
+        """
+        if bucketed is None:
+            bucketed = self.backend.bucketed
+        if self.score_cache is None or not use_cache or not bucketed or len(df_news) == 0:
+            return self._predict(df_news, batch_size, bucketed)
+
+        version = self.cache_version(bucketed)
+        titles = df_news['title'].fillna('').tolist()
+        bodies = df_news['publication'].fillna('').tolist()
+        keys = [news_key(version, t, b) for t, b in zip(titles, bodies)]
+        found = self.score_cache.get_many(keys, self.num_labels)
+
+        # Через модель идут только промахи, повторы внутри запроса — один раз
+        miss_rows = {}
+        for i, key in enumerate(keys):
+            if key not in found and key not in miss_rows:
+                miss_rows[key] = i
+        if miss_rows:
+            miss_scores = self._predict(df_news.iloc[list(miss_rows.values())], batch_size, bucketed)
+            miss_scores = np.asarray(miss_scores, dtype=np.float32)
+            self.score_cache.put_many(miss_rows.keys(), miss_scores)
+            found.update(zip(miss_rows.keys(), miss_scores))
+
+        return np.stack([found[key] for key in keys])
+
+    def score_news(self, df_news: pd.DataFrame, batch_size: int = 256, add_sentiment: bool = True,
+                   bucketed: Optional[bool] = None) -> tuple:
+        """Аналог score_news из infer_news_to_candles, но на загруженной модели"""
+        return self.score(df_news, batch_size=batch_size, bucketed=bucketed), news_sentiment(df_news, add_sentiment)
+
+
+def get_inference_engine(artifacts_dir: str, quantized: bool = False, backend: Optional[str] = None) -> NewsInferenceEngine:
+    """Один экземпляр движка на папку артефактов и бэкенд в рамках процесса, с общим кэшем скоров"""
+    return _cached_engine(artifacts_dir, get_backend(backend, quantized).name)
+
+
+@lru_cache(maxsize=8)
+def _cached_engine(artifacts_dir: str, backend: str) -> NewsInferenceEngine:
+    return NewsInferenceEngine.from_artifacts(artifacts_dir, backend=backend, use_score_cache=True)
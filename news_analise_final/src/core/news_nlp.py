@@ -1,7 +1,11 @@
 import re
+import os
 import json
+import hashlib
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, Iterable, List
 
 from razdel import tokenize
 from text_unidecode import unidecode
@@ -50,10 +54,69 @@ KEYWORD_PATTERNS: Dict[str, List[str]] = {
 }
 
 
-def normalize_text(text: str) -> str:
-    if text is None:
-        return ""
-    text = str(text)
+class NormalizeCache:
+    """
+    Ограниченный LRU-кэш нормализованных текстов
+
+    Ключ — 16-байтный blake2b-хэш исходной строки, поэтому длинные тексты
+    публикаций не хранятся в кэше повторно. Считает попадания и промахи.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[bytes, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+    def lookup(self, keys: List[bytes]) -> List:
+        """Значения по ключам (None для промахов) с обновлением LRU-порядка и счетчиков"""
+        out = []
+        with self._lock:
+            for k in keys:
+                value = self._data.get(k)
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    self._data.move_to_end(k)
+                out.append(value)
+        return out
+
+    def store(self, items: Dict[bytes, str]) -> None:
+        with self._lock:
+            for k, v in items.items():
+                self._data[k] = v
+                self._data.move_to_end(k)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def info(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_NORMALIZE_CACHE = NormalizeCache(int(os.getenv('NORMALIZE_CACHE_SIZE', '100000')))
+
+
+def _normalize_uncached(text: str) -> str:
     text = emoji.replace_emoji(text, replace=" ")
     text = unidecode(text)
     text = text.lower()
@@ -62,6 +125,53 @@ def normalize_text(text: str) -> str:
     return text
 
 
+def normalize_texts(texts: Iterable) -> List[str]:
+    """Пакетная нормализация через общий кэш; повторы внутри батча считаются один раз"""
+    texts = ["" if t is None else str(t) for t in texts]
+    keys = [NormalizeCache.key(t) for t in texts]
+    out = _NORMALIZE_CACHE.lookup(keys)
+    computed: Dict[bytes, str] = {}
+    for i, (k, t) in enumerate(zip(keys, texts)):
+        if out[i] is None:
+            if k not in computed:
+                computed[k] = _normalize_uncached(t)
+            out[i] = computed[k]
+    if computed:
+        _NORMALIZE_CACHE.store(computed)
+    return out
+
+
+def normalize_text(text: str) -> str:
+    if text is None:
+        return ""
+    return normalize_texts([text])[0]
+
+
+def join_normalized(*parts: str) -> str:
+    """
+    Склейка уже нормализованных фрагментов через пробел:
+    normalize_text(a + ' ' + b) == join_normalized(normalize_text(a), normalize_text(b))
+    """
+    return " ".join(p for p in parts if p)
+
+
+def normalize_pairs(titles: Iterable, bodies: Iterable, sep: str = "") -> List[str]:
+    """
+    normalize_text(f"{title} {sep} {body}") для пар полей новости
+
+    Заголовки и тексты нормализуются по отдельности, поэтому разметка тикеров,
+    скоринг и обучение переиспользуют одни и те же записи кэша.
+    """
+    norm_titles = normalize_texts(titles)
+    norm_bodies = normalize_texts(bodies)
+    return [join_normalized(t, sep, b) for t, b in zip(norm_titles, norm_bodies)]
+
+
+def normalize_cache_info() -> Dict[str, float]:
+    """Статистика кэша нормализации: hits, misses, hit_rate, size, maxsize"""
+    return _NORMALIZE_CACHE.info()
+
+
 def lemmatize_token(token: str) -> str:
     if not token:
         return token
@@ -0,0 +1,260 @@
+"""
+Персистентный кэш скоров новостей между запросами
+
+Одни и те же новости приходят в пересекающихся окнах /infer, поэтому вектор
+вероятностей по тикерам сохраняется в SQLite: в SCORE_CACHE_DIR, если задан
+(папка артефактов в docker-compose смонтирована только для чтения), иначе
+рядом с артефактами модели.
+Ключ — blake2b(версия модели, title, publication), значение — float32-вектор
+sigmoid-скоров. Размер ограничен max_items, вытесняются давно не
+использованные записи (LRU по last_used).
+
+Чтение не пишет в базу: отметки last_used у попаданий копятся в памяти и
+записываются вместе со следующей вставкой или пачкой (_TOUCH_BATCH отметок,
+раз в _SYNC_SECONDS). Число строк считается один раз при открытии и дальше
+ведется по вставкам и вытеснениям; раз в _SYNC_SECONDS оно сверяется с базой,
+куда пишут и другие процессы. Счетчики попаданий, промахов и вытеснений
+хранятся в той же базе (таблица counters), чтобы статистика была общей для
+API и воркеров; приращения копятся в памяти и пишутся вместе с отметками
+last_used.
+"""
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+SCORE_CACHE_FILE = 'score_cache.sqlite'
+
+# Ограничение SQLite на число параметров в одном запросе
+_SQL_CHUNK = 500
+# Отложенные отметки last_used пишутся пачкой не реже, чем раз в _SYNC_SECONDS
+_TOUCH_BATCH = 1000
+_SYNC_SECONDS = 30.0
+
+
+def file_sha1(path: str, chunk_size: int = 1 << 20) -> str:
+    """Хэш содержимого файла (версия модели)"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def news_key(model_version: str, title, publication) -> bytes:
+    """Контентный ключ новости для заданной версии модели"""
+    h = hashlib.blake2b(digest_size=16)
+    for part in (model_version, title, publication):
+        h.update(("" if part is None else str(part)).encode('utf-8', 'surrogatepass'))
+        h.update(b'\x1f')
+    return h.digest()
+
+
+class ScoreCache:
+    """Кэш векторов скоров в SQLite с LRU-вытеснением и статистикой попаданий"""
+
+    def __init__(self, path: str, max_items: int = 20000):
+        self.path = path
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS scores ('
+            'key BLOB PRIMARY KEY, vec BLOB NOT NULL, last_used INTEGER NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS scores_last_used ON scores(last_used)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self._conn.executemany('INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)',
+                               [('hits',), ('misses',), ('evictions',)])
+        # key -> last_used попаданий и приращения счетчиков, еще не записанные в базу
+        self._touched: Dict[bytes, int] = {}
+        self._pending = dict.fromkeys(('hits', 'misses', 'evictions'), 0)
+        self._count = self._items()
+        self._synced_at = time.monotonic()
+        self._flushed_at = time.monotonic()
+
+    def _items(self) -> int:
+        return self._conn.execute('SELECT COUNT(*) FROM scores').fetchone()[0]
+
+    def _counters(self) -> Dict[str, int]:
+        return dict(self._conn.execute('SELECT name, value FROM counters').fetchall())
+
+    def _flush_pending(self) -> None:
+        """Записывает отложенные отметки last_used и счетчики (внутри открытой транзакции)"""
+        if self._touched:
+            self._conn.executemany('UPDATE scores SET last_used = ? WHERE key = ?',
+                                   [(now, key) for key, now in self._touched.items()])
+            self._touched.clear()
+        deltas = [(value, name) for name, value in self._pending.items() if value]
+        if deltas:
+            self._conn.executemany('UPDATE counters SET value = value + ? WHERE name = ?', deltas)
+            self._pending = dict.fromkeys(self._pending, 0)
+        self._flushed_at = time.monotonic()
+
+    def _has_pending(self) -> bool:
+        return bool(self._touched) or any(self._pending.values())
+
+    def _sync_due(self) -> bool:
+        return time.monotonic() - self._synced_at >= _SYNC_SECONDS
+
+    def _write(self) -> None:
+        self._conn.execute('BEGIN')
+        try:
+            self._flush_pending()
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+
+    def flush(self) -> None:
+        """Записывает накопленные отметки и счетчики (при остановке процесса)"""
+        with self._lock:
+            if self._has_pending():
+                self._write()
+
+    def get_many(self, keys: List[bytes], num_labels: int) -> Dict[bytes, np.ndarray]:
+        """Найденные векторы по ключам; отметка last_used обновляется у попаданий"""
+        unique = list(dict.fromkeys(keys))
+        found: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            for i in range(0, len(unique), _SQL_CHUNK):
+                chunk = unique[i:i + _SQL_CHUNK]
+                rows = self._conn.execute(
+                    f'SELECT key, vec FROM scores WHERE key IN ({",".join("?" * len(chunk))})', chunk
+                ).fetchall()
+                for key, vec in rows:
+                    arr = np.frombuffer(vec, dtype=np.float32)
+                    if arr.shape[0] == num_labels:
+                        found[key] = arr
+            hits = sum(1 for k in keys if k in found)
+            self._pending['hits'] += hits
+            self._pending['misses'] += len(keys) - hits
+            self._touched.update(dict.fromkeys(found, time.time_ns()))
+            if len(self._touched) >= _TOUCH_BATCH or time.monotonic() - self._flushed_at >= _SYNC_SECONDS:
+                self._write()
+        return found
+
+    def put_many(self, keys: Iterable[bytes], vectors: np.ndarray) -> None:
+        """Сохраняет векторы [N, num_labels] и вытесняет лишнее"""
+        now = time.time_ns()
+        items = {k: np.ascontiguousarray(v, dtype=np.float32).tobytes() for k, v in zip(keys, vectors)}
+        if not items:
+            return
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                # Отметки попаданий пишутся до вытеснения, чтобы LRU их учитывал
+                self._flush_pending()
+                count = self._count + self._conn.executemany(
+                    'INSERT OR IGNORE INTO scores (key, vec, last_used) VALUES (?, ?, ?)',
+                    [(k, v, now) for k, v in items.items()],
+                ).rowcount
+                if self._sync_due():
+                    count = self._items()
+                    self._synced_at = time.monotonic()
+                excess = count - self.max_items
+                evicted = 0
+                if excess > 0:
+                    evicted = self._conn.execute(
+                        'DELETE FROM scores WHERE key IN (SELECT key FROM scores ORDER BY last_used LIMIT ?)', (excess,)
+                    ).rowcount
+                    self._conn.execute("UPDATE counters SET value = value + ? WHERE name = 'evictions'", (evicted,))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._count = count - evicted
+
+    def stats(self) -> dict:
+        """
+        Статистика по базе (общая для всех процессов) плюс еще не записанные
+        приращения этого процесса; приращения других процессов видны после их
+        записи (не позже _SYNC_SECONDS)
+        """
+        with self._lock:
+            counters = self._counters()
+            for name, value in self._pending.items():
+                counters[name] = counters.get(name, 0) + value
+            items = self._items()
+        total = counters['hits'] + counters['misses']
+        return {
+            'path': self.path,
+            'items': items,
+            'max_items': self.max_items,
+            'hits': counters['hits'],
+            'misses': counters['misses'],
+            'hit_rate': counters['hits'] / total if total else 0.0,
+            'evictions': counters['evictions'],
+            'size_bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute('DELETE FROM scores')
+            self._conn.execute('UPDATE counters SET value = 0')
+            self._touched.clear()
+            self._pending = dict.fromkeys(self._pending, 0)
+            self._count = 0
+
+
+_OPEN_CACHES: Dict[str, ScoreCache] = {}
+_OPEN_LOCK = threading.Lock()
+
+
+@atexit.register
+def _flush_open_caches() -> None:
+    """Накопленные отметки и счетчики не теряются при остановке процесса (воркера)"""
+    for cache in list(_OPEN_CACHES.values()):
+        try:
+            cache.flush()
+        except sqlite3.Error as e:
+            print(f"Предупреждение: кэш скоров {cache.path} не сохранил счетчики: {e}")
+
+
+def score_cache_path(artifacts_dir: str) -> str:
+    """
+    Файл кэша для папки артефактов: SCORE_CACHE_DIR/score_cache.sqlite или
+    artifacts_dir/score_cache.sqlite. Ключи содержат хэш model.pt, поэтому
+    один файл в SCORE_CACHE_DIR можно делить между папками артефактов.
+    """
+    cache_dir = os.getenv('SCORE_CACHE_DIR') or artifacts_dir
+    return os.path.abspath(os.path.join(cache_dir, SCORE_CACHE_FILE))
+
+
+def open_score_cache(artifacts_dir: str, max_items: Optional[int] = None) -> Optional[ScoreCache]:
+    """
+    Общий на процесс кэш для папки артефактов (SCORE_CACHE_MAX_ITEMS, по умолчанию 20000 записей)
+
+    Возвращает None, если кэш отключен (SCORE_CACHE_ENABLED=0) или файл не удалось открыть.
+    """
+    if os.getenv('SCORE_CACHE_ENABLED', '1') == '0':
+        return None
+    path = score_cache_path(artifacts_dir)
+    with _OPEN_LOCK:
+        cache = _OPEN_CACHES.get(path)
+        if cache is None:
+            max_items = max_items or int(os.getenv('SCORE_CACHE_MAX_ITEMS', '20000'))
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                cache = ScoreCache(path, max_items=max_items)
+            except (OSError, sqlite3.Error) as e:
+                print(f"Предупреждение: кэш скоров {path} недоступен: {e}")
+                return None
+            _OPEN_CACHES[path] = cache
+    return cache
+
+
+def score_cache_stats(artifacts_dirs: Iterable[str] = ()) -> List[dict]:
+    """Статистика кэшей скоров: открытых в процессе и лежащих в artifacts_dirs (если файл уже создан)"""
+    for artifacts_dir in artifacts_dirs:
+        if os.path.exists(score_cache_path(artifacts_dir)):
+            open_score_cache(artifacts_dir)
+    return [cache.stats() for cache in list(_OPEN_CACHES.values())]
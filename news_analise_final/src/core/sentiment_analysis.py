@@ -156,54 +156,67 @@ def aggregate_sentiment_to_candles(
     df_news_with_sentiment['sentiment_score'] = df_news_with_sentiment['sentiment_score'].fillna(1.0)
     df_news_with_sentiment['sentiment_label'] = df_news_with_sentiment['sentiment_label'].fillna(1)
     
-    # Агрегируем сентимент по свечам
-    sentiment_features_list = []
-    
-    for _, candle_row in df_result.iterrows():
-        candle_date = candle_row['date']
-        ticker = candle_row['ticker']
-        
-        # Фильтруем новости для данной свечи
-        news_subset = df_news_with_sentiment[
-            (df_news_with_sentiment['date'] <= candle_date) &
-            (df_news_with_sentiment['date'] >= candle_date - pd.Timedelta(days=max_days))
-        ]
-        
-        if len(news_subset) == 0:
-            # Нет новостей - нейтральный сентимент
-            sentiment_features_list.append({
-                'sentiment_mean': 1.0,
-                'sentiment_sum': 0.0,
-                'sentiment_count': 0,
-                'sentiment_positive_count': 0,
-                'sentiment_negative_count': 0,
-                'sentiment_neutral_count': 0
-            })
-            continue
-        
-        # Рассчитываем веса с временным затуханием
-        days_ago = (candle_date - news_subset['date']).dt.days
-        weights = np.exp(-np.log(2) * days_ago / half_life_days)
-        
-        # Взвешенные сентимент-оценки
-        weighted_sentiment = news_subset['sentiment_score'] * weights
-        
-        # Подсчитываем категории
-        positive_count = (news_subset['sentiment_label'] == 2).sum()
-        negative_count = (news_subset['sentiment_label'] == 0).sum()
-        neutral_count = (news_subset['sentiment_label'] == 1).sum()
-        
-        sentiment_features_list.append({
-            'sentiment_mean': float(weighted_sentiment.mean()),
-            'sentiment_sum': float(weighted_sentiment.sum()),
-            'sentiment_count': len(news_subset),
-            'sentiment_positive_count': positive_count,
-            'sentiment_negative_count': negative_count,
-            'sentiment_neutral_count': neutral_count
-        })
+    # Агрегируем сентимент по свечам за один векторизованный проход:
+    # новости сортируются по дате, окно каждой свечи находится через searchsorted,
+    # суммы берутся из префиксных сумм оценок и счетчиков меток
+    news = df_news_with_sentiment[df_news_with_sentiment['date'].notna()].sort_values('date', kind='stable')
+    news_dates = news['date'].to_numpy(dtype='datetime64[ns]')
+    scores = news['sentiment_score'].to_numpy(dtype=np.float64)
+    labels = news['sentiment_label'].to_numpy()
+    
+    prefix_score = np.concatenate([[0.0], np.cumsum(scores)])
+    prefix_labels = {
+        name: np.concatenate([[0], np.cumsum(labels == value, dtype=np.int64)])
+        for name, value in (('positive', 2), ('negative', 0), ('neutral', 1))
+    }
+    
+    # Все свечи с одной датой обрабатываются вместе
+    candle_dates = df_result['date'].to_numpy(dtype='datetime64[ns]')
+    valid_candles = ~np.isnat(candle_dates)
+    unique_dates, inverse = np.unique(candle_dates[valid_candles], return_inverse=True)
+    
+    day = np.timedelta64(1, 'D').astype('timedelta64[ns]')
+    window_start = unique_dates - pd.Timedelta(days=max_days).to_timedelta64()
+    lo = np.searchsorted(news_dates, window_start, side='left')
+    hi = np.searchsorted(news_dates, unique_dates, side='right')
+    count = hi - lo
+    
+    # Взвешенная сумма: новости с одинаковым числом полных дней до свечи (days_ago = j)
+    # лежат в полуинтервале (date - (j+1) дней, date - j дней] и имеют общий вес
+    weighted_sum = np.zeros(len(unique_dates), dtype=np.float64)
+    for j in range(int(np.ceil(max_days)) + 1):
+        upper = np.searchsorted(news_dates, unique_dates - j * day, side='right')
+        lower = np.maximum(np.searchsorted(news_dates, unique_dates - (j + 1) * day, side='right'), lo)
+        lower = np.minimum(lower, upper)
+        weight = np.exp(-np.log(2) * j / half_life_days)
+        weighted_sum += (prefix_score[upper] - prefix_score[lower]) * weight
+    
+    has_news = count > 0
+    per_date = {
+        'sentiment_mean': np.where(has_news, weighted_sum / np.maximum(count, 1), 1.0),
+        'sentiment_sum': np.where(has_news, weighted_sum, 0.0),
+        'sentiment_count': count.astype(np.int64),
+    }
+    for name, prefix in prefix_labels.items():
+        per_date[f'sentiment_{name}_count'] = (prefix[hi] - prefix[lo]).astype(np.int64)
+    
+    # Свечи без даты получают нейтральный сентимент, как и свечи без новостей
+    defaults = {
+        'sentiment_mean': 1.0,
+        'sentiment_sum': 0.0,
+        'sentiment_count': 0,
+        'sentiment_positive_count': 0,
+        'sentiment_negative_count': 0,
+        'sentiment_neutral_count': 0
+    }
+    sentiment_columns = {}
+    for col, default in defaults.items():
+        values = np.full(len(df_result), default, dtype=per_date[col].dtype)
+        values[valid_candles] = per_date[col][inverse]
+        sentiment_columns[col] = values
     
     # Добавляем сентимент-фичи к свечам
-    sentiment_df = pd.DataFrame(sentiment_features_list)
+    sentiment_df = pd.DataFrame(sentiment_columns, index=df_result.index)
     df_result = pd.concat([df_result, sentiment_df], axis=1)
     
     return df_result
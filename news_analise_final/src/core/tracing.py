@@ -0,0 +1,68 @@
+"""
+Легкая трассировка стадий конвейера
+
+span(name, rows=..., nbytes=...) замеряет блок кода и записывает его в текущую
+трассу (Trace). Трасса привязана к contextvar: воркер открывает ее на время
+задачи (start_trace) и возвращает собранные спаны в процесс API, где они
+превращаются в метрики Prometheus (src/api/metrics.py). Вне трассы span только
+замеряет время и ничего не записывает.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+
+class Trace:
+    """Спаны одного запроса в порядке завершения"""
+
+    def __init__(self):
+        self.spans: List[dict] = []
+
+    def add(self, name: str, seconds: float, rows: Optional[int] = None, nbytes: Optional[int] = None) -> None:
+        self.spans.append({'name': name, 'seconds': seconds, 'rows': rows, 'bytes': nbytes})
+
+    def stages(self) -> Dict[str, float]:
+        """Суммарное время по имени стадии, секунды"""
+        totals: Dict[str, float] = {}
+        for item in self.spans:
+            totals[item['name']] = totals.get(item['name'], 0.0) + item['seconds']
+        return totals
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar('current_trace', default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace() -> Iterator[Trace]:
+    """Открывает трассу; если трасса уже открыта выше по стеку, спаны пишутся в нее"""
+    trace = _current_trace.get()
+    if trace is not None:
+        yield trace
+        return
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, rows: Optional[int] = None, nbytes: Optional[int] = None) -> Iterator[dict]:
+    """
+    Замер стадии; rows и bytes можно уточнить внутри блока через
+    возвращаемый словарь (например, размер сериализованного ответа)
+    """
+    info = {'rows': rows, 'bytes': nbytes}
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, time.perf_counter() - start, info['rows'], info['bytes'])
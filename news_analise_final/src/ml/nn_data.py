@@ -2,18 +2,19 @@ from typing import List, Dict, Tuple
 import re
 import json
 from collections import Counter
+from itertools import chain, repeat
 
+import numpy as np
 import pandas as pd
 import torch
 from torch.utils.data import Dataset
 
-from src.core.news_nlp import normalize_text
+from src.core.news_nlp import normalize_text, normalize_texts, normalize_pairs
 
 
 def build_vocab(texts: List[str], min_freq: int = 3, max_size: int = 50000) -> Dict[str, int]:
     counter = Counter()
-    for t in texts:
-        nt = normalize_text(t)
+    for nt in normalize_texts(texts):
         tokens = re.findall(r"[\w]+", nt)
         counter.update(tokens)
     # specials
@@ -39,13 +40,77 @@ def load_vocab(path: str) -> Dict[str, int]:
         return json.load(f)
 
 
-def encode_text(text: str, vocab: Dict[str, int], max_len: int = 256) -> List[int]:
-    nt = normalize_text(text)
-    tokens = re.findall(r"[\w]+", nt)
+TOKEN_RE = re.compile(r"[\w]+")
+
+
+def _scatter_padded(flat_ids: np.ndarray, lengths: np.ndarray, pad_id: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Раскладка склеенных id в матрицу int32 [N, maxL] за одно присваивание по индексам"""
+    width = int(lengths.max()) if len(lengths) else 1
+    matrix = np.full((len(lengths), width), pad_id, dtype=np.int32)
+    if len(flat_ids):
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        cols = np.arange(len(flat_ids)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        matrix[rows, cols] = flat_ids
+    return matrix, lengths
+
+
+def pad_id_sequences(id_arrays: List, pad_id: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Склейка последовательностей id в заполненную паддингом матрицу int32 [N, maxL] и длины [N]"""
+    lengths = np.fromiter((len(x) for x in id_arrays), dtype=np.int32, count=len(id_arrays))
+    flat = np.concatenate([np.asarray(x, dtype=np.int32) for x in id_arrays]) if len(id_arrays) else np.zeros(0, dtype=np.int32)
+    return _scatter_padded(flat, lengths, pad_id)
+
+
+def encode_normalized_batch(norm_texts: List[str], vocab: Dict[str, int], max_len: int = 256, unk_id: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Пакетная токенизация уже нормализованных текстов
+
+    После normalize_text в тексте остаются только [а-яёa-z0-9] и одиночные пробелы,
+    поэтому str.split дает те же токены, что и TOKEN_RE, но быстрее.
+
+    Returns:
+        (input_ids int32 [N, maxL] с паддингом 0, lengths int32 [N]);
+        строки input_ids совпадают с encode_normalized для каждого текста
+    """
+    tokens = [nt.split()[:max_len] for nt in norm_texts]
+    lengths = np.fromiter((len(t) for t in tokens), dtype=np.int32, count=len(tokens))
+    total = int(lengths.sum())
+    ids = np.fromiter(map(vocab.get, chain.from_iterable(tokens), repeat(unk_id)), dtype=np.int32, count=total)
+    return _scatter_padded(ids, lengths)
+
+
+def encode_news_batch(titles: List[str], bodies: List[str], vocab: Dict[str, int], max_len: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+    """Пакетный аналог encode_news: матрица id int32 и длины"""
+    return encode_normalized_batch(normalize_pairs(titles, bodies, sep="sep"), vocab, max_len)
+
+
+def to_model_inputs(input_ids: np.ndarray, lengths: np.ndarray, device: torch.device = None) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Тензоры input_ids и attention_mask для модели; на CPU input_ids не копируется (torch.from_numpy)"""
+    mask = (np.arange(input_ids.shape[1])[None, :] < lengths[:, None]).astype(np.int32)
+    ids_t = torch.from_numpy(input_ids)
+    mask_t = torch.from_numpy(mask)
+    if device is not None and device.type != 'cpu':
+        ids_t = ids_t.to(device, non_blocking=True)
+        mask_t = mask_t.to(device, non_blocking=True)
+    return ids_t, mask_t
+
+
+def encode_normalized(nt: str, vocab: Dict[str, int], max_len: int = 256) -> List[int]:
+    tokens = TOKEN_RE.findall(nt)
     ids = [vocab.get(t, 1) for t in tokens][:max_len]
     return ids
 
 
+def encode_text(text: str, vocab: Dict[str, int], max_len: int = 256) -> List[int]:
+    return encode_normalized(normalize_text(text), vocab, max_len)
+
+
+def encode_news(titles: List[str], bodies: List[str], vocab: Dict[str, int], max_len: int = 256) -> List[List[int]]:
+    """То же, что encode_text(f"{title} [SEP] {body}"), но через общий кэш нормализации по полям"""
+    # "sep" — нормализованная форма разделителя "[SEP]"
+    return [encode_normalized(nt, vocab, max_len) for nt in normalize_pairs(titles, bodies, sep="sep")]
+
+
 class NewsDataset(Dataset):
     def __init__(self, df: pd.DataFrame, vocab: Dict[str, int], ticker_to_idx: Dict[str, int], max_len: int = 256, mode: str = 'train'):
         self.df = df.reset_index(drop=True)
@@ -53,14 +118,17 @@ class NewsDataset(Dataset):
         self.ticker_to_idx = ticker_to_idx
         self.max_len = max_len
         self.mode = mode
+        # Тексты нормализуются один раз на весь датасет, а не в каждой эпохе
+        titles = self.df['title'].tolist() if 'title' in self.df.columns else [''] * len(self.df)
+        bodies = self.df['publication'].tolist() if 'publication' in self.df.columns else [''] * len(self.df)
+        self.norm_texts = normalize_pairs([f"{t}" for t in titles], [f"{b}" for b in bodies], sep="sep")
 
     def __len__(self):
         return len(self.df)
 
     def __getitem__(self, idx: int):
         row = self.df.iloc[idx]
-        text = f"{row.get('title','')} [SEP] {row.get('publication','')}"
-        ids = encode_text(text, self.vocab, self.max_len)
+        ids = encode_normalized(self.norm_texts[idx], self.vocab, self.max_len)
         if self.mode == 'train':
             labels = torch.zeros(len(self.ticker_to_idx), dtype=torch.float32)
             for t in re.split(r"[;,\s]+", str(row.get('tickers', ''))):
@@ -77,13 +145,9 @@ def collate_batch(batch: List, pad_id: int = 0, mode: str = 'train') -> Dict[str
     else:
         ids_list = batch
         labels_list = None
-    max_len = max(len(ids) for ids in ids_list) if ids_list else 1
-    input_ids = torch.full((len(ids_list), max_len), pad_id, dtype=torch.long)
-    attention_mask = torch.zeros((len(ids_list), max_len), dtype=torch.long)
-    for i, ids in enumerate(ids_list):
-        L = len(ids)
-        input_ids[i, :L] = torch.tensor(ids, dtype=torch.long)
-        attention_mask[i, :L] = 1
+    input_ids, lengths = pad_id_sequences(list(ids_list), pad_id=pad_id)
+    input_ids, attention_mask = to_model_inputs(input_ids, lengths)
+    input_ids = input_ids.long()
     if mode == 'train':
         labels = torch.stack(labels_list)
         return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
@@ -29,10 +29,16 @@ class TextEncoder(nn.Module):
         self.pool = AttentionPooling(rnn_hidden * 2)
         self.out_dim = rnn_hidden * 2
 
-    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor, lengths: torch.Tensor = None) -> torch.Tensor:
         x = self.embedding(input_ids)
         x = self.dropout(x)
-        h, _ = self.bigru(x)
+        if lengths is None:
+            h, _ = self.bigru(x)
+        else:
+            # Упакованные последовательности: GRU (в т.ч. обратный проход) не видит паддинг
+            packed = nn.utils.rnn.pack_padded_sequence(x, lengths.cpu().long(), batch_first=True, enforce_sorted=False)
+            h, _ = self.bigru(packed)
+            h, _ = nn.utils.rnn.pad_packed_sequence(h, batch_first=True, total_length=x.size(1))
         pooled = self.pool(h, attention_mask)
         return pooled
 
@@ -48,8 +54,8 @@ class NewsTickerModel(nn.Module):
             nn.Linear(self.encoder.out_dim, num_labels),
         )
 
-    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
-        z = self.encoder(input_ids, attention_mask)
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor, lengths: torch.Tensor = None) -> torch.Tensor:
+        z = self.encoder(input_ids, attention_mask, lengths)
         logits = self.classifier(z)
         return logits
 
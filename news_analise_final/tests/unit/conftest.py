@@ -0,0 +1,17 @@
+"""
+Общие настройки модульных тестов
+
+Тесты запускаются из корня news_analise_final: python -m pytest tests/unit
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+# app.py при импорте открывает базу задач: в тестах — во временной папке
+_tmp = tempfile.mkdtemp(prefix='unit_tests_')
+os.environ.setdefault('JOBS_DB_PATH', os.path.join(_tmp, 'jobs', 'jobs.sqlite'))
+os.environ.setdefault('RESULTS_DIR', os.path.join(_tmp, 'results'))
+os.environ.setdefault('PROFILE_DIR', os.path.join(_tmp, 'profiles'))
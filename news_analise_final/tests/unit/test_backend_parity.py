@@ -0,0 +1,99 @@
+"""
+Бэкенды движка инференса против reference (как scripts/testing/check_backend_parity.py)
+
+Нужны артефакты с model.pt: папка из TEST_ARTIFACTS или artifacts; без
+модели тесты сравнения пропускаются.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from src.core.inference_engine import BACKENDS, CompiledBackend, NewsInferenceEngine, get_backend
+
+ARTIFACTS_DIR = os.getenv('TEST_ARTIFACTS', 'artifacts')
+DEFAULT_ATOL = {'fp32': 1e-4, 'int8': 0.02}
+
+needs_model = pytest.mark.skipif(not os.path.exists(os.path.join(ARTIFACTS_DIR, 'model.pt')),
+                                 reason=f'нет {ARTIFACTS_DIR}/model.pt (задайте TEST_ARTIFACTS)')
+
+
+def make_news(count: int = 300, seed: int = 0) -> pd.DataFrame:
+    """Новости разной длины из слов словаря и неизвестных слов"""
+    rng = np.random.default_rng(seed)
+    with open(os.path.join(ARTIFACTS_DIR, 'vocab.json'), 'r', encoding='utf-8') as f:
+        words = [word for word in json.load(f) if not word.startswith('<')]
+    words += ['неизвестноеслово', 'qwerty']
+    texts = [' '.join(rng.choice(words, size=int(rng.integers(1, 120)))) for _ in range(count)]
+    return pd.DataFrame({'title': [text[:40] for text in texts], 'publication': texts})
+
+
+@needs_model
+@pytest.mark.parametrize('name', [name for name in BACKENDS if name != 'reference'])
+def test_backend_matches_reference(name, tmp_path, monkeypatch):
+    monkeypatch.setenv('QUANTIZED_MODEL_DIR', str(tmp_path))
+    df_news = make_news()
+    cpu = torch.device('cpu')
+    engine = NewsInferenceEngine.from_artifacts(ARTIFACTS_DIR, device=cpu, backend=name)
+    reference = NewsInferenceEngine.from_artifacts(ARTIFACTS_DIR, device=cpu, backend='reference')
+    bucketed = engine.backend.bucketed
+
+    expected = reference.score(df_news, batch_size=64, bucketed=bucketed, use_cache=False)
+    actual = engine.score(df_news, batch_size=64, use_cache=False)
+
+    assert actual.shape == expected.shape
+    assert np.abs(actual - expected).max() <= DEFAULT_ATOL[engine.backend.precision]
+
+
+class _BrokenCompiled(torch.nn.Module):
+    """Заглушка скомпилированной модели: падает на каждом вызове"""
+
+    def __init__(self, eager):
+        super().__init__()
+        self._orig_mod = eager
+        self.calls = 0
+
+    def forward(self, *args):
+        self.calls += 1
+        raise RuntimeError('compiler unavailable')
+
+
+class _Eager(torch.nn.Module):
+    def forward(self, input_ids, attention_mask, lengths=None):
+        return torch.zeros(input_ids.shape[0], 3)
+
+
+def test_compiled_falls_back_to_eager_once(capsys):
+    backend = CompiledBackend()
+    model = _BrokenCompiled(_Eager())
+    df_news = pd.DataFrame({'title': ['газпром', 'сбербанк отчет'], 'publication': ['прибыль', 'выручка']})
+    vocab = {'<pad>': 0, '<unk>': 1}
+
+    for _ in range(3):
+        scores = backend.predict(model, df_news, vocab, 3, torch.device('cpu'),
+                                 max_len=16, batch_size=8, bucketed=True)
+        assert scores.shape == (2, 3)
+
+    assert model.calls == 1
+    assert capsys.readouterr().out.count('Предупреждение') == 1
+
+
+def test_default_backend_uses_score_cache(monkeypatch):
+    monkeypatch.delenv('INFER_BACKEND', raising=False)
+    assert get_backend().bucketed
+
+
+@needs_model
+def test_default_engine_scores_only_misses(tmp_path, monkeypatch):
+    monkeypatch.delenv('INFER_BACKEND', raising=False)
+    monkeypatch.setenv('SCORE_CACHE_DIR', str(tmp_path))
+    df_news = make_news(100)
+    engine = NewsInferenceEngine.from_artifacts(ARTIFACTS_DIR, device=torch.device('cpu'), use_score_cache=True)
+    first = engine.score(df_news)
+    second = engine.score(df_news)
+
+    assert np.array_equal(first, second)
+    assert engine.score_cache.stats()['hits'] >= len(df_news)
@@ -0,0 +1,31 @@
+"""Агрегация новостей к свечам: окно max_days длиннее данных"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.core.candle_aggregation import aggregate_news_to_candles
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    news = pd.DataFrame({'publish_date': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 60, 100), 'D')})
+    candles = pd.DataFrame({'begin': pd.Timestamp('2024-01-20') + pd.to_timedelta(rng.integers(0, 60, 50), 'D'),
+                            'ticker': rng.choice(['SBER', 'GAZP'], 50)})
+    return candles, news, rng.random((100, 2)), {'SBER': 0, 'GAZP': 1}
+
+
+@pytest.mark.parametrize('max_days', [36500, 1e7, 1e30])
+def test_long_window_matches_unbounded(data, max_days):
+    candles, news, scores, ticker_to_idx = data
+    expected = aggregate_news_to_candles(candles, news, scores, ticker_to_idx, max_days=None)
+    actual = aggregate_news_to_candles(candles, news, scores, ticker_to_idx, max_days=max_days)
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+def test_window_limits_old_news(data):
+    candles, news, scores, ticker_to_idx = data
+    short = aggregate_news_to_candles(candles, news, scores, ticker_to_idx, max_days=3)
+    unbounded = aggregate_news_to_candles(candles, news, scores, ticker_to_idx, max_days=None)
+    assert (short['nn_news_count'] <= unbounded['nn_news_count']).all()
+    assert (short['nn_news_count'] < unbounded['nn_news_count']).any()
@@ -0,0 +1,81 @@
+"""Задачи: удаление завершенных, папки результатов и порядок сохранения результата"""
+import asyncio
+import os
+import time
+
+from src.api import app as app_module
+from src.api.jobs import JobDispatcher, JobStore
+
+
+def test_purge_removes_only_old_finished_jobs(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite'))
+    old, fresh, queued = (store.enqueue('s', {}) for _ in range(3))
+    store.complete(old, '{}')
+    store.fail(fresh, 'error')
+    store._conn.execute('UPDATE jobs SET finished_at = ? WHERE job_id = ?', (time.time() - 100, old))
+
+    assert store.purge(max_age=50) == [old]
+    assert store.get(old) is None
+    assert store.get(fresh) is not None
+    assert store.get(queued) is not None
+
+
+def test_remove_job_results(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'RESULTS_DIR', str(tmp_path))
+    monkeypatch.setattr(app_module, 'JOB_TTL_SECONDS', 50)
+    for name in ('purged', 'orphan', 'active'):
+        os.makedirs(tmp_path / name)
+        (tmp_path / name / 'features.parquet').write_bytes(b'x')
+    stale = time.time() - 100
+    os.utime(tmp_path / 'orphan', (stale, stale))
+
+    assert app_module.remove_job_results(['purged', 'missing']) == 2
+    assert sorted(os.listdir(tmp_path)) == ['active']
+
+
+def run_one_job(store, handler, on_success):
+    """Прогоняет одну задачу через JobDispatcher._run"""
+    async def main():
+        dispatcher = JobDispatcher(store, handler, on_success=on_success)
+        dispatcher._wakeup = asyncio.Event()
+        job, = store.claim(1)
+        await dispatcher._run(job)
+        return job['job_id']
+
+    return asyncio.run(main())
+
+
+def test_on_success_runs_after_complete(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite'))
+    store.enqueue('s', {})
+    seen = []
+
+    async def handler(job):
+        return '{"summary": {}}'
+
+    async def on_success(job):
+        seen.append(store.get(job['job_id'])['status'])
+
+    job_id = run_one_job(store, handler, on_success)
+    assert seen == ['succeeded']
+    assert store.result(job_id) == '{"summary": {}}'
+
+
+def test_on_success_skipped_when_complete_fails(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / 'jobs.sqlite'))
+    store.enqueue('s', {})
+    seen = []
+
+    def broken_complete(job_id, result=None):
+        raise OSError('disk full')
+
+    async def handler(job):
+        return '{}'
+
+    async def on_success(job):
+        seen.append(job['job_id'])
+
+    monkeypatch.setattr(store, 'complete', broken_complete)
+    job_id = run_one_job(store, handler, on_success)
+    assert seen == []
+    assert store.get(job_id)['status'] == 'queued'
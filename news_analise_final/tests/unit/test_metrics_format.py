@@ -0,0 +1,20 @@
+"""
+Формат значений в выводе /metrics
+"""
+from src.api.metrics import PipelineMetrics
+
+
+def test_large_counters_keep_full_precision():
+    metrics = PipelineMetrics()
+    metrics.observe_spans('infer', [{'name': 'scoring', 'seconds': 0.5, 'rows': 1234568, 'bytes': 123458001}])
+    text = metrics.render(gauges=[('news_queue_depth', 'Глубина очереди', {('jobs',): 7654321.0}, ('queue',))])
+    assert 'news_stage_rows_total{endpoint="infer",stage="scoring"} 1234568\n' in text
+    assert 'news_stage_bytes_total{endpoint="infer",stage="scoring"} 123458001\n' in text
+    assert 'news_queue_depth{queue="jobs"} 7654321\n' in text
+    assert 'e+' not in text
+
+
+def test_fractional_values_use_repr():
+    metrics = PipelineMetrics()
+    metrics.observe_request('POST', '/infer', 200, 0.1234567891)
+    assert 'news_http_request_duration_seconds_sum{method="POST",route="/infer"} 0.1234567891\n' in metrics.render()
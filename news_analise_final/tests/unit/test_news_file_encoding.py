@@ -0,0 +1,44 @@
+"""
+Определение кодировки CSV с новостями в parse_news_file
+"""
+from src.api.app import detect_encoding, parse_news_file
+
+
+HEADER = 'publish_date,title,publication\n'
+ASCII_ROW = '2025-01-01 10:00:00,Market update,Shares rose on the exchange today\n'
+RUSSIAN_ROW = '2025-01-02 11:00:00,Привет рынок,Сбербанк повысил дивиденды\n'
+
+
+def ascii_prefix(min_bytes: int) -> str:
+    return HEADER + ASCII_ROW * (min_bytes // len(ASCII_ROW) + 1)
+
+
+def test_late_cp1251_bytes_after_ascii_prefix():
+    # Первые 64KB — ASCII, кириллица cp1251 только в конце файла
+    content = (ascii_prefix(70 * 1024) + RUSSIAN_ROW).encode('cp1251')
+    assert detect_encoding(content) == 'cp1251'
+    df = parse_news_file(content)
+    assert df['title'].map(type).eq(str).all()
+    assert df['publication'].map(type).eq(str).all()
+    assert df['title'].iloc[-1] == 'Привет рынок'
+    assert df['publication'].iloc[-1] == 'Сбербанк повысил дивиденды'
+
+
+def test_late_utf8_multibyte_text():
+    content = (ascii_prefix(70 * 1024) + RUSSIAN_ROW).encode('utf-8')
+    assert detect_encoding(content) == 'utf-8'
+    assert parse_news_file(content)['title'].iloc[-1] == 'Привет рынок'
+
+
+def test_utf8_bom():
+    content = (HEADER + RUSSIAN_ROW).encode('utf-8-sig')
+    df = parse_news_file(content)
+    assert list(df.columns) == ['publish_date', 'title', 'publication']
+    assert df['title'].iloc[0] == 'Привет рынок'
+
+
+def test_undecodable_bytes_fall_back_to_latin1():
+    # 0x98 не определен в cp1251 и не является корректным utf-8
+    content = (HEADER + '2025-01-01 10:00:00,abc,def\n').encode('ascii') + b'2025-01-01,x\x98y,z\n'
+    assert detect_encoding(content) == 'latin-1'
+    assert parse_news_file(content)['title'].iloc[-1] == 'x\x98y'
@@ -0,0 +1,46 @@
+"""
+Хранение профилей cProfile: выключено по умолчанию, число и возраст ограничены
+"""
+import os
+import time
+
+import pytest
+
+import src.api.app as app_module
+
+
+def make_profiles(directory, count):
+    now = time.time()
+    for i in range(count):
+        path = directory / f'{i:02d}.prof'
+        path.write_bytes(b'')
+        os.utime(path, (now - i * 10, now - i * 10))
+
+
+def test_profiling_disabled_by_default():
+    if 'PROFILING_ENABLED' in os.environ:
+        pytest.skip('PROFILING_ENABLED задан в окружении')
+    assert app_module.profile_id_for('1') is None
+
+
+def test_prune_keeps_newest(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'PROFILE_DIR', str(tmp_path))
+    make_profiles(tmp_path, 5)
+    assert app_module.prune_profiles(keep=2, max_age=3600) == 3
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['00.prof', '01.prof']
+
+
+def test_prune_drops_old(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'PROFILE_DIR', str(tmp_path))
+    make_profiles(tmp_path, 5)
+    assert app_module.prune_profiles(keep=10, max_age=25) == 2
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+def test_job_profile_uses_job_id_without_new_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'PROFILE_DIR', str(tmp_path))
+    monkeypatch.setattr(app_module, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(app_module.uuid, 'uuid4', lambda: pytest.fail('id не нужен для задачи'))
+    assert app_module.profile_requested('1') and not app_module.profile_requested('0')
+    job = {'job_id': 'abc123', 'payload': {'profile': True}}
+    assert app_module.job_profile_path(job) == os.path.abspath(os.path.join(str(tmp_path), 'abc123.prof'))
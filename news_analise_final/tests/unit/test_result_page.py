@@ -0,0 +1,25 @@
+"""Проверка параметров страницы сохраненного результата /infer"""
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api import app as app_module
+
+
+@pytest.fixture
+def client(monkeypatch):
+    df = pd.DataFrame({'ticker': ['SBER', 'GAZP', 'LKOH'], 'value': [1.0, 2.0, 3.0]})
+    monkeypatch.setattr(app_module, 'stored_table', lambda result_id, table: df)
+    return TestClient(app_module.app)
+
+
+@pytest.mark.parametrize('params', [{'cursor': '-1'}, {'limit': 0}, {'limit': -5}, {'cursor': 'abc'}])
+def test_invalid_page_params_rejected(client, params):
+    assert client.get('/infer/results/r1/joined', params=params).status_code == 400
+
+
+def test_pages_cover_table(client):
+    first = client.get('/infer/results/r1/joined', params={'limit': 2}).json()
+    second = client.get('/infer/results/r1/joined', params={'limit': 2, 'cursor': first['next_cursor']}).json()
+    assert [row['ticker'] for row in first['rows'] + second['rows']] == ['SBER', 'GAZP', 'LKOH']
+    assert second['next_cursor'] is None
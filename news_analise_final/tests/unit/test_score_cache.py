@@ -0,0 +1,54 @@
+"""Кэш скоров: чтение без записи в базу, учет строк и вытеснение"""
+import numpy as np
+
+from src.core.score_cache import ScoreCache
+
+
+def make_cache(tmp_path, max_items=10) -> ScoreCache:
+    return ScoreCache(str(tmp_path / 'score_cache.sqlite'), max_items=max_items)
+
+
+def test_hits_do_not_write(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many([b'a', b'b'], np.ones((2, 3)))
+    changes = cache._conn.total_changes
+
+    found = cache.get_many([b'a', b'b', b'c'], num_labels=3)
+
+    assert set(found) == {b'a', b'b'}
+    assert cache._conn.total_changes == changes
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['items']) == (2, 1, 2)
+
+
+def test_eviction_keeps_recently_read(tmp_path):
+    cache = make_cache(tmp_path, max_items=3)
+    keys = [bytes([i]) for i in range(3)]
+    for key in keys:
+        cache.put_many([key], np.zeros((1, 2)))
+    cache.get_many([keys[0]], num_labels=2)
+
+    cache.put_many([b'new'], np.zeros((1, 2)))
+
+    assert cache.stats()['items'] == 3
+    assert cache.stats()['evictions'] == 1
+    assert cache._items() == 3
+    assert set(cache.get_many(keys + [b'new'], num_labels=2)) == {keys[0], keys[2], b'new'}
+
+
+def test_repeated_insert_not_counted(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many([b'a'], np.zeros((1, 2)))
+    cache.put_many([b'a', b'b'], np.zeros((2, 2)))
+    assert cache.stats()['items'] == cache._items() == 2
+
+
+def test_stats_shared_between_instances(tmp_path):
+    worker = make_cache(tmp_path)
+    api = make_cache(tmp_path)
+    worker.put_many([b'a', b'b'], np.ones((2, 3)))
+    worker.get_many([b'a', b'b', b'c'], num_labels=3)
+    worker.put_many([b'c'], np.ones((1, 3)))
+
+    stats = api.stats()
+    assert (stats['hits'], stats['misses'], stats['items']) == (2, 1, 3)
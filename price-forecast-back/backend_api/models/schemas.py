@@ -54,6 +54,7 @@ class TrainingConfig(BaseModel):
     cv_splits: Optional[int] = 5
     feature_selection_threshold: Optional[str] = 'median'
     feature_selection_n_estimators: Optional[int] = 50
+    n_workers: Optional[int] = None
 
 class TrainingResponse(BaseModel):
     status: str
@@ -35,6 +35,7 @@ async def get_default_training_config():
             "gb_n_estimators": "Количество деревьев в Gradient Boosting",
             "gb_learning_rate": "Скорость обучения в Gradient Boosting",
             "ensemble_weights": "Веса для ансамбля [RF, GB, ET, Ridge, Lasso]",
-            "cv_splits": "Количество фолдов для кросс-валидации"
+            "cv_splits": "Количество фолдов для кросс-валидации",
+            "n_workers": "Число процессов обучения: цели и фолды идут в пул параллельно (None = число CPU, 1 = последовательно)"
         }
     }
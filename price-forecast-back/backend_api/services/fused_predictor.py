@@ -0,0 +1,161 @@
+"""
+Слитый предиктор одной цели: scaler + selector + VotingRegressor в массивах numpy
+
+StandardScaler и SelectFromModel сворачиваются в индексы отобранных колонок и
+сдвиг/масштаб для них, Ridge и Lasso — в один вектор коэффициентов (с учетом
+весов голосования), деревья RF, ET и GB — в общие таблицы узлов, по которым
+все строки проходят векторно, уровень за уровнем. Вклад каждого дерева уже
+умножен на его итоговый вес: 1/n_estimators для лесов, learning_rate для
+бустинга, вес модели в ансамбле / сумма весов.
+
+Артефакт хранит source — размеры и mtime файлов model/scaler/selector, из
+которых он собран (source_fingerprint); при загрузке артефакт с другим
+source не используется.
+
+Сравнения в узлах делаются над float32, как в sklearn, поэтому маршруты по
+деревьям совпадают; расхождение с цепочкой sklearn — только округление
+при суммировании (tests/bench_fused_predictor.py).
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.dummy import DummyRegressor
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Lasso, Ridge
+
+
+class FusedTargetModel:
+    """Артефакт одной цели: models/{target}_fused.pkl"""
+
+    def __init__(self, feature_columns: List[str], columns: np.ndarray, shift: np.ndarray, scale: np.ndarray,
+                 linear_coef: np.ndarray, constant: float, feature: np.ndarray, threshold: np.ndarray,
+                 left: np.ndarray, right: np.ndarray, value: np.ndarray, roots: np.ndarray, depth: int,
+                 source: Optional[Dict[str, dict]] = None):
+        self.feature_columns = list(feature_columns)
+        self.columns = columns
+        self.shift = shift
+        self.scale = scale
+        self.linear_coef = linear_coef
+        self.constant = constant
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.depth = depth
+        self.source = source
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """X — матрица (строки × feature_columns) до масштабирования"""
+        X_selected = (X[:, self.columns] - self.shift) / self.scale
+        prediction = X_selected @ self.linear_coef + self.constant
+        if self.n_trees:
+            X32 = X_selected.astype(np.float32)
+            rows = np.arange(len(X32))[:, np.newaxis]
+            nodes = np.broadcast_to(self.roots, (len(X32), self.n_trees))
+            # У листьев оба потомка указывают на сам лист, поэтому достаточно
+            # depth шагов без проверки, где строка уже дошла до листа
+            for _ in range(self.depth):
+                go_left = X32[rows, self.feature[nodes]] <= self.threshold[nodes]
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            prediction = prediction + self.value[nodes].sum(axis=1)
+        return prediction
+
+
+def source_fingerprint(paths: List[str]) -> Dict[str, dict]:
+    """Размер и mtime файлов, из которых собран слитый предиктор"""
+    fingerprint = {}
+    for path in paths:
+        st = os.stat(path)
+        fingerprint[os.path.basename(path)] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    return fingerprint
+
+
+def fold_preprocessing(feature_columns: List[str], scaler, selector) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    StandardScaler + SelectFromModel в индексы отобранных колонок и сдвиг/масштаб
+    для них: (X[:, columns] - shift) / scale == selector.transform(scaler.transform(X))
+
+    Raises:
+        ValueError: scaler обучен на других признаках
+    """
+    names = getattr(scaler, 'feature_names_in_', None)
+    if names is not None and list(names) != list(feature_columns):
+        raise ValueError("признаки scaler не совпадают с feature_columns.pkl")
+    width = len(feature_columns)
+    columns = selector.get_support(indices=True)
+    shift = (scaler.mean_ if scaler.with_mean else np.zeros(width))[columns]
+    scale = (scaler.scale_ if scaler.with_std else np.ones(width))[columns]
+    return columns, shift, scale
+
+
+def _voting_members(ensemble) -> List[Tuple[object, float]]:
+    """Обученные модели VotingRegressor с нормированными весами"""
+    active = [i for i, (_, est) in enumerate(ensemble.estimators) if est != 'drop']
+    weights = [1.0] * len(active) if ensemble.weights is None else [float(ensemble.weights[i]) for i in active]
+    total = sum(weights)
+    return [(est, weight / total) for est, weight in zip(ensemble.estimators_, weights)]
+
+
+def _gb_init(model: GradientBoostingRegressor) -> float:
+    if isinstance(model.init_, str) and model.init_ == 'zero':
+        return 0.0
+    if isinstance(model.init_, DummyRegressor) and model.init_.strategy == 'mean':
+        return float(np.ravel(model.init_.constant_)[0])
+    raise ValueError(f"Неподдерживаемый init у GradientBoostingRegressor: {model.init_!r}")
+
+
+def fuse_target(feature_columns: List[str], scaler, selector, ensemble,
+                source: Optional[Dict[str, dict]] = None) -> FusedTargetModel:
+    """
+    Сборка слитого предиктора; ValueError, если в ансамбле есть модель,
+    которую нельзя свернуть (тогда используется цепочка sklearn)
+    """
+    columns, shift, scale = fold_preprocessing(feature_columns, scaler, selector)
+
+    linear_coef = np.zeros(len(columns))
+    constant = 0.0
+    trees = []
+    for model, weight in _voting_members(ensemble):
+        if isinstance(model, (Ridge, Lasso)):
+            linear_coef += weight * np.ravel(model.coef_)
+            constant += weight * float(np.ravel(model.intercept_)[0])
+        elif isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+            trees.extend((tree.tree_, weight / len(model.estimators_)) for tree in model.estimators_)
+        elif isinstance(model, GradientBoostingRegressor):
+            constant += weight * _gb_init(model)
+            trees.extend((tree.tree_, weight * model.learning_rate) for tree in model.estimators_[:, 0])
+        else:
+            raise ValueError(f"Модель {type(model).__name__} не поддерживается слитым предиктором")
+
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    depth = 0
+    for tree, weight in trees:
+        n = tree.node_count
+        ids = np.arange(n)
+        leaf = tree.children_left == -1
+        roots.append(offset)
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        left.append(np.where(leaf, ids, tree.children_left) + offset)
+        right.append(np.where(leaf, ids, tree.children_right) + offset)
+        value.append(np.where(leaf, tree.value[:, 0, 0] * weight, 0.0))
+        depth = max(depth, tree.max_depth)
+        offset += n
+
+    def concat(parts, dtype):
+        return np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+
+    return FusedTargetModel(
+        feature_columns, columns, shift, scale, linear_coef, constant,
+        feature=concat(feature, np.intp), threshold=concat(threshold, np.float64),
+        left=concat(left, np.intp), right=concat(right, np.intp), value=concat(value, np.float64),
+        roots=np.asarray(roots, dtype=np.intp), depth=depth, source=source,
+    )
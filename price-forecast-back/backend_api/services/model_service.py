@@ -1,4 +1,9 @@
+import multiprocessing
 import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
 import pandas as pd
 import numpy as np
 import joblib
@@ -6,19 +11,260 @@ from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor, V
 from sklearn.linear_model import Ridge, Lasso
 from sklearn.preprocessing import StandardScaler
 from sklearn.feature_selection import SelectFromModel
-from sklearn.model_selection import TimeSeriesSplit, cross_val_score
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import TimeSeriesSplit
 from fastapi import HTTPException
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Mapping, Optional
 
 from backend_api.models.schemas import TrainingConfig, TrainingResponse
+from backend_api.services.fused_predictor import FusedTargetModel, fold_preprocessing, fuse_target, source_fingerprint
 from backend_api.utils.features import create_features
 
 # Глобальные переменные (stateful!)
 ensemble_models = {}
 scalers = {}
 feature_selectors = {}
+# Слитые scaler+selector+ensemble по целям (services/fused_predictor.py)
+fused_models = {}
 feature_columns = []
 target_columns = ['open', 'high', 'low', 'close', 'volume']
+# Собранный по загруженным моделям предиктор, сбрасывается при обучении и загрузке
+_predictor = None
+
+
+class CompiledPredictor:
+    """
+    Цепочка scaler → selector → ensemble на numpy-массивах
+
+    Порядок признаков берется один раз из feature_columns (models/feature_columns.pkl),
+    scaler и selector сворачиваются в индексы колонок и сдвиг/масштаб так же,
+    как в слитом предикторе (fold_preprocessing).
+    Строка превращается в вектор без DataFrame и без повторного create_features:
+    признаки должны быть уже посчитаны (IncrementalFeatureState), отсутствующие
+    в строке признаки равны 0, как после fillna(0) при обучении.
+
+    Для целей со слитой моделью (fused) вся цепочка считается ею; цепочка sklearn
+    остается запасным путем для ансамблей, которые слить не удалось.
+    """
+
+    def __init__(self, columns: List[str], scalers_: Dict[str, Any], selectors: Dict[str, Any], models: Dict[str, Any],
+                 fused: Optional[Dict[str, FusedTargetModel]] = None):
+        self.feature_columns = list(columns)
+        self.targets = [target for target in target_columns if target in models]
+        self.support = {}
+        self.shifts = {}
+        self.scales = {}
+        self.models = {}
+        self.fused = {}
+        for target in self.targets:
+            model = (fused or {}).get(target)
+            if model is not None:
+                if model.feature_columns == self.feature_columns:
+                    self.fused[target] = model
+                    continue
+                print(f"Предупреждение: слитая модель {target} обучена на других признаках, используется цепочка sklearn")
+            try:
+                folded = fold_preprocessing(self.feature_columns, scalers_[target], selectors[target])
+            except ValueError as e:
+                raise ValueError(f"Модель {target}: {e}") from e
+            self.support[target], self.shifts[target], self.scales[target] = folded
+            self.models[target] = models[target]
+
+    def vectorize(self, row: Mapping[str, Any]) -> np.ndarray:
+        return np.array([row.get(col, 0.0) for col in self.feature_columns], dtype=np.float64)
+
+    def predict_matrix(self, X: np.ndarray) -> Dict[str, np.ndarray]:
+        """Предсказания по целям для матрицы признаков (строки × feature_columns)"""
+        predictions = {}
+        for target in self.targets:
+            if target in self.fused:
+                predictions[target] = self.fused[target].predict(X)
+                continue
+            X_selected = (X[:, self.support[target]] - self.shifts[target]) / self.scales[target]
+            predictions[target] = self.models[target].predict(X_selected)
+        return predictions
+
+
+def get_predictor() -> CompiledPredictor:
+    global _predictor
+    if _predictor is None:
+        if not feature_columns:
+            raise ValueError("Список признаков не загружен (models/feature_columns.pkl)")
+        _predictor = CompiledPredictor(feature_columns, scalers, feature_selectors, ensemble_models, fused_models)
+    return _predictor
+
+
+def target_paths(target: str) -> List[str]:
+    """Файлы модели цели, из которых собирается слитый предиктор"""
+    return [f'models/{target}_model.pkl', f'models/{target}_scaler.pkl', f'models/{target}_selector.pkl']
+
+
+def try_fuse_target(target: str, scaler, selector, ensemble) -> Optional[FusedTargetModel]:
+    try:
+        return fuse_target(feature_columns, scaler, selector, ensemble, source=source_fingerprint(target_paths(target)))
+    except ValueError as e:
+        print(f"Предупреждение: модель {target} не слита ({e}), используется цепочка sklearn")
+        return None
+
+
+def _build_selector(config: TrainingConfig, n_jobs: int) -> SelectFromModel:
+    return SelectFromModel(
+        RandomForestRegressor(
+            n_estimators=config.feature_selection_n_estimators, 
+            random_state=42, 
+            n_jobs=n_jobs
+        ),
+        threshold=config.feature_selection_threshold
+    )
+
+def _build_ensemble(config: TrainingConfig, n_jobs: int) -> VotingRegressor:
+    models = [
+        ('rf', RandomForestRegressor(
+            n_estimators=config.rf_n_estimators,
+            max_depth=config.rf_max_depth,
+            min_samples_split=config.rf_min_samples_split,
+            min_samples_leaf=config.rf_min_samples_leaf,
+            random_state=42,
+            n_jobs=n_jobs
+        )),
+        ('gb', GradientBoostingRegressor(
+            n_estimators=config.gb_n_estimators,
+            learning_rate=config.gb_learning_rate,
+            max_depth=config.gb_max_depth,
+            min_samples_split=config.gb_min_samples_split,
+            random_state=42
+        )),
+        ('et', ExtraTreesRegressor(
+            n_estimators=config.et_n_estimators,
+            max_depth=config.et_max_depth,
+            min_samples_split=config.et_min_samples_split,
+            random_state=42,
+            n_jobs=n_jobs
+        )),
+        ('ridge', Ridge(alpha=config.ridge_alpha, random_state=42)),
+        ('lasso', Lasso(alpha=config.lasso_alpha, random_state=42, max_iter=config.lasso_max_iter))
+    ]
+    return VotingRegressor(
+        estimators=models,
+        weights=config.ensemble_weights
+    )
+
+# Задачи планировщика обучения. Выполняются в процессах пула: матрицы признаков
+# читаются из memmap-файлов по пути, а не передаются в аргументах.
+
+def _prepare_target_task(X_path: str, columns: List[str], y: np.ndarray, config: TrainingConfig,
+                         n_jobs: int, selected_path: str) -> Dict[str, Any]:
+    """scaler + отбор признаков; отобранная матрица пишется в selected_path для фолдов"""
+    start = time.time()
+    valid = ~np.isnan(y)
+    X = joblib.load(X_path, mmap_mode='r')
+    # DataFrame — чтобы у scaler остались имена признаков, как при обучении на train_df
+    X_train = pd.DataFrame(X[valid], columns=columns)
+    scaler = StandardScaler()
+    X_train_scaled = scaler.fit_transform(X_train)
+    selector = _build_selector(config, n_jobs)
+    X_train_selected = selector.fit_transform(X_train_scaled, y[valid])
+    joblib.dump(X_train_selected, selected_path)
+    return {'scaler': scaler, 'selector': selector, 'selected_features': X_train_selected.shape[1],
+            'rows': int(valid.sum()), 'start': start, 'end': time.time()}
+
+def _cv_fold_task(selected_path: str, y: np.ndarray, train_index: np.ndarray, test_index: np.ndarray,
+                  config: TrainingConfig, n_jobs: int) -> Dict[str, Any]:
+    start = time.time()
+    X = joblib.load(selected_path, mmap_mode='r')
+    ensemble = _build_ensemble(config, n_jobs)
+    ensemble.fit(X[train_index], y[train_index])
+    mae = mean_absolute_error(y[test_index], ensemble.predict(X[test_index]))
+    return {'mae': float(mae), 'start': start, 'end': time.time()}
+
+def _fit_task(selected_path: str, y: np.ndarray, config: TrainingConfig, n_jobs: int) -> Dict[str, Any]:
+    start = time.time()
+    X = joblib.load(selected_path, mmap_mode='r')
+    ensemble = _build_ensemble(config, n_jobs)
+    ensemble.fit(X, y)
+    return {'ensemble': ensemble, 'start': start, 'end': time.time()}
+
+def training_workers(config: TrainingConfig) -> int:
+    return max(1, config.n_workers or os.cpu_count() or 1)
+
+def run_training_schedule(X: np.ndarray, columns: List[str], targets: Dict[str, np.ndarray],
+                          config: TrainingConfig) -> Dict[str, Dict[str, Any]]:
+    """
+    Обучение всех целей пулом процессов
+
+    Для каждой цели сначала выполняется подготовка (scaler + отбор признаков),
+    после нее параллельно — фолды TimeSeriesSplit и финальное обучение на всей
+    выборке. Задачи разных целей идут в пул вперемешку, всего процессов —
+    config.n_workers (по умолчанию число CPU). Внутри задач RandomForest и
+    ExtraTrees однопоточные, чтобы не выходить за бюджет; при n_workers=1
+    задачи выполняются в текущем процессе, а леса используют все ядра.
+
+    Матрица признаков и отобранные матрицы целей пишутся во временную папку и
+    открываются в процессах через memmap. Результат по цели: scaler, selector,
+    ensemble, MAE фолдов, wall time (от начала первой задачи цели до конца
+    последней) и суммарное время задач.
+    """
+    workers = training_workers(config)
+    n_jobs = -1 if workers == 1 else 1
+    tmp_dir = tempfile.mkdtemp(prefix='train_')
+    X_path = os.path.join(tmp_dir, 'features.joblib')
+    joblib.dump(X, X_path)
+    # spawn: форк процесса API с потоками uvicorn может зависнуть
+    executor = (ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+                if workers > 1 else None)
+
+    def submit(fn, *args):
+        if executor is None:
+            future = Future()
+            future.set_result(fn(*args))
+            return future
+        return executor.submit(fn, *args)
+
+    print(f"Обучение {len(targets)} целей, процессов: {workers}")
+    results = {target: {'cv_mae': [None] * config.cv_splits, 'spans': []} for target in targets}
+    pending = {}
+    queue = list(targets)
+
+    def submit_prepare(target):
+        selected_path = os.path.join(tmp_dir, f'{target}_selected.joblib')
+        pending[submit(_prepare_target_task, X_path, columns, targets[target], config, n_jobs, selected_path)] = (target, 'prepare', None)
+
+    try:
+        # Без пула цели обучаются по очереди, иначе все подготовки прошли бы
+        # раньше фолдов и wall time целей перекрывались бы
+        while queue and (executor is not None or not pending):
+            submit_prepare(queue.pop(0))
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                target, kind, fold = pending.pop(future)
+                output = future.result()
+                result = results[target]
+                result['spans'].append((output['start'], output['end']))
+                if kind == 'prepare':
+                    result.update(scaler=output['scaler'], selector=output['selector'],
+                                  selected_features=output['selected_features'])
+                    y = targets[target][~np.isnan(targets[target])]
+                    selected_path = os.path.join(tmp_dir, f'{target}_selected.joblib')
+                    tscv = TimeSeriesSplit(n_splits=config.cv_splits)
+                    for i, (train_index, test_index) in enumerate(tscv.split(np.empty((output['rows'], 1)))):
+                        pending[submit(_cv_fold_task, selected_path, y, train_index, test_index, config, n_jobs)] = (target, 'fold', i)
+                    pending[submit(_fit_task, selected_path, y, config, n_jobs)] = (target, 'fit', None)
+                elif kind == 'fold':
+                    result['cv_mae'][fold] = output['mae']
+                else:
+                    result['ensemble'] = output['ensemble']
+            if executor is None and not pending and queue:
+                submit_prepare(queue.pop(0))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    for result in results.values():
+        spans = result.pop('spans')
+        result['wall_time'] = max(end for _, end in spans) - min(start for start, _ in spans)
+        result['task_seconds'] = sum(end - start for start, end in spans)
+    return results
 
 def train_models_with_config(data_file: str, config: TrainingConfig) -> TrainingResponse:
     try:
@@ -49,79 +295,41 @@ def train_models_with_config(data_file: str, config: TrainingConfig) -> Training
         feature_columns = [col for col in numeric_columns if col not in exclude_columns]
 
         os.makedirs('models', exist_ok=True)
-        global ensemble_models, scalers, feature_selectors
+        global ensemble_models, scalers, feature_selectors, fused_models, _predictor
+        _predictor = None
         ensemble_models = {}
         scalers = {}
         feature_selectors = {}
+        fused_models = {}
         training_metrics = {}
+        targets = {target: train_df[target].to_numpy(dtype=np.float64) for target in target_columns}
+        results = run_training_schedule(train_df[feature_columns].to_numpy(dtype=np.float64), feature_columns, targets, config)
         for target in target_columns:
-            print(f"Обучение модели для {target}...")
-            X_train = train_df[feature_columns]
-            y_train = train_df[target]
-            X_test = test_df[feature_columns]
-            valid_indices = ~y_train.isnull()
-            X_train = X_train[valid_indices]
-            y_train = y_train[valid_indices]
-            scaler = StandardScaler()
-            X_train_scaled = scaler.fit_transform(X_train)
-            X_test_scaled = scaler.transform(X_test)
+            result = results[target]
+            scaler, selector, ensemble = result['scaler'], result['selector'], result['ensemble']
             scalers[target] = scaler
-            selector = SelectFromModel(
-                RandomForestRegressor(
-                    n_estimators=config.feature_selection_n_estimators, 
-                    random_state=42, 
-                    n_jobs=-1
-                ),
-                threshold=config.feature_selection_threshold
-            )
-            X_train_selected = selector.fit_transform(X_train_scaled, y_train)
-            X_test_selected = selector.transform(X_test_scaled)
             feature_selectors[target] = selector
-            models = [
-                ('rf', RandomForestRegressor(
-                    n_estimators=config.rf_n_estimators,
-                    max_depth=config.rf_max_depth,
-                    min_samples_split=config.rf_min_samples_split,
-                    min_samples_leaf=config.rf_min_samples_leaf,
-                    random_state=42,
-                    n_jobs=-1
-                )),
-                ('gb', GradientBoostingRegressor(
-                    n_estimators=config.gb_n_estimators,
-                    learning_rate=config.gb_learning_rate,
-                    max_depth=config.gb_max_depth,
-                    min_samples_split=config.gb_min_samples_split,
-                    random_state=42
-                )),
-                ('et', ExtraTreesRegressor(
-                    n_estimators=config.et_n_estimators,
-                    max_depth=config.et_max_depth,
-                    min_samples_split=config.et_min_samples_split,
-                    random_state=42,
-                    n_jobs=-1
-                )),
-                ('ridge', Ridge(alpha=config.ridge_alpha, random_state=42)),
-                ('lasso', Lasso(alpha=config.lasso_alpha, random_state=42, max_iter=config.lasso_max_iter))
-            ]
-            ensemble = VotingRegressor(
-                estimators=models,
-                weights=config.ensemble_weights
-            )
-            tscv = TimeSeriesSplit(n_splits=config.cv_splits)
-            cv_scores = cross_val_score(ensemble, X_train_selected, y_train, cv=tscv, scoring='neg_mean_absolute_error')
-            ensemble.fit(X_train_selected, y_train)
-            pred = ensemble.predict(X_test_selected)
             ensemble_models[target] = ensemble
             joblib.dump(ensemble, f'models/{target}_model.pkl')
             joblib.dump(scaler, f'models/{target}_scaler.pkl')
             joblib.dump(selector, f'models/{target}_selector.pkl')
+            fused = try_fuse_target(target, scaler, selector, ensemble)
+            if fused is not None:
+                fused_models[target] = fused
+                joblib.dump(fused, f'models/{target}_fused.pkl')
+            elif os.path.exists(f'models/{target}_fused.pkl'):
+                os.remove(f'models/{target}_fused.pkl')
+            cv_mae = np.asarray(result['cv_mae'])
             training_metrics[target] = {
-                'cv_mae_mean': -cv_scores.mean(),
-                'cv_mae_std': cv_scores.std(),
-                'selected_features': X_train_selected.shape[1],
-                'total_features': X_train_scaled.shape[1]
+                'cv_mae_mean': cv_mae.mean(),
+                'cv_mae_std': cv_mae.std(),
+                'selected_features': result['selected_features'],
+                'total_features': len(feature_columns),
+                'wall_time_seconds': round(result['wall_time'], 3),
+                'task_seconds': round(result['task_seconds'], 3)
             }
-            print(f"Модель для {target} обучена. CV MAE: {-cv_scores.mean():.4f}")
+            print(f"Модель для {target} обучена. CV MAE: {cv_mae.mean():.4f}, "
+                  f"время {result['wall_time']:.1f}с")
         joblib.dump(feature_columns, 'models/feature_columns.pkl')
         return TrainingResponse(
             status="success",
@@ -138,7 +346,8 @@ def train_models_with_config(data_file: str, config: TrainingConfig) -> Training
         raise HTTPException(status_code=500, detail=f"Ошибка обучения: {str(e)}")
 
 def load_models() -> bool:
-    global ensemble_models, scalers, feature_selectors, feature_columns
+    global ensemble_models, scalers, feature_selectors, feature_columns, fused_models, _predictor
+    _predictor = None
     try:
         for target in target_columns:
             model_path = f"models/{target}_model.pkl"
@@ -157,7 +366,22 @@ def load_models() -> bool:
             print(f"Загружено {len(feature_columns)} признаков")
         else:
             print("Файл feature_columns.pkl не найден")
+        fused_models = {}
+        for target in ensemble_models:
+            fused_path = f"models/{target}_fused.pkl"
+            fused = joblib.load(fused_path) if os.path.exists(fused_path) else None
+            if fused is not None and getattr(fused, 'source', None) == source_fingerprint(target_paths(target)):
+                fused_models[target] = fused
+            elif feature_columns:
+                # Модели, обученные до появления слитых артефактов, и артефакты,
+                # собранные из других файлов моделей, сливаются при загрузке
+                if fused is not None:
+                    print(f"Предупреждение: {fused_path} собран из других файлов модели {target}, сливаем заново")
+                fused = try_fuse_target(target, scalers[target], feature_selectors[target], ensemble_models[target])
+                if fused is not None:
+                    fused_models[target] = fused
         print(f"Загружено {len(ensemble_models)} моделей")
+        print(f"Слитые предикторы: {list(fused_models.keys())}")
         print(f"Доступные модели: {list(ensemble_models.keys())}")
         return len(ensemble_models) > 0
     except Exception as e:
@@ -165,26 +389,3 @@ def load_models() -> bool:
         print(f"Ошибка загрузки моделей: {e}")
         print(f"Traceback: {traceback.format_exc()}")
         return False
-
-def predict_single_candle(input_data: Dict[str, Any]) -> Dict[str, float]:
-    try:
-        df = pd.DataFrame([input_data])
-        df = create_features(df)
-        df = df.bfill().ffill().fillna(0)
-        numeric_columns = df.select_dtypes(include=[np.number]).columns.tolist()
-        exclude_columns = ['ticker', 'begin'] + target_columns
-        current_feature_columns = [col for col in numeric_columns if col not in exclude_columns]
-        X = df[current_feature_columns]
-        predictions = {}
-        for target in target_columns:
-            if target in ensemble_models:
-                X_scaled = scalers[target].transform(X)
-                X_selected = feature_selectors[target].transform(X_scaled)
-                pred = ensemble_models[target].predict(X_selected)[0]
-                predictions[target] = float(pred)
-        return predictions
-    except Exception as e:
-        import traceback
-        print(f"Ошибка предсказания: {e}")
-        print(f"Traceback: {traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=f"Ошибка предсказания: {str(e)}")
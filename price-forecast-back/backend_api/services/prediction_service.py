@@ -1,9 +1,11 @@
+import numpy as np
 import pandas as pd
 from datetime import timedelta
 from fastapi import HTTPException
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Mapping
 from collections import defaultdict
-from backend_api.services.model_service import predict_single_candle
+from backend_api.services.model_service import get_predictor
+from backend_api.utils.features import IncrementalFeatureState
 
 def process_multiple_tickers(input_candles: List[Dict[str, Any]]):
     results = []
@@ -11,6 +13,8 @@ def process_multiple_tickers(input_candles: List[Dict[str, Any]]):
     for candle in input_candles:
         ticker = candle.get('ticker', 'UNKNOWN')
         ticker_data[ticker].append(candle)
+    histories = {}
+    base_prices = {}
     for ticker, candles in ticker_data.items():
         print(f"Обрабатываем тикер: {ticker} ({len(candles)} записей)")
         candles_sorted = sorted(candles, key=lambda x: x.get('date', ''))
@@ -18,8 +22,13 @@ def process_multiple_tickers(input_candles: List[Dict[str, Any]]):
         if base_close_price <= 0:
             print(f"⚠️  Пропускаем тикер {ticker}: некорректная базовая цена")
             continue
-        predicted_candles = generate_20_candles_from_history(candles_sorted)
-        returns = calculate_returns_from_predictions(predicted_candles, base_close_price)
+        histories[ticker] = candles_sorted
+        base_prices[ticker] = base_close_price
+    if not histories:
+        return results
+    predicted = generate_20_candles_batch(histories)
+    for ticker, predicted_candles in predicted.items():
+        returns = calculate_returns_from_predictions(predicted_candles, base_prices[ticker])
         results.append({
             "ticker": ticker,
             "returns": returns
@@ -34,55 +43,44 @@ def calculate_returns_from_predictions(predicted_candles: List[Dict[str, Any]],
         returns.append(round(return_rate, 6))
     return returns
 
-def generate_20_candles_from_history(input_candles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    if not input_candles:
-        raise ValueError("Пустой список входных свечей")
-    df = pd.DataFrame(input_candles)
-    from backend_api.utils.features import create_features
-    df = create_features(df)
-    df = df.bfill().ffill().fillna(0)
-    last_date = pd.to_datetime(df['date'].iloc[-1])
-    predicted_candles = []
+def generate_20_candles_batch(histories: Dict[Any, List[Dict[str, Any]]]) -> Dict[Any, List[Dict[str, Any]]]:
+    """
+    20 свечей вперед для нескольких историй сразу
+
+    На каждом шаге горизонта текущие строки признаков всех историй складываются
+    в одну матрицу, и цепочка scaler → selector → ensemble каждой цели
+    вызывается один раз на шаг, а не на каждый тикер.
+    """
+    keys = list(histories)
+    states = [IncrementalFeatureState.from_candles(histories[key]) for key in keys]
+    last_dates = [pd.to_datetime(state.last_row['date']) for state in states]
+    predicted = {key: [] for key in keys}
     for i in range(20):
-        last_row = df.iloc[-1].copy()
-        predictions = predict_single_candle_from_row(last_row)
-        new_candle = {
-            'date': (last_date + timedelta(days=i+1)).strftime('%Y-%m-%d'),
-            'ticker': last_row.get('ticker', 'UNKNOWN'),
-            'open': predictions.get('open', 0),
-            'high': predictions.get('high', 0),
-            'low': predictions.get('low', 0),
-            'close': predictions.get('close', 0),
-            'volume': predictions.get('volume', 0)
-        }
-        predicted_candles.append(new_candle)
-        new_row = last_row.copy()
-        new_row.update(predictions)
-        new_row['date'] = new_candle['date']
-        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-        df = create_features(df)
-        df = df.bfill().ffill().fillna(0)
-    return predicted_candles
+        rows = [state.last_row for state in states]
+        step_predictions = predict_candles_from_rows(rows)
+        for key, state, last_row, last_date, predictions in zip(keys, states, rows, last_dates, step_predictions):
+            new_candle = {
+                'date': (last_date + timedelta(days=i+1)).strftime('%Y-%m-%d'),
+                'ticker': last_row.get('ticker', 'UNKNOWN'),
+                'open': predictions.get('open', 0),
+                'high': predictions.get('high', 0),
+                'low': predictions.get('low', 0),
+                'close': predictions.get('close', 0),
+                'volume': predictions.get('volume', 0)
+            }
+            predicted[key].append(new_candle)
+            # Признаки новой строки пересчитываются инкрементально, без concat и
+            # повторного create_features по всей истории
+            state.append({**predictions, 'date': new_candle['date']})
+    return predicted
 
-def predict_single_candle_from_row(row_data: pd.Series) -> Dict[str, float]:
+def predict_candles_from_rows(rows: List[Mapping[str, Any]]) -> List[Dict[str, float]]:
+    """Предсказание следующей свечи для нескольких строк одним вызовом моделей на цель"""
     try:
-        df = pd.DataFrame([row_data])
-        from backend_api.utils.features import create_features
-        df = create_features(df)
-        df = df.bfill().ffill().fillna(0)
-        numeric_columns = df.select_dtypes(include=['number']).columns.tolist()
-        exclude_columns = ['ticker', 'begin', 'open', 'high', 'low', 'close', 'volume']
-        current_feature_columns = [col for col in numeric_columns if col not in exclude_columns]
-        X = df[current_feature_columns]
-        from backend_api.services.model_service import ensemble_models, scalers, feature_selectors, feature_columns, target_columns
-        predictions = {}
-        for target in target_columns:
-            if target in ensemble_models:
-                X_scaled = scalers[target].transform(X)
-                X_selected = feature_selectors[target].transform(X_scaled)
-                pred = ensemble_models[target].predict(X_selected)[0]
-                predictions[target] = float(pred)
-        return predictions
+        predictor = get_predictor()
+        X = np.vstack([predictor.vectorize(row) for row in rows])
+        matrix = predictor.predict_matrix(X)
+        return [{target: float(values[i]) for target, values in matrix.items()} for i in range(len(rows))]
     except Exception as e:
         import traceback
         print(f"Ошибка предсказания: {e}")
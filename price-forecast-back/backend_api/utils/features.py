@@ -1,16 +1,25 @@
+import math
+from collections import deque
+from typing import Any, Dict, List
+
+import numpy as np
 import pandas as pd
 
+LAG_COLUMNS = ['close', 'volume', 'rsi', 'macd']
+LAGS = [1, 2, 3, 5]
+ROLLING_WINDOWS = [5, 10, 20]
+
 def create_features(df: pd.DataFrame) -> pd.DataFrame:
     """Создание дополнительных признаков как в ноутбуке"""
     df = df.copy()
     # Лаговые признаки
-    for col in ['close', 'volume', 'rsi', 'macd']:
+    for col in LAG_COLUMNS:
         if col in df.columns:
-            for lag in [1, 2, 3, 5]:
+            for lag in LAGS:
                 df[f'{col}_lag_{lag}'] = df[col].shift(lag)
     # Скользящие статистики
     if 'close' in df.columns:
-        for window in [5, 10, 20]:
+        for window in ROLLING_WINDOWS:
             df[f'close_rolling_mean_{window}'] = df['close'].rolling(window).mean()
             df[f'close_rolling_std_{window}'] = df['close'].rolling(window).std()
             df[f'close_rolling_min_{window}'] = df['close'].rolling(window).min()
@@ -22,3 +31,76 @@ def create_features(df: pd.DataFrame) -> pd.DataFrame:
     if all(col in df.columns for col in ['rsi', 'macd']):
         df['rsi_macd_interaction'] = df['rsi'] * df['macd']
     return df
+
+
+class IncrementalFeatureState:
+    """
+    Признаки create_features для последней строки истории одного тикера
+
+    Вместо пересчета create_features(...).bfill().ffill().fillna(0) по всей
+    истории на каждом шаге прогноза состояние хранит кольцевые буферы
+    последних значений close, volume, rsi, macd (не длиннее самого большого
+    окна) и пересчитывает признаки только для добавленной строки за O(окна).
+
+    Результат совпадает с полным пересчетом: лаги и окна, для которых истории
+    еще не хватает, равны 0 (колонка целиком NaN -> fillna(0)), а NaN в
+    признаке новой строки заменяется значением предыдущей строки (ffill).
+    """
+
+    def __init__(self, history: pd.DataFrame):
+        """history — результат create_features(df).bfill().ffill().fillna(0)"""
+        if history.empty:
+            raise ValueError("Пустая история для инкрементальных признаков")
+        self.length = len(history)
+        self.last_row: Dict[str, Any] = history.iloc[-1].to_dict()
+        size = max(max(LAGS) + 1, max(ROLLING_WINDOWS))
+        self.buffers = {
+            col: deque(history[col].to_numpy(dtype=float)[-size:], maxlen=size)
+            for col in LAG_COLUMNS if col in history.columns
+        }
+        self.has_volatility = 'volatility' in history.columns
+        self.has_interaction = 'rsi_macd_interaction' in history.columns
+
+    @classmethod
+    def from_candles(cls, candles: List[Dict[str, Any]]) -> 'IncrementalFeatureState':
+        df = create_features(pd.DataFrame(candles))
+        df = df.bfill().ffill().fillna(0)
+        return cls(df)
+
+    def _set(self, row: Dict[str, Any], name: str, value: float) -> None:
+        # ffill: NaN в новой строке заменяется значением предыдущей строки
+        row[name] = self.last_row[name] if math.isnan(value) else value
+
+    def append(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Добавляет строку: копия последней строки, обновленная values
+        (предсказанные open/high/low/close/volume, дата), с пересчитанными
+        признаками. Возвращает новую последнюю строку.
+        """
+        row = dict(self.last_row)
+        # Как Series.update: пропуски в values не затирают значения строки
+        row.update({key: value for key, value in values.items()
+                    if not (isinstance(value, float) and math.isnan(value))})
+        self.length += 1
+        for col, buffer in self.buffers.items():
+            buffer.append(float(row[col]))
+            for lag in LAGS:
+                self._set(row, f'{col}_lag_{lag}', buffer[-1 - lag] if self.length > lag else math.nan)
+        if 'close' in self.buffers:
+            closes = self.buffers['close']
+            for window in ROLLING_WINDOWS:
+                if self.length >= window:
+                    tail = np.fromiter((closes[i] for i in range(len(closes) - window, len(closes))), float, window)
+                    stats = (tail.mean(), tail.std(ddof=1), tail.min(), tail.max())
+                else:
+                    stats = (math.nan,) * 4
+                for name, value in zip(('mean', 'std', 'min', 'max'), stats):
+                    self._set(row, f'close_rolling_{name}_{window}', float(value))
+        if self.has_volatility:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                volatility = (np.float64(row['high']) - row['low']) / np.float64(row['open'])
+            self._set(row, 'volatility', float(volatility))
+        if self.has_interaction:
+            self._set(row, 'rsi_macd_interaction', float(row['rsi']) * float(row['macd']))
+        self.last_row = row
+        return row
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Сравнение слитого предиктора (backend_api/services/fused_predictor.py) с цепочкой
+sklearn scaler → selector → VotingRegressor: совпадение предсказаний и время
+
+Строки признаков берутся из датасета (create_features + заполнение пропусков,
+как при обучении) или, без --data, генерируются вокруг mean_/scale_ scaler.
+Время замеряется для одной строки (шаг прогноза по одному тикеру) и для
+пачки из --rows строк. Возвращает код 1, если расхождение вышло за допуск.
+
+Пример:
+    python tests/bench_fused_predictor.py --models models --data data/train.csv
+    python tests/bench_fused_predictor.py --models models --rows 5000 --rtol 1e-9
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend_api.services.fused_predictor import fuse_target
+from backend_api.services.model_service import target_columns
+from backend_api.utils.features import create_features
+
+
+def load_rows(path: str, feature_columns: list, rows: int, scaler, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if path is None:
+        return scaler.mean_ + scaler.scale_ * rng.standard_normal((rows, len(feature_columns)))
+    data = pd.read_csv(path) if path.endswith('.csv') else pd.read_json(path)
+    df = create_features(data).bfill().ffill().fillna(0)
+    X = df.reindex(columns=feature_columns, fill_value=0.0).to_numpy(dtype=np.float64)
+    return X[rng.integers(0, len(X), rows)]
+
+
+def best_time(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Слитый предиктор против цепочки sklearn')
+    parser.add_argument('--models', default='models', help='папка с *_model.pkl, *_scaler.pkl, *_selector.pkl')
+    parser.add_argument('--data', default=None, help='CSV/JSON свечей для строк признаков')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--rtol', type=float, default=1e-9)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    feature_columns = joblib.load(os.path.join(args.models, 'feature_columns.pkl'))
+    failed = []
+    X = None
+    for target in target_columns:
+        model_path = os.path.join(args.models, f'{target}_model.pkl')
+        if not os.path.exists(model_path):
+            print(f"⚠️  Нет модели для {target}, пропускаем")
+            continue
+        ensemble = joblib.load(model_path)
+        scaler = joblib.load(os.path.join(args.models, f'{target}_scaler.pkl'))
+        selector = joblib.load(os.path.join(args.models, f'{target}_selector.pkl'))
+        if X is None:
+            X = load_rows(args.data, feature_columns, args.rows, scaler, args.seed)
+            print(f"📊 Строк: {len(X)}, признаков: {len(feature_columns)}")
+
+        def chain(matrix):
+            frame = pd.DataFrame(matrix, columns=feature_columns)
+            return ensemble.predict(selector.transform(scaler.transform(frame)))
+
+        start = time.perf_counter()
+        fused = fuse_target(feature_columns, scaler, selector, ensemble)
+        fuse_seconds = time.perf_counter() - start
+
+        expected = chain(X)
+        actual = fused.predict(X)
+        max_abs = float(np.abs(expected - actual).max())
+        scale = float(np.abs(expected).max()) or 1.0
+        single_chain = best_time(lambda: chain(X[:1]), args.repeat)
+        single_fused = best_time(lambda: fused.predict(X[:1]), args.repeat)
+        batch_chain = best_time(lambda: chain(X), args.repeat)
+        batch_fused = best_time(lambda: fused.predict(X), args.repeat)
+
+        print(f"\n🎯 {target}: деревьев {fused.n_trees}, узлов {len(fused.feature)}, глубина {fused.depth}, "
+              f"колонок {len(fused.columns)} (сборка {fuse_seconds:.2f}с)")
+        print(f"Максимальная разность: {max_abs:.3e} (относительно max|y|: {max_abs / scale:.3e}, допуск {args.rtol})")
+        print(f"1 строка:   sklearn {single_chain * 1e3:.2f}мс, слитый {single_fused * 1e3:.2f}мс "
+              f"(x{single_chain / single_fused:.1f})")
+        print(f"{len(X)} строк: sklearn {batch_chain * 1e3:.2f}мс, слитый {batch_fused * 1e3:.2f}мс "
+              f"(x{batch_chain / batch_fused:.1f})")
+        if max_abs > args.rtol * scale:
+            failed.append(target)
+
+    if X is None:
+        print("❌ Модели не найдены")
+        return 1
+    if failed:
+        print(f"\n❌ Вне допуска: {', '.join(failed)}")
+        return 1
+    print("\n✅ Слитый предиктор совпадает с цепочкой sklearn")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())